@@ -193,16 +193,17 @@ class AbstractCollector(object):
         if self.current_stamps['latest']:
             del self.current_stamps['latest']
 
-    def aggregate_latest(self, latest_vars, stamp=None):
+    def aggregate_latest(self, latest_vars, stamp=None, count=1):
         """
         Aggregate several latest metrics from multiple places and store the
         final value in a metric_name-value store.
 
         :param latest_vars: Dict Metric_name - Value dict
         :param stamp: Int Timestamp of collect
+        :param count: Int Number of places the metrics were seen in
         """
         for metric_name in latest_vars:
-            self.current_latest[metric_name] += 1
+            self.current_latest[metric_name] += count
             if stamp:
                 self.current_stamps['latest'][metric_name] = stamp
 
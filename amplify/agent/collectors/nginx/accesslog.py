@@ -1,11 +1,13 @@
 # -*- coding: utf-8 -*-
 import time
 
+from collections import defaultdict
+
 from amplify.agent.collectors.abstract import AbstractCollector
 from amplify.agent.common.context import context
 from amplify.agent.pipelines.abstract import Pipeline
+from amplify.agent.objects.nginx.filters import FilterEngine
 from amplify.agent.objects.nginx.log.access import NginxAccessLogParser
-import copy
 
 
 __author__ = "Mike Belov"
@@ -15,6 +17,47 @@ __maintainer__ = "Mike Belov"
 __email__ = "dedm@nginx.com"
 
 
+class AccessLogBatch(object):
+    """
+    A chunk of parsed access log records.
+
+    Metric methods read it column by column (all values of one variable at
+    once) instead of being called once per line.  If log_filter is set the
+    batch only holds records matched by that filter and metrics are reported
+    as custom filter metrics.
+    """
+
+    def __init__(self, records, log_filter=None):
+        self.records = records
+        self.log_filter = log_filter
+        self._columns = {}
+        self._counts = {}
+
+    def __len__(self):
+        return len(self.records)
+
+    def column(self, key):
+        """
+        :param key: str parsed variable name
+        :return: [] of values of the variable for records that have it
+        """
+        if key not in self._columns:
+            self._columns[key] = [record[key] for record in self.records if key in record]
+        return self._columns[key]
+
+    def counts(self, key):
+        """
+        :param key: str parsed variable name
+        :return: {} of distinct variable value - number of records with it
+        """
+        if key not in self._counts:
+            counts = defaultdict(int)
+            for value in self.column(key):
+                counts[value] += 1
+            self._counts[key] = counts
+        return self._counts[key]
+
+
 class NginxAccessLogsCollector(AbstractCollector):
     short_name = 'nginx_alog'
 
@@ -69,6 +112,15 @@ class NginxAccessLogsCollector(AbstractCollector):
         'options'
     )
 
+    upstream_timers = (
+        ('nginx.upstream.connect.time', 'upstream_connect_time'),
+        ('nginx.upstream.response.time', 'upstream_response_time'),
+        ('nginx.upstream.header.time', 'upstream_header_time'),
+    )
+
+    # number of lines aggregated at once
+    batch_size = 1000
+
     valid_cache_statuses = (
         'bypass',
         'expired',
@@ -96,6 +148,7 @@ class NginxAccessLogsCollector(AbstractCollector):
             if not log_filter.matchfile(self.name):
                 continue
             self.filters.append(log_filter)
+        self.filter_engine = FilterEngine(self.filters)
 
         self.register(
             self.http_method,
@@ -116,20 +169,25 @@ class NginxAccessLogsCollector(AbstractCollector):
                 self.object.statsd.incr(counter, value=0)
 
         # init counters for custom filters
-        for counter in set(f.metric for f in self.filters):
-            if counter in self.counters:
-                self.count_custom_filter(self.filters, counter, 0, self.object.statsd.incr)
+        for log_filter in self.filters:
+            if log_filter.metric in self.counters:
+                self.count(AccessLogBatch([], log_filter=log_filter), log_filter.metric, 0)
 
     def collect(self):
         self.init_counters()  # set all counters to 0
 
         count = 0
+        malformed = 0
+        records = []
+        filtered = defaultdict(list)
         multiline_record = []
         for line in self.tail:
             count += 1
 
-            # release GIL every 1000 of lines
-            if count % (1000 * self.num_of_lines_in_log_format) == 0:
+            # aggregate a batch and release GIL every 1000 of lines
+            if count % (self.batch_size * self.num_of_lines_in_log_format) == 0:
+                self.collect_batch(records, filtered, malformed)
+                records, filtered, malformed = [], defaultdict(list), 0
                 time.sleep(0.001)
 
             # handle multiline log formats
@@ -151,22 +209,50 @@ class NginxAccessLogsCollector(AbstractCollector):
                 continue
 
             if parsed['malformed']:
-                self.request_malformed()
+                malformed += 1
             else:
-                # try to match custom filters and collect log metrics with them
-                matched_filters = [filter for filter in self.filters if filter.match(parsed)]
-                super(NginxAccessLogsCollector, self).collect(parsed, matched_filters)
+                records.append(parsed)
+                # try to match custom filters to collect log metrics with them
+                if self.filters:
+                    for log_filter in self.filter_engine.match(parsed):
+                        filtered[log_filter].append(parsed)
+
+        self.collect_batch(records, filtered, malformed)
 
         tail_name = self.tail.name if isinstance(self.tail, Pipeline) else 'list'
         context.log.debug('%s processed %s lines from %s' % (self.object.definition_hash, count, tail_name))
 
-    def request_malformed(self):
+    def _sleep(self):
+        if isinstance(self.tail, Pipeline):
+            self.tail.wait(self.interval)
+        else:
+            super(NginxAccessLogsCollector, self)._sleep()
+
+    def collect_batch(self, records, filtered=None, malformed=0):
+        """
+        Runs every metric method once for a batch of parsed records and once
+        more for every custom filter that matched some of them
+
+        :param records: [] of parsed lines
+        :param filtered: {} of filter - [] of parsed lines matched by it
+        :param malformed: int number of malformed lines
+        """
+        if malformed:
+            self.request_malformed(malformed)
+
+        if records:
+            super(NginxAccessLogsCollector, self).collect(AccessLogBatch(records))
+
+        for log_filter, filter_records in (filtered or {}).iteritems():
+            super(NginxAccessLogsCollector, self).collect(AccessLogBatch(filter_records, log_filter=log_filter))
+
+    def request_malformed(self, value=1):
         """
         nginx.http.request.malformed
         """
-        self.object.statsd.incr('nginx.http.request.malformed')
+        self.object.statsd.incr('nginx.http.request.malformed', value)
 
-    def http_method(self, data, matched_filters=None):
+    def http_method(self, batch):
         """
         nginx.http.method.head
         nginx.http.method.get
@@ -176,18 +262,18 @@ class NginxAccessLogsCollector(AbstractCollector):
         nginx.http.method.options
         nginx.http.method.other
 
-        :param data: {} of parsed line
-        :param matched_filters: [] of matched filters
+        :param batch: AccessLogBatch of parsed lines
         """
-        if 'request_method' in data:
-            method = data['request_method'].lower()
+        counted = defaultdict(int)
+        for method, count in batch.counts('request_method').iteritems():
+            method = method.lower()
             method = method if method in self.valid_http_methods else 'other'
-            metric_name = 'nginx.http.method.%s' % method
-            self.object.statsd.incr(metric_name)
-            if matched_filters:
-                self.count_custom_filter(matched_filters, metric_name, 1, self.object.statsd.incr)
+            counted['nginx.http.method.%s' % method] += count
 
-    def http_status(self, data, matched_filters=None):
+        for metric_name, value in counted.iteritems():
+            self.count(batch, metric_name, value)
+
+    def http_status(self, batch):
         """
         nginx.http.status.1xx
         nginx.http.status.2xx
@@ -202,48 +288,38 @@ class NginxAccessLogsCollector(AbstractCollector):
         nginx.http.status.504
         nginx.http.status.discarded
 
-        :param data: {} of parsed line
-        :param matched_filters: [] of matched filters
+        :param batch: AccessLogBatch of parsed lines
         """
-        if 'status' in data:
-            metrics_to_populate = []
-            http_status = data['status']
+        counted = defaultdict(int)
+        for http_status, count in batch.counts('status').iteritems():
+            if not http_status:
+                continue
 
             # add separate metrics for specific 4xx and 5xx codes
-            if http_status.startswith('4'):
-                if http_status in ('403', '404'):
-                    metrics_to_populate.append('nginx.http.status.%s' % http_status)
-            elif http_status.startswith('5'):
-                if http_status in ('500', '502', '503', '504'):
-                    metrics_to_populate.append('nginx.http.status.%s' % http_status)
+            if http_status in ('403', '404', '500', '502', '503', '504'):
+                counted['nginx.http.status.%s' % http_status] += count
 
-            metrics_to_populate.append('nginx.http.status.%sxx' % http_status[0])
+            counted['nginx.http.status.%sxx' % http_status[0]] += count
 
-            for metric_name in metrics_to_populate:
-                self.object.statsd.incr(metric_name)
-                if matched_filters:
-                    self.count_custom_filter(matched_filters, metric_name, 1, self.object.statsd.incr)
+            if http_status == '499':
+                counted['nginx.http.status.discarded'] += count
 
-                if data['status'] == '499':
-                    metric_name = 'nginx.http.status.discarded'
-                    self.object.statsd.incr(metric_name)
-                    if matched_filters:
-                        self.count_custom_filter(matched_filters, metric_name, 1, self.object.statsd.incr)
+        for metric_name, value in counted.iteritems():
+            self.count(batch, metric_name, value)
 
-    def http_version(self, data, matched_filters=None):
+    def http_version(self, batch):
         """
         nginx.http.v0_9
         nginx.http.v1_0
         nginx.http.v1_1
         nginx.http.v2
 
-        :param data: {} of parsed line
-        :param matched_filters: [] of matched filters
+        :param batch: AccessLogBatch of parsed lines
         """
-        if 'server_protocol' in data:
-            proto = data['server_protocol']
+        counted = defaultdict(int)
+        for proto, count in batch.counts('server_protocol').iteritems():
             if not proto.startswith('HTTP'):
-                return
+                continue
 
             version = proto.split('/')[-1]
 
@@ -259,64 +335,52 @@ class NginxAccessLogsCollector(AbstractCollector):
             else:
                 suffix = version.replace('.', '_')
 
-            metric_name = 'nginx.http.v%s' % suffix
-            self.object.statsd.incr(metric_name)
-            if matched_filters:
-                self.count_custom_filter(matched_filters, metric_name, 1, self.object.statsd.incr)
+            counted['nginx.http.v%s' % suffix] += count
+
+        for metric_name, value in counted.iteritems():
+            self.count(batch, metric_name, value)
 
-    def request_length(self, data, matched_filters=None):
+    def request_length(self, batch):
         """
         nginx.http.request.length
 
-        :param data: {} of parsed line
-        :param matched_filters: [] of matched filters
+        :param batch: AccessLogBatch of parsed lines
         """
-        if 'request_length' in data:
-            metric_name, value = 'nginx.http.request.length', data['request_length']
-            self.object.statsd.average(metric_name, value)
-            if matched_filters:
-                self.count_custom_filter(matched_filters, metric_name, value, self.object.statsd.average)
+        values = batch.column('request_length')
+        if values:
+            self.average(batch, 'nginx.http.request.length', values)
 
-    def body_bytes_sent(self, data, matched_filters=None):
+    def body_bytes_sent(self, batch):
         """
         nginx.http.request.body_bytes_sent
 
-        :param data: {} of parsed line
-        :param matched_filters: [] of matched filters
+        :param batch: AccessLogBatch of parsed lines
         """
-        if 'body_bytes_sent' in data:
-            metric_name, value = 'nginx.http.request.body_bytes_sent', data['body_bytes_sent']
-            self.object.statsd.incr(metric_name, value)
-            if matched_filters:
-                self.count_custom_filter(matched_filters, metric_name, value, self.object.statsd.incr)
+        values = batch.column('body_bytes_sent')
+        if values:
+            self.count(batch, 'nginx.http.request.body_bytes_sent', sum(values))
 
-    def bytes_sent(self, data, matched_filters=None):
+    def bytes_sent(self, batch):
         """
         nginx.http.request.bytes_sent
 
-        :param data: {} of parsed line
-        :param matched_filters: [] of matched filters
+        :param batch: AccessLogBatch of parsed lines
         """
-        if 'bytes_sent' in data:
-            metric_name, value = 'nginx.http.request.bytes_sent', data['bytes_sent']
-            self.object.statsd.incr(metric_name, value)
-            if matched_filters:
-                self.count_custom_filter(matched_filters, metric_name, value, self.object.statsd.incr)
+        values = batch.column('bytes_sent')
+        if values:
+            self.count(batch, 'nginx.http.request.bytes_sent', sum(values))
 
-    def gzip_ration(self, data, matched_filters=None):
+    def gzip_ration(self, batch):
         """
         nginx.http.gzip.ratio
 
-        :param data: {} of parsed line
-        :param matched_filters: [] of matched filters
+        :param batch: AccessLogBatch of parsed lines
         """
-        if 'gzip_ratio' in data:
-            metric_name, value = 'nginx.http.gzip.ratio', data['gzip_ratio']
-            self.object.statsd.average(metric_name, value)
-            if matched_filters:
-                self.count_custom_filter(matched_filters, metric_name, value, self.object.statsd.average)
+        values = batch.column('gzip_ratio')
+        if values:
+            self.average(batch, 'nginx.http.gzip.ratio', values)
 
-    def request_time(self, data, matched_filters=None):
+    def request_time(self, batch):
         """
         nginx.http.request.time
         nginx.http.request.time.median
@@ -324,18 +388,13 @@ class NginxAccessLogsCollector(AbstractCollector):
         nginx.http.request.time.pctl95
         nginx.http.request.time.count
 
-        :param data: {} of parsed line
-        :param matched_filters: [] of matched filters
+        :param batch: AccessLogBatch of parsed lines
         """
-        if 'request_time' in data:
-            metric_name, value = 'nginx.http.request.time', sum(data['request_time'])
-            self.object.statsd.timer(metric_name, value)
-            if matched_filters:
-                self.count_custom_filter(self.create_parent_filters(matched_filters, parent_metric=metric_name),
-                                         metric_name, value,
-                                         self.object.statsd.timer)
+        values = batch.column('request_time')
+        if values:
+            self.timer(batch, 'nginx.http.request.time', map(sum, values))
 
-    def upstreams(self, data, matched_filters=None):
+    def upstreams(self, batch):
         """
         nginx.cache.bypass
         nginx.cache.expired
@@ -368,106 +427,105 @@ class NginxAccessLogsCollector(AbstractCollector):
         nginx.upstream.status.5xx
         nginx.upstream.response.length
 
-        :param data: {} of parsed line
-        :param matched_filters: [] of matched filters
-        """
-        if not any(key.startswith('upstream') and data[key] not in ('-', '') for key in data):
-            return
-
-        # counters
-        upstream_response = False
-        if 'upstream_status' in data:
-            for status in data['upstream_status']:  # upstream_status is parsed as a list
-                if status.isdigit():
-                    suffix = '%sxx' % status[0]
-                    metric_name = 'nginx.upstream.status.%s' % suffix
-                    upstream_response = True if suffix in ('2xx', '3xx') else False   # Set flag for upstream length processing
-                    self.object.statsd.incr(metric_name)
-                    if matched_filters:
-                        self.count_custom_filter(matched_filters, metric_name, 1, self.object.statsd.incr)
-
-        if upstream_response and 'upstream_response_length' in data:
-            metric_name, value = 'nginx.upstream.response.length', data['upstream_response_length']
-            self.object.statsd.average(metric_name, value)
-            if matched_filters:
-                self.count_custom_filter(matched_filters, metric_name, value, self.object.statsd.average)
-
-        # gauges
-        upstream_switches = None
-        for metric_name, key_name in {
-            'nginx.upstream.connect.time': 'upstream_connect_time',
-            'nginx.upstream.response.time': 'upstream_response_time',
-            'nginx.upstream.header.time': 'upstream_header_time'
-        }.iteritems():
-            if key_name in data:
-                values = data[key_name]
-
-                # set upstream switches one time
-                if len(values) > 1 and upstream_switches is None:
-                    upstream_switches = len(values) - 1
-
-                # store all values
-                value = sum(values)
-                self.object.statsd.timer(metric_name, value)
-                if matched_filters:
-                    self.count_custom_filter(self.create_parent_filters(matched_filters, parent_metric=metric_name),
-                                             metric_name,
-                                             value, self.object.statsd.timer)
-
-        # log upstream switches
-        metric_name, value = 'nginx.upstream.next.count', 0 if upstream_switches is None else upstream_switches
-        self.object.statsd.incr(metric_name, value)
-        if matched_filters:
-            self.count_custom_filter(matched_filters, metric_name, value, self.object.statsd.incr)
-
-        # cache
-        if 'upstream_cache_status' in data:
-            cache_status = data['upstream_cache_status']
-            cache_status_lower = cache_status.lower()
-            if cache_status_lower in self.valid_cache_statuses:
-                metric_name = 'nginx.cache.%s' % cache_status_lower
-                self.object.statsd.incr(metric_name)
-                if matched_filters:
-                    self.count_custom_filter(matched_filters, metric_name, 1, self.object.statsd.incr)
-
-        # log total upstream requests
-        metric_name = 'nginx.upstream.request.count'
-        self.object.statsd.incr(metric_name)
-        if matched_filters:
-            self.count_custom_filter(matched_filters, metric_name, 1, self.object.statsd.incr)
-
-    @staticmethod
-    def create_parent_filters(original_filters, parent_metric):
+        :param batch: AccessLogBatch of parsed lines
         """
-        median, max, pctl95, and count are created in statsd.flush().  So if a
-        filter on nginx.upstream.response.time.median is created, the filter metric
-        should be truncated to nginx.upstream.response.time
+        counted = defaultdict(int)
+        lengths = []
+        timers = defaultdict(list)
 
-        :param original_filters:
-        :param truncated_metric:
-        :return:
-        """
-        parent_filters = []
-        for original_filter in original_filters:
-            if parent_metric not in original_filter.metric:
+        # upstream variables depend on each other, so they are handled line by line
+        for data in batch.records:
+            if not any(key.startswith('upstream') and data[key] not in ('-', '') for key in data):
                 continue
-            parent_filter = copy.deepcopy(original_filter)
-            parent_filter.metric = parent_metric
-            parent_filters.append(parent_filter)
-        return parent_filters
 
-    @staticmethod
-    def count_custom_filter(matched_filters, metric_name, value, method):
+            # counters
+            upstream_response = False
+            if 'upstream_status' in data:
+                for status in data['upstream_status']:  # upstream_status is parsed as a list
+                    if status.isdigit():
+                        suffix = '%sxx' % status[0]
+                        counted['nginx.upstream.status.%s' % suffix] += 1
+                        upstream_response = True if suffix in ('2xx', '3xx') else False   # Set flag for upstream length processing
+
+            if upstream_response and 'upstream_response_length' in data:
+                lengths.append(data['upstream_response_length'])
+
+            # gauges
+            upstream_switches = None
+            for metric_name, key_name in self.upstream_timers:
+                if key_name in data:
+                    values = data[key_name]
+
+                    # set upstream switches one time
+                    if len(values) > 1 and upstream_switches is None:
+                        upstream_switches = len(values) - 1
+
+                    # store all values
+                    timers[metric_name].append(sum(values))
+
+            # log upstream switches
+            counted['nginx.upstream.next.count'] += 0 if upstream_switches is None else upstream_switches
+
+            # cache
+            if 'upstream_cache_status' in data:
+                cache_status_lower = data['upstream_cache_status'].lower()
+                if cache_status_lower in self.valid_cache_statuses:
+                    counted['nginx.cache.%s' % cache_status_lower] += 1
+
+            # log total upstream requests
+            counted['nginx.upstream.request.count'] += 1
+
+        for metric_name, value in counted.iteritems():
+            self.count(batch, metric_name, value)
+
+        if lengths:
+            self.average(batch, 'nginx.upstream.response.length', lengths)
+
+        for metric_name, values in timers.iteritems():
+            self.timer(batch, metric_name, values)
+
+    def count(self, batch, metric_name, value):
+        """
+        Reports a counter for a batch either as is or as a custom filter metric
+
+        :param batch: AccessLogBatch of parsed lines
+        :param metric_name: str metric name
+        :param value: int value
+        """
+        log_filter = batch.log_filter
+        if log_filter is None:
+            self.object.statsd.incr(metric_name, value)
+        elif log_filter.metric == metric_name:
+            self.object.statsd.incr('%s||%s' % (metric_name, log_filter.filter_rule_id), value)
+
+    def average(self, batch, metric_name, values):
         """
-        Collect custom metric
+        Reports average values for a batch either as is or as a custom filter metric
 
-        :param matched_filters: [] of matched filters
+        :param batch: AccessLogBatch of parsed lines
         :param metric_name: str metric name
-        :param value: int/float value
-        :param method: function to call
-        :return:
-        """
-        for log_filter in matched_filters:
-            if log_filter.metric == metric_name:
-                full_metric_name = '%s||%s' % (log_filter.metric, log_filter.filter_rule_id)
-                method(full_metric_name, value)
+        :param values: [] of int/float values
+        """
+        log_filter = batch.log_filter
+        if log_filter is None:
+            self.object.statsd.average_values(metric_name, values)
+        elif log_filter.metric == metric_name:
+            self.object.statsd.average_values('%s||%s' % (metric_name, log_filter.filter_rule_id), values)
+
+    def timer(self, batch, metric_name, values):
+        """
+        Reports timer values for a batch either as is or as a custom filter metric
+
+        median, max, pctl95, and count are created in statsd.flush().  So if a
+        filter on nginx.upstream.response.time.median is created, the filter metric
+        should be truncated to nginx.upstream.response.time
+
+        :param batch: AccessLogBatch of parsed lines
+        :param metric_name: str metric name
+        :param values: [] of float values
+        """
+        log_filter = batch.log_filter
+        if log_filter is None:
+            self.object.statsd.timer_values(metric_name, values)
+        elif metric_name in log_filter.metric:
+            self.object.statsd.timer_values('%s||%s' % (metric_name, log_filter.filter_rule_id), values)
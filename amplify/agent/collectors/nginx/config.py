@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
+import os
 import time
 
 from amplify.agent.collectors.abstract import AbstractCollector
 from amplify.agent.common.context import context
 from amplify.agent.data.eventd import CRITICAL, INFO, WARNING
+from amplify.agent.pipelines.inotify import AmplifyInotifyError, DirectoryWatcher
 
 __author__ = "Mike Belov"
 __copyright__ = "Copyright (C) Nginx, Inc. All rights reserved."
@@ -28,6 +30,10 @@ class NginxConfigCollector(AbstractCollector):
 
         self.parse_delay = context.app_config['containers'].get('nginx', {}).get('parse_delay', DEFAULT_PARSE_DELAY)
 
+        # inotify watches on config (and cert) directories, None if they can't be used
+        self.watcher = None
+        self.watch_failed = False
+
         self.register(
             self.parse_config
         )
@@ -38,7 +44,8 @@ class NginxConfigCollector(AbstractCollector):
 
         Will not run if:
             a) it hasn't been long enough since the last time it parsed (unless `no_delay` is True)
-            b) the configuration files from the last parse haven't changed
+            b) inotify didn't report any changes in config directories since the last structure walk
+            c) the configuration files from the last parse haven't changed
 
         :param no_delay: bool - ignore delay times for this run (useful for testing)
         """
@@ -48,7 +55,12 @@ class NginxConfigCollector(AbstractCollector):
         if not no_delay and time.time() < config.wait_until:
             return
 
+        # don't even walk the config structure if nothing happened in its directories
+        if self.watcher is not None and self.previous['files'] and not self.watcher.changed():
+            return
+
         files, directories = config.collect_structure(include_ssl_certs=self.object.upload_ssl)
+        self.watch(files, directories)
 
         # only parse config if config files have changed since last collect
         if files == self.previous['files']:
@@ -131,3 +143,37 @@ class NginxConfigCollector(AbstractCollector):
             }
         }
         self.object.configd.config(payload=payload, checksum=checksum)
+
+    def watch(self, files, directories):
+        """
+        Watches directories of config files (and certs) and of included
+        directories.  Falls back to walking the config structure every time if
+        inotify can't be used.
+
+        :param files: {} of files from NginxConfig.collect_structure()
+        :param directories: {} of directories from NginxConfig.collect_structure()
+        """
+        if self.watch_failed:
+            return
+
+        paths = set()
+        for filename in files:
+            paths.add(os.path.dirname(filename))
+            paths.add(os.path.dirname(os.path.realpath(filename)))  # symlinks like sites-enabled/*
+        for directory in directories:
+            directory = directory.rstrip('/') or '/'
+            paths.add(directory)
+            paths.add(os.path.dirname(directory))  # new directories matching wildcard includes
+
+        try:
+            if self.watcher is None:
+                self.watcher = DirectoryWatcher()
+            self.watcher.watch(paths)
+        except AmplifyInotifyError as e:
+            context.log.debug(
+                'falling back to config structure walks for %s due to %s' % (self.object.config.filename, e)
+            )
+            if self.watcher is not None:
+                self.watcher.stop()
+            self.watcher = None
+            self.watch_failed = True
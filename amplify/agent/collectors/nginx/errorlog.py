@@ -4,7 +4,7 @@ from amplify.agent.objects.nginx.log.error import NginxErrorLogParser
 
 from amplify.agent.common.context import context
 from amplify.agent.pipelines.abstract import Pipeline
-from amplify.agent.pipelines.file import FileTail
+from amplify.agent.pipelines.inotify import create_file_tail
 from amplify.agent.objects.nginx.config.config import ERROR_LOG_LEVELS
 
 __author__ = "Mike Belov"
@@ -29,7 +29,8 @@ class NginxErrorLogsCollector(AbstractCollector):
         self.filename = filename
         self.level = level
         self.parser = NginxErrorLogParser()
-        self.tail = tail if tail is not None else FileTail(filename)
+        self.tail = tail if tail is not None else create_file_tail(filename)
+        self.error_counters = dict((name, self.object.statsd.counter_handle(name)) for name in self.zero_counters)
         self.register(self.error_log_parsed)
 
     def collect(self):
@@ -52,5 +53,14 @@ class NginxErrorLogsCollector(AbstractCollector):
         tail_name = self.tail.name if isinstance(self.tail, Pipeline) else 'list'
         context.log.debug('%s processed %s lines from %s' % (self.object.definition_hash, count, tail_name))
 
+    def _sleep(self):
+        if isinstance(self.tail, Pipeline):
+            self.tail.wait(self.interval)
+        else:
+            super(NginxErrorLogsCollector, self)._sleep()
+
     def error_log_parsed(self, error):
-        self.object.statsd.incr(error)
+        counter = self.error_counters.get(error)
+        if counter is None:
+            counter = self.error_counters[error] = self.object.statsd.counter_handle(error)
+        counter.incr()
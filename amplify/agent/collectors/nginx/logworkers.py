@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+"""
+Access log parsing in worker processes.
+
+All collectors run as greenlets of a single process, so access log parsing
+can't use more than one core.  With "log_workers = N" in the [nginx] section
+of the agent config, access log files are tailed, parsed and aggregated in a
+pool of N forked worker processes instead.  Every collect the parent asks the
+worker for the metrics aggregated since the previous request and merges them
+into the object's StatsdClient (timers come back as quantile sketches, so
+the payload doesn't depend on the number of lines).
+"""
+import itertools
+import multiprocessing
+import socket
+import time
+
+from collections import defaultdict
+
+import gevent
+from gevent.socket import wait_read
+
+from amplify.agent.collectors.abstract import AbstractCollector
+from amplify.agent.collectors.nginx.accesslog import NginxAccessLogsCollector
+from amplify.agent.common.context import context
+from amplify.agent.common.errors import AmplifyException
+from amplify.agent.data.statsd import StatsdClient
+from amplify.agent.pipelines.abstract import Pipeline
+from amplify.agent.pipelines.checkpoint import CHECKPOINTS
+from amplify.agent.pipelines.file import FileTail
+
+
+__author__ = "Mike Belov"
+__copyright__ = "Copyright (C) Nginx, Inc. All rights reserved."
+__license__ = ""
+__maintainer__ = "Mike Belov"
+__email__ = "dedm@nginx.com"
+
+
+# worker processes shared by all nginx objects
+LOG_WORKERS = []
+_next_worker = itertools.count()
+
+
+class AmplifyLogWorkerError(AmplifyException):
+    description = "Log worker process failed"
+
+
+def log_workers_count():
+    """
+    :return: int number of worker processes configured for access log parsing (0 means disabled)
+    """
+    try:
+        return int(context.app_config.get('nginx', {}).get('log_workers') or 0)
+    except ValueError:
+        return 0
+
+
+def get_log_worker():
+    """
+    Returns one of the worker processes, starting them on demand.  Log files
+    are distributed between workers round robin.
+
+    :return: LogWorker
+    """
+    count = log_workers_count()
+    while len(LOG_WORKERS) < count:
+        LOG_WORKERS.append(LogWorker())
+
+    return LOG_WORKERS[_next_worker.next() % len(LOG_WORKERS)]
+
+
+class WorkerObject(object):
+    """
+    Stand-in for an nginx object inside a worker process
+    """
+    in_container = False
+
+    def __init__(self, definition_hash, filters):
+        self.definition_hash = definition_hash
+        self.filters = filters
+        self.statsd = StatsdClient(object=self)
+        self.statsd.timer_backend = 'sketch'
+
+
+def worker_main(conn):
+    """
+    Worker process loop: registers tails and answers collect requests
+
+    :param conn: multiprocessing.Connection to the agent process
+    """
+    # the forked hub still has all greenlets of the agent scheduled, so start from a clean one
+    gevent.get_hub().destroy(destroy_loop=True)
+
+    # offsets are saved by the agent process
+    CHECKPOINTS.writable = False
+
+    collectors = {}
+    while True:
+        try:
+            request_id, command, key, args = conn.recv()
+        except (EOFError, IOError, KeyboardInterrupt):
+            break
+
+        try:
+            if command == 'register':
+                filename, log_format, definition_hash, filters = args
+                collectors[key] = NginxAccessLogsCollector(
+                    object=WorkerObject(definition_hash, filters),
+                    log_format=log_format,
+                    tail=FileTail(filename)
+                )
+                result = None
+            elif command == 'collect':
+                collector = collectors[key]
+                statsd = collector.object.statsd
+                collector.collect()
+                statsd.collect_handles()
+                metrics, statsd.current = dict(statsd.current), defaultdict(dict)
+                result = metrics, CHECKPOINTS.get(collector.tail.filename)
+            elif command == 'unregister':
+                collectors.pop(key, None)
+                result = None
+            else:
+                break
+        except Exception as e:
+            context.log.debug('log worker failed to %s %s' % (command, key), exc_info=True)
+            result = AmplifyLogWorkerError(message='%s raised %s' % (command, e.__class__.__name__))
+
+        conn.send((request_id, result))
+
+
+class LogWorker(object):
+    """
+    Handle of a worker process in the agent process
+    """
+    timeout = 60.0
+
+    def __init__(self):
+        self.conn = None
+        self.process = None
+        self.registered = {}
+        self._request_ids = itertools.count()
+
+    def start(self):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=worker_main, args=(child_conn,), name='amplify-log-worker')
+        self.process.daemon = True
+        self.process.start()
+        child_conn.close()
+        context.log.debug('started log worker %s' % self.process.pid)
+
+        # restore tails if this is a restart
+        for key, args in self.registered.items():
+            self.request('register', key, args)
+
+    def stop(self):
+        if self.process is not None:
+            try:
+                self.conn.close()
+                self.process.terminate()
+                self.process.join(1)
+            except Exception:
+                context.log.debug('failed to stop log worker', exc_info=True)
+            self.process = None
+            self.conn = None
+
+    def request(self, command, key, args=None):
+        """
+        Sends a command to the worker and waits (cooperatively) for the result.
+        Replies to earlier requests that timed out are skipped.
+
+        :return: command result
+        """
+        if self.process is None or not self.process.is_alive():
+            self.stop()
+            self.start()
+
+        request_id = self._request_ids.next()
+        self.conn.send((request_id, command, key, args))
+
+        deadline = time.time() + self.timeout
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise AmplifyLogWorkerError(message='%s timed out' % command, payload=dict(key=key))
+
+            try:
+                wait_read(self.conn.fileno(), timeout=remaining)
+                reply_id, result = self.conn.recv()
+            except socket.timeout:
+                continue
+            except (EOFError, IOError):
+                self.stop()
+                raise AmplifyLogWorkerError(message='worker died during %s' % command, payload=dict(key=key))
+
+            if reply_id != request_id:
+                continue
+
+            if isinstance(result, AmplifyLogWorkerError):
+                raise result
+            return result
+
+    def register(self, key, filename, log_format, definition_hash, filters):
+        args = (filename, log_format, definition_hash, filters)
+        self.request('register', key, args)
+        self.registered[key] = args
+
+    def unregister(self, key):
+        if self.registered.pop(key, None) is not None and self.process is not None:
+            self.request('unregister', key)
+
+    def collect(self, key):
+        return self.request('collect', key)
+
+
+class LogWorkerTail(Pipeline):
+    """
+    Pipeline for a log file that is tailed in a worker process.  It has no
+    lines to iterate in the agent process, it just ties the file to a worker.
+    """
+
+    def __init__(self, filename, log_format, object):
+        super(LogWorkerTail, self).__init__(name='file:%s' % filename)
+        self.filename = filename
+        self.key = '%s:%s' % (object.definition_hash, filename)
+        self.worker = get_log_worker()
+        self.worker.register(self.key, filename, log_format, object.definition_hash, object.filters)
+
+    def __next__(self):
+        raise StopIteration
+
+    def collect(self):
+        """
+        :return: {} of metrics aggregated by the worker since the last call
+        """
+        metrics, checkpoint = self.worker.collect(self.key)
+        if checkpoint:
+            CHECKPOINTS.set(self.filename, checkpoint)
+        return metrics
+
+    def stop(self):
+        if self.worker is not None:
+            try:
+                self.worker.unregister(self.key)
+            except AmplifyLogWorkerError:
+                context.log.debug('failed to unregister %s from log worker' % self.name, exc_info=True)
+            self.worker = None
+
+
+class NginxAccessLogsWorkerCollector(AbstractCollector):
+    """
+    Access log collector that merges metrics parsed by a worker process
+    """
+    short_name = 'nginx_alog'
+
+    def __init__(self, tail=None, **kwargs):
+        super(NginxAccessLogsWorkerCollector, self).__init__(**kwargs)
+        self.tail = tail
+
+    def collect(self):
+        if self.tail.worker is None:
+            return
+
+        try:
+            metrics = self.tail.collect()
+        except AmplifyLogWorkerError as e:
+            context.log.error('failed to collect %s from log worker: %s' % (self.tail.name, e))
+            context.log.debug('additional info:', exc_info=True)
+            return
+
+        self.object.statsd.merge(metrics)
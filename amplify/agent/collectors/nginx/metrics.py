@@ -426,9 +426,7 @@ class NginxMetricsCollector(AbstractMetricsCollector):
 
         http_upstreams = http.get('upstreams', {})
         for upstream in http_upstreams.values():
-            for peer in upstream.get('peers', []):
-                for method in api_http_upstream.UPSTREAM_PEER_COLLECT_INDEX:
-                    method(self, peer, stamp)
+            api_http_upstream.UPSTREAM_PEER_COLUMNS.collect(self, upstream.get('peers', []), stamp)
             for method in api_http_upstream.UPSTREAM_COLLECT_INDEX:
                 method(self, upstream, stamp)
 
@@ -444,9 +442,7 @@ class NginxMetricsCollector(AbstractMetricsCollector):
 
         stream_upstreams = stream.get('upstreams', {})
         for upstream in stream_upstreams.values():
-            for peer in upstream.get('peers', []):
-                for method in api_stream_upstream.STREAM_UPSTREAM_PEER_COLLECT_INDEX:
-                    method(self, peer, stamp)
+            api_stream_upstream.STREAM_UPSTREAM_PEER_COLUMNS.collect(self, upstream.get('peers', []), stamp)
             for method in api_stream_upstream.STREAM_UPSTREAM_COLLECT_INDEX:
                 method(self, upstream, stamp)
 
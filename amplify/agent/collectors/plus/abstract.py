@@ -1,6 +1,4 @@
 # -*- coding: utf-8 -*-
-import copy
-
 from amplify.agent.collectors.abstract import AbstractMetricsCollector
 from amplify.agent.common.context import context
 
@@ -47,7 +45,7 @@ class PlusStatusCollector(AbstractMetricsCollector):
         try:
             for status, stamp in reversed(context.plus_cache[self.object.plus_status_internal_url]):
                 if stamp > self.last_collect:
-                    data.append(copy.deepcopy(status[area][name]))
+                    data.append(status[area][name])
                     stamps.append(stamp)
                 else:
                     break  # We found the last collected payload
@@ -103,7 +101,7 @@ class PlusAPICollector(AbstractMetricsCollector):
                     api_sub_payload = api_payload
                     for subarea in self.api_payload_path:
                         api_sub_payload = api_sub_payload[subarea]
-                    data.append(copy.deepcopy(api_sub_payload[self.object.local_name]))
+                    data.append(api_sub_payload[self.object.local_name])
                     stamps.append(stamp)
                 else:
                     break
@@ -3,10 +3,13 @@
 from amplify.agent.collectors.plus.abstract import PlusAPICollector
 from amplify.agent.collectors.plus.util.api.http_cache import CACHE_COLLECT_INDEX
 from amplify.agent.collectors.plus.util.api.http_server_zone import STATUS_ZONE_COLLECT_INDEX
-from amplify.agent.collectors.plus.util.api.http_upstream import UPSTREAM_COLLECT_INDEX, UPSTREAM_PEER_COLLECT_INDEX
+from amplify.agent.collectors.plus.util.api.http_upstream import UPSTREAM_COLLECT_INDEX, UPSTREAM_PEER_COLUMNS
 from amplify.agent.collectors.plus.util.api.slab import SLAB_COLLECT_INDEX
 from amplify.agent.collectors.plus.util.api.stream_server_zone import STREAM_COLLECT_INDEX
-from amplify.agent.collectors.plus.util.api.stream_upstream import STREAM_UPSTREAM_COLLECT_INDEX, STREAM_UPSTREAM_PEER_COLLECT_INDEX
+from amplify.agent.collectors.plus.util.api.stream_upstream import (
+    STREAM_UPSTREAM_COLLECT_INDEX,
+    STREAM_UPSTREAM_PEER_COLUMNS
+)
 
 __author__ = "Raymond Lau"
 __copyright__ = "Copyright (C) Nginx, Inc. All rights reserved."
@@ -29,20 +32,27 @@ class ApiHttpServerZoneCollector(PlusAPICollector):
 
 class ApiHttpUpstreamCollector(PlusAPICollector):
     short_name = 'api_http_upstream'
-    collect_index = UPSTREAM_PEER_COLLECT_INDEX
+    collect_index = []
+    peer_columns = UPSTREAM_PEER_COLUMNS
     additional_collect_index = UPSTREAM_COLLECT_INDEX
     api_payload_path = ['http', 'upstreams']
 
     def collect_from_data(self, data, stamp):
         """
+        Peers are aggregated all at once by peer_columns, the upstream itself by additional_collect_index
 
         :param data:
         :param stamp:
         :return:
         """
+        if self.zero_counters:
+            self.init_counters()
+
         peers = data.get('peers', data) if isinstance(data, dict) else data
-        for peer in peers:
-            super(ApiHttpUpstreamCollector, self).collect_from_data(peer, stamp)
+        try:
+            self.peer_columns.collect(self, peers, stamp)
+        except Exception as e:
+            self.handle_exception(self.peer_columns.collect, e)
 
         for method in self.additional_collect_index:
             method(self, data, stamp)
@@ -67,6 +77,6 @@ class ApiStreamServerZoneCollector(ApiHttpServerZoneCollector):
 
 class ApiStreamUpstreamCollector(ApiHttpUpstreamCollector):
     short_name = 'api_stream_upstream'
-    collect_index = STREAM_UPSTREAM_PEER_COLLECT_INDEX
+    peer_columns = STREAM_UPSTREAM_PEER_COLUMNS
     additional_collect_index = STREAM_UPSTREAM_COLLECT_INDEX
     api_payload_path = ['stream', 'upstreams']
@@ -1,5 +1,4 @@
 # -*- coding: utf-8 -*-
-import copy
 
 
 __author__ = "Grant Hulegaard"
@@ -45,7 +44,7 @@ def collect_cache_metrics(collector, data, stamp):
             metric_base: data_bucket['responses']
         })
 
-        collector.aggregate_counters(copy.deepcopy(counted_vars), stamp=stamp)
+        collector.aggregate_counters(counted_vars, stamp=stamp)
 
 
 CACHE_COLLECT_INDEX = [
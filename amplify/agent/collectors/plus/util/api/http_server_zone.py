@@ -1,5 +1,4 @@
 # -*- coding: utf-8 -*-
-import copy
 
 
 __author__ = "Grant Hulegaard"
@@ -14,7 +13,7 @@ def collect_http_request(collector, data, stamp):
         'plus.http.request.count': data['requests']
     }
 
-    collector.aggregate_counters(copy.deepcopy(counted_vars), stamp=stamp)
+    collector.aggregate_counters(counted_vars, stamp=stamp)
 
 
 def collect_http_responses(collector, data, stamp):
@@ -29,7 +28,7 @@ def collect_http_responses(collector, data, stamp):
         'plus.http.status.5xx': responses['5xx']
     }
 
-    collector.aggregate_counters(copy.deepcopy(counted_vars), stamp=stamp)
+    collector.aggregate_counters(counted_vars, stamp=stamp)
 
 
 def collect_http_discarded(collector, data, stamp):
@@ -37,7 +36,7 @@ def collect_http_discarded(collector, data, stamp):
         'plus.http.status.discarded': data['discarded']
     }
 
-    collector.aggregate_counters(copy.deepcopy(counted_vars), stamp=stamp)
+    collector.aggregate_counters(counted_vars, stamp=stamp)
 
 
 def collect_http_bytes(collector, data, stamp):
@@ -46,7 +45,7 @@ def collect_http_bytes(collector, data, stamp):
         'plus.http.request.bytes_rcvd': data['received']
     }
 
-    collector.aggregate_counters(copy.deepcopy(counted_vars), stamp=stamp)
+    collector.aggregate_counters(counted_vars, stamp=stamp)
 
 
 STATUS_ZONE_COLLECT_INDEX = [
@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-import copy
+from amplify.agent.collectors.plus.util.api.peers import PeerColumns
 
 
 __author__ = "Grant Hulegaard"
@@ -18,7 +18,7 @@ def collect_upstream_request(collector, data, stamp):
         'plus.upstream.request.count': data['requests']
     }
 
-    collector.aggregate_counters(copy.deepcopy(counted_vars), stamp=stamp)
+    collector.aggregate_counters(counted_vars, stamp=stamp)
 
 
 def collect_upstream_header_time(collector, data, stamp):
@@ -45,7 +45,7 @@ def collect_upstream_responses(collector, data, stamp):
         'plus.upstream.status.5xx': responses['5xx']
     }
 
-    collector.aggregate_counters(copy.deepcopy(counted_vars), stamp=stamp)
+    collector.aggregate_counters(counted_vars, stamp=stamp)
 
 
 def collect_upstream_bytes(collector, data, stamp):
@@ -54,7 +54,7 @@ def collect_upstream_bytes(collector, data, stamp):
         'plus.upstream.bytes_rcvd': data['received']
     }
 
-    collector.aggregate_counters(copy.deepcopy(counted_vars), stamp=stamp)
+    collector.aggregate_counters(counted_vars, stamp=stamp)
 
 
 def collect_upstream_fails(collector, data, stamp):
@@ -63,7 +63,7 @@ def collect_upstream_fails(collector, data, stamp):
         'plus.upstream.unavail.count': data['unavail']
     }
 
-    collector.aggregate_counters(copy.deepcopy(counted_vars), stamp=stamp)
+    collector.aggregate_counters(counted_vars, stamp=stamp)
 
 
 def collect_upstream_health_checks(collector, data, stamp):
@@ -75,7 +75,7 @@ def collect_upstream_health_checks(collector, data, stamp):
         'plus.upstream.health.unhealthy': health_checks['unhealthy']
     }
 
-    collector.aggregate_counters(copy.deepcopy(counted_vars), stamp=stamp)
+    collector.aggregate_counters(counted_vars, stamp=stamp)
 
 
 def collect_upstream_peer_count(collector, data, stamp):
@@ -97,7 +97,7 @@ def collect_upstream_queue(collector, data, stamp):
             'plus.upstream.queue.overflows': queue['overflows'],
         }
 
-        collector.aggregate_counters(copy.deepcopy(counted_vars), stamp=stamp)
+        collector.aggregate_counters(counted_vars, stamp=stamp)
 
 
 def collect_upstream_conn_keepalive_zombies(collector, data, stamp):
@@ -124,4 +124,32 @@ UPSTREAM_PEER_COLLECT_INDEX = [
 UPSTREAM_COLLECT_INDEX = [
     collect_upstream_queue,
     collect_upstream_conn_keepalive_zombies
-]
\ No newline at end of file
+]
+
+# same metrics as UPSTREAM_PEER_COLLECT_INDEX, aggregated for all peers at once
+UPSTREAM_PEER_COLUMNS = PeerColumns(
+    counters=[
+        ('plus.upstream.request.count', ('requests',)),
+        ('plus.upstream.response.count', ('responses', 'total')),
+        ('plus.upstream.status.1xx', ('responses', '1xx')),
+        ('plus.upstream.status.2xx', ('responses', '2xx')),
+        ('plus.upstream.status.3xx', ('responses', '3xx')),
+        ('plus.upstream.status.4xx', ('responses', '4xx')),
+        ('plus.upstream.status.5xx', ('responses', '5xx')),
+        ('plus.upstream.bytes_sent', ('sent',)),
+        ('plus.upstream.bytes_rcvd', ('received',)),
+        ('plus.upstream.fails.count', ('fails',)),
+        ('plus.upstream.unavail.count', ('unavail',)),
+        ('plus.upstream.health.checks', ('health_checks', 'checks')),
+        ('plus.upstream.health.fails', ('health_checks', 'fails')),
+        ('plus.upstream.health.unhealthy', ('health_checks', 'unhealthy')),
+    ],
+    gauges=[
+        ('plus.upstream.conn.active', ('active',), None),
+    ],
+    timers=[
+        ('plus.upstream.header.time', ('header_time',)),
+        ('plus.upstream.response.time', ('response_time',)),
+    ],
+    peer_count='plus.upstream.peer.count'
+)
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+
+__author__ = "Mike Belov"
+__copyright__ = "Copyright (C) Nginx, Inc. All rights reserved."
+__license__ = ""
+__maintainer__ = "Mike Belov"
+__email__ = "dedm@nginx.com"
+
+
+def column(peers, path, default=None):
+    """
+    Values of a field in all peers.  Peers that don't have the field are skipped (or get the default if it's set).
+
+    :param peers: [] of peer dicts
+    :param path: tuple of keys of the field, e.g. ('responses', '2xx')
+    :param default: value for peers without the field
+    :return: [] of values
+    """
+    if len(path) == 1:
+        key, = path
+        if default is not None:
+            return [peer.get(key, default) for peer in peers]
+        return [peer[key] for peer in peers if key in peer]
+
+    key, subkey = path
+    if default is not None:
+        return [peer.get(key, {}).get(subkey, default) for peer in peers]
+    return [peer[key][subkey] for peer in peers if subkey in peer.get(key, ())]
+
+
+class PeerColumns(object):
+    """
+    Aggregates metrics of all peers of an upstream at once.
+
+    Every field of the peers is read as a column (a list of values of all
+    peers), so counters are summed and passed to aggregate_counters once per
+    upstream, and gauges and timers get all values in a single statsd call.
+    The result is the same as calling the *_PEER_COLLECT_INDEX functions for
+    every peer.
+    """
+
+    def __init__(self, counters=(), gauges=(), timers=(), peer_count=None):
+        """
+        :param counters: [] of (metric name, field path) summed over peers
+        :param gauges: [] of (metric name, field path, default) reported for every peer (default None means required)
+        :param timers: [] of (metric name, field path) of milliseconds reported as seconds for every peer
+        :param peer_count: str metric name for the number of peers that are up
+        """
+        self.counters = counters
+        self.gauges = gauges
+        self.timers = timers
+        self.peer_count = peer_count
+
+    def collect(self, collector, peers, stamp):
+        """
+        :param collector: AbstractMetricsCollector
+        :param peers: [] of peer dicts
+        :param stamp: int timestamp of the payload
+        """
+        if not peers:
+            return
+
+        statsd = collector.object.statsd
+
+        counted_vars = {}
+        for metric_name, path in self.counters:
+            values = column(peers, path)
+            if values:
+                counted_vars[metric_name] = sum(values)
+        collector.aggregate_counters(counted_vars, stamp=stamp)
+
+        for metric_name, path, default in self.gauges:
+            values = column(peers, path, default)
+            if values:
+                statsd.gauge_values(metric_name, values, stamp=stamp)
+
+        for metric_name, path in self.timers:
+            values = column(peers, path)
+            if values:
+                statsd.timer_values(metric_name, [float('%.3f' % (float(value) / 1000)) for value in values])
+
+        if self.peer_count:
+            up = sum(1 for state in column(peers, ('state',)) if state.lower() == 'up')
+            if up:
+                collector.aggregate_latest([self.peer_count], stamp=stamp, count=up)
@@ -1,5 +1,4 @@
 # -*- coding: utf-8 -*-
-import copy
 
 
 __author__ = "Mike Belov"
@@ -48,7 +47,7 @@ def collect_slots(collector, data, stamp):
             slot_base + '.fails': slot_data['reqs']
         }
         collector.aggregate_counters(
-            copy.deepcopy(counted_vars), stamp=stamp
+            counted_vars, stamp=stamp
         )
 
 
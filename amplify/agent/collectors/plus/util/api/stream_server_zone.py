@@ -1,5 +1,4 @@
 # -*- coding: utf-8 -*-
-import copy
 
 
 __author__ = "Mike Belov"
@@ -16,7 +15,7 @@ def collect_conn(collector, data, stamp):
         'plus.stream.conn.accepted': data['connections']
     }
 
-    collector.aggregate_counters(copy.deepcopy(counted_vars), stamp=stamp)
+    collector.aggregate_counters(counted_vars, stamp=stamp)
 
 
 def collect_responses(collector, data, stamp):
@@ -29,7 +28,7 @@ def collect_responses(collector, data, stamp):
         'plus.stream.status.total': sessions['total']
     }
 
-    collector.aggregate_counters(copy.deepcopy(counted_vars), stamp=stamp)
+    collector.aggregate_counters(counted_vars, stamp=stamp)
 
 
 def collect_discarded(collector, data, stamp):
@@ -37,7 +36,7 @@ def collect_discarded(collector, data, stamp):
         'plus.stream.discarded': data['discarded']
     }
 
-    collector.aggregate_counters(copy.deepcopy(counted_vars), stamp=stamp)
+    collector.aggregate_counters(counted_vars, stamp=stamp)
 
 
 def collect_bytes(collector, data, stamp):
@@ -46,7 +45,7 @@ def collect_bytes(collector, data, stamp):
         'plus.stream.bytes_rcvd': data['received']
     }
 
-    collector.aggregate_counters(copy.deepcopy(counted_vars), stamp=stamp)
+    collector.aggregate_counters(counted_vars, stamp=stamp)
 
 
 STREAM_COLLECT_INDEX = [
@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-import copy
+from amplify.agent.collectors.plus.util.api.peers import PeerColumns
 
 
 __author__ = "Mike Belov"
@@ -17,7 +17,7 @@ def collect_connections(collector, data, stamp):
         'plus.stream.upstream.conn.count': data['connections']
     }
 
-    collector.aggregate_counters(copy.deepcopy(counted_vars), stamp=stamp)
+    collector.aggregate_counters(counted_vars, stamp=stamp)
 
 
 def collect_timers(collector, data, stamp):
@@ -46,7 +46,7 @@ def collect_bytes(collector, data, stamp):
         'plus.stream.upstream.bytes_rcvd': data['received']
     }
 
-    collector.aggregate_counters(copy.deepcopy(counted_vars), stamp=stamp)
+    collector.aggregate_counters(counted_vars, stamp=stamp)
 
 
 def collect_fails_unavail(collector, data, stamp):
@@ -55,7 +55,7 @@ def collect_fails_unavail(collector, data, stamp):
         'plus.stream.upstream.unavail.count': data['unavail']
     }
 
-    collector.aggregate_counters(copy.deepcopy(counted_vars), stamp=stamp)
+    collector.aggregate_counters(counted_vars, stamp=stamp)
 
 
 def collect_health_checks(collector, data, stamp):
@@ -67,7 +67,7 @@ def collect_health_checks(collector, data, stamp):
         'plus.stream.upstream.health.unhealthy': health_checks['unhealthy']
     }
 
-    collector.aggregate_counters(copy.deepcopy(counted_vars), stamp=stamp)
+    collector.aggregate_counters(counted_vars, stamp=stamp)
 
 
 def collect_peer_count(collector, data, stamp):
@@ -95,4 +95,29 @@ STREAM_UPSTREAM_PEER_COLLECT_INDEX = [
 
 STREAM_UPSTREAM_COLLECT_INDEX = [
     collect_zombies
-]
\ No newline at end of file
+]
+
+# same metrics as STREAM_UPSTREAM_PEER_COLLECT_INDEX, aggregated for all peers at once
+STREAM_UPSTREAM_PEER_COLUMNS = PeerColumns(
+    counters=[
+        ('plus.stream.upstream.conn.count', ('connections',)),
+        ('plus.stream.upstream.bytes_sent', ('sent',)),
+        ('plus.stream.upstream.bytes_rcvd', ('received',)),
+        ('plus.stream.upstream.fails.count', ('fails',)),
+        ('plus.stream.upstream.unavail.count', ('unavail',)),
+        ('plus.stream.upstream.health.checks', ('health_checks', 'checks')),
+        ('plus.stream.upstream.health.fails', ('health_checks', 'fails')),
+        ('plus.stream.upstream.health.unhealthy', ('health_checks', 'unhealthy')),
+    ],
+    gauges=[
+        ('plus.stream.upstream.conn.active', ('active',), None),
+        ('plus.stream.upstream.conn.max', ('max_conns',), 0),
+    ],
+    timers=[
+        ('plus.stream.upstream.conn.time', ('connect_time',)),
+        ('plus.stream.upstream.conn.ttfb', ('first_byte_time',)),
+        ('plus.stream.upstream.response.time', ('response_time',)),
+        ('plus.stream.upstream.downtime.time', ('downtime',)),
+    ],
+    peer_count='plus.stream.upstream.peer.count'
+)
@@ -1,5 +1,4 @@
 # -*- coding: utf-8 -*-
-import copy
 
 
 __author__ = "Grant Hulegaard"
@@ -32,7 +31,7 @@ def collect_cache_metrics(collector, data, stamp):
             'plus.cache.%s.bytes' % label: data_bucket['bytes'],
         }
 
-        collector.aggregate_counters(copy.deepcopy(counted_vars), stamp=stamp)
+        collector.aggregate_counters(counted_vars, stamp=stamp)
 
 
 CACHE_COLLECT_INDEX = [
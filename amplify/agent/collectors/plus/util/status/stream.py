@@ -1,5 +1,4 @@
 # -*- coding: utf-8 -*-
-import copy
 
 
 __author__ = "Mike Belov"
@@ -16,7 +15,7 @@ def collect_conn(collector, data, stamp):
         'plus.stream.conn.accepted': data['connections']
     }
 
-    collector.aggregate_counters(copy.deepcopy(counted_vars), stamp=stamp)
+    collector.aggregate_counters(counted_vars, stamp=stamp)
 
 
 def collect_responses(collector, data, stamp):
@@ -28,7 +27,7 @@ def collect_responses(collector, data, stamp):
         'plus.stream.status.5xx': sessions['5xx']
     }
 
-    collector.aggregate_counters(copy.deepcopy(counted_vars), stamp=stamp)
+    collector.aggregate_counters(counted_vars, stamp=stamp)
 
 
 def collect_discarded(collector, data, stamp):
@@ -36,7 +35,7 @@ def collect_discarded(collector, data, stamp):
         'plus.stream.discarded': data['discarded']
     }
 
-    collector.aggregate_counters(copy.deepcopy(counted_vars), stamp=stamp)
+    collector.aggregate_counters(counted_vars, stamp=stamp)
 
 
 def collect_bytes(collector, data, stamp):
@@ -45,7 +44,7 @@ def collect_bytes(collector, data, stamp):
         'plus.stream.bytes_rcvd': data['received']
     }
 
-    collector.aggregate_counters(copy.deepcopy(counted_vars), stamp=stamp)
+    collector.aggregate_counters(counted_vars, stamp=stamp)
 
 
 STREAM_COLLECT_INDEX = [
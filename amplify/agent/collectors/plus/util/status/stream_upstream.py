@@ -1,5 +1,4 @@
 # -*- coding: utf-8 -*-
-import copy
 
 
 __author__ = "Mike Belov"
@@ -18,7 +17,7 @@ def collect_total_connections(collector, data, stamp):
         'plus.stream.upstream.conn.count': data['connections']
     }
 
-    collector.aggregate_counters(copy.deepcopy(counted_vars), stamp=stamp)
+    collector.aggregate_counters(counted_vars, stamp=stamp)
 
 
 def collect_timers(collector, data, stamp):
@@ -41,7 +40,7 @@ def collect_bytes(collector, data, stamp):
         'plus.stream.upstream.bytes_rcvd': data['received']
     }
 
-    collector.aggregate_counters(copy.deepcopy(counted_vars), stamp=stamp)
+    collector.aggregate_counters(counted_vars, stamp=stamp)
 
 
 def collect_fails_unavail(collector, data, stamp):
@@ -50,7 +49,7 @@ def collect_fails_unavail(collector, data, stamp):
         'plus.stream.upstream.unavail.count': data['unavail']
     }
 
-    collector.aggregate_counters(copy.deepcopy(counted_vars), stamp=stamp)
+    collector.aggregate_counters(counted_vars, stamp=stamp)
 
 
 def collect_health_checks(collector, data, stamp):
@@ -62,7 +61,7 @@ def collect_health_checks(collector, data, stamp):
         'plus.stream.upstream.health.unhealthy': health_checks['unhealthy']
     }
 
-    collector.aggregate_counters(copy.deepcopy(counted_vars), stamp=stamp)
+    collector.aggregate_counters(counted_vars, stamp=stamp)
 
 
 def collect_peer_count(collector, data, stamp):
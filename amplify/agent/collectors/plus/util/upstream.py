@@ -1,5 +1,4 @@
 # -*- coding: utf-8 -*-
-import copy
 
 
 __author__ = "Grant Hulegaard"
@@ -18,7 +17,7 @@ def collect_upstream_request(collector, data, stamp):
         'plus.upstream.request.count': data['requests']
     }
 
-    collector.aggregate_counters(copy.deepcopy(counted_vars), stamp=stamp)
+    collector.aggregate_counters(counted_vars, stamp=stamp)
 
 
 def collect_upstream_header_time(collector, data, stamp):
@@ -45,7 +44,7 @@ def collect_upstream_responses(collector, data, stamp):
         'plus.upstream.status.5xx': responses['5xx']
     }
 
-    collector.aggregate_counters(copy.deepcopy(counted_vars), stamp=stamp)
+    collector.aggregate_counters(counted_vars, stamp=stamp)
 
 
 def collect_upstream_bytes(collector, data, stamp):
@@ -54,7 +53,7 @@ def collect_upstream_bytes(collector, data, stamp):
         'plus.upstream.bytes_rcvd': data['received']
     }
 
-    collector.aggregate_counters(copy.deepcopy(counted_vars), stamp=stamp)
+    collector.aggregate_counters(counted_vars, stamp=stamp)
 
 
 def collect_upstream_fails(collector, data, stamp):
@@ -63,7 +62,7 @@ def collect_upstream_fails(collector, data, stamp):
         'plus.upstream.unavail.count': data['unavail']
     }
 
-    collector.aggregate_counters(copy.deepcopy(counted_vars), stamp=stamp)
+    collector.aggregate_counters(counted_vars, stamp=stamp)
 
 
 def collect_upstream_health_checks(collector, data, stamp):
@@ -75,7 +74,7 @@ def collect_upstream_health_checks(collector, data, stamp):
         'plus.upstream.health.unhealthy': health_checks['unhealthy']
     }
 
-    collector.aggregate_counters(copy.deepcopy(counted_vars), stamp=stamp)
+    collector.aggregate_counters(counted_vars, stamp=stamp)
 
 
 def collect_upstream_queue(collector, data, stamp):
@@ -88,7 +87,7 @@ def collect_upstream_queue(collector, data, stamp):
             'plus.upstream.queue.overflows': queue['overflows'],
         }
 
-        collector.aggregate_counters(copy.deepcopy(counted_vars), stamp=stamp)
+        collector.aggregate_counters(counted_vars, stamp=stamp)
 
 
 def collect_upstream_peer_count(collector, data, stamp):
@@ -10,6 +10,7 @@ from amplify.agent.common.context import context
 from amplify.agent.common.util import host
 from amplify.agent.common.util import subp
 from amplify.agent.collectors.abstract import AbstractMetricsCollector
+from amplify.agent.pipelines.syslog import pop_syslog_stats
 
 __author__ = "Mike Belov"
 __copyright__ = "Copyright (C) Nginx, Inc. All rights reserved."
@@ -30,6 +31,7 @@ class SystemMetricsCollector(AbstractMetricsCollector):
         self.register(
             self.agent_cpu,
             self.agent_memory_info,
+            self.agent_syslog,
             self.container,
             self.virtual_memory,
             self.swap,
@@ -63,6 +65,21 @@ class SystemMetricsCollector(AbstractMetricsCollector):
         self.object.statsd.gauge('controller.agent.mem.rss', mem_info.rss)
         self.object.statsd.gauge('controller.agent.mem.vms', mem_info.vms)
 
+    def agent_syslog(self):
+        """
+        records received by syslog listeners
+
+        controller.agent.syslog.received
+        controller.agent.syslog.dropped
+        controller.agent.syslog.processed
+        """
+        stats = pop_syslog_stats()
+        if stats is None:
+            return
+
+        for name, value in stats.iteritems():
+            self.object.statsd.incr('controller.agent.syslog.%s' % name, value)
+
     def virtual_memory(self):
         """ virtual memory """
         virtual_memory = psutil.virtual_memory()
@@ -49,6 +49,7 @@ class Context(Singleton):
         self.app_name = None
         self.app_config = None
         self.listeners = None
+        self.tcp_listeners = None
         self.tags = []
         self.ids = {}
         self.action_ids = {}
@@ -164,6 +165,7 @@ class Context(Singleton):
     def _setup_app_listeners(self):
         from amplify.agent.common.util import net
         self.listeners = set()
+        self.tcp_listeners = set()  # listeners that also accept octet-counted syslog over tcp
 
         # get a list of listener names
         names = self.app_config.get('listeners', {}).get('keys', '').split(',')
@@ -178,10 +180,17 @@ class Context(Singleton):
                 listener_address = listener_definition.get('address')
                 # ...if there is an address...
                 if listener_address is not None:
-                    # ...try to format and save the ipv4 address into the context store.
+                    # ...unix datagram sockets are stored as is...
+                    if listener_address.startswith('unix:'):
+                        self.listeners.add(listener_address)
+                        continue
+
+                    # ...otherwise try to format and save the ipv4 address into the context store.
                     try:
                         _, _, formatted_address = net.ipv4_address(address=listener_address, full_format=True)
                         self.listeners.add(formatted_address)
+                        if str(listener_definition.get('tcp', False)).lower() == 'true':
+                            self.tcp_listeners.add(formatted_address)
                     except:
                         pass  # just ignore bad ipv4 definitions for now
 
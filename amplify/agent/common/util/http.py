@@ -73,25 +73,29 @@ class HTTPClient(Singleton):
         if self.gzip:
             self.session.headers.update({'Content-Encoding': 'gzip'})
 
-    def make_request(self, location, method, data=None, timeout=None, json=True, log=True):
+    def make_request(self, location, method, data=None, timeout=None, json=True, log=True, body=None, session=None):
         url = location if location.startswith('http') else '%s/%s' % (self.url, location)
         timeout = timeout if timeout is not None else self.timeout
-        payload = ujson.encode(data) if data else '{}'
-        if self.gzip:
-            payload = zlib.compress(payload, self.gzip)
+        session = session if session is not None else self.session
+        if body is not None:
+            payload = body  # already encoded (and compressed if gzip is on)
+        else:
+            payload = ujson.encode(data) if data else '{}'
+            if self.gzip:
+                payload = zlib.compress(payload, self.gzip)
 
         start_time = time.time()
         result, http_code, request_id = '', 500, None
         try:
             if method == 'get':
-                r = self.session.get(
+                r = session.get(
                     url,
                     timeout=timeout,
                     verify=self.verify_ssl_cert,
                     proxies=self.proxies
                 )
             else:
-                r = self.session.post(
+                r = session.post(
                     url,
                     data=payload,
                     timeout=timeout,
@@ -124,11 +128,11 @@ class HTTPClient(Singleton):
                 )
             )
 
-    def post(self, url, data=None, timeout=None, json=True):
-        return self.make_request(url, 'post', data=data, timeout=timeout, json=json)
+    def post(self, url, data=None, timeout=None, json=True, body=None):
+        return self.make_request(url, 'post', data=data, timeout=timeout, json=json, body=body)
 
-    def get(self, url, timeout=None, json=True, log=True):
-        return self.make_request(url, 'get', timeout=timeout, json=json, log=log)
+    def get(self, url, timeout=None, json=True, log=True, session=None):
+        return self.make_request(url, 'get', timeout=timeout, json=json, log=log, session=session)
 
 
 def resolve_uri(uri):
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import struct
+import ujson
+import zlib
+
+from collections import deque
+
+__author__ = "Mike Belov"
+__copyright__ = "Copyright (C) Nginx, Inc. All rights reserved."
+__license__ = ""
+__maintainer__ = "Mike Belov"
+__email__ = "dedm@nginx.com"
+
+
+ADLER_BASE = 65521
+
+ZLIB_HEADER = '\x78\x9c'
+DEFLATE_END = '\x03\x00'  # empty final block
+
+
+def adler32_combine(adler1, adler2, length2):
+    """
+    Calculates adler32 checksum of two concatenated strings from their checksums
+    (port of adler32_combine() from zlib, which python 2 doesn't expose)
+
+    :param adler1: int adler32 of the first string
+    :param adler2: int adler32 of the second string
+    :param length2: int length of the second string
+    :return: int adler32
+    """
+    remainder = length2 % ADLER_BASE
+    sum1 = adler1 & 0xffff
+    sum2 = (remainder * sum1) % ADLER_BASE
+    sum1 += (adler2 & 0xffff) + ADLER_BASE - 1
+    sum2 += ((adler1 >> 16) & 0xffff) + ((adler2 >> 16) & 0xffff) + ADLER_BASE - remainder
+    if sum1 >= ADLER_BASE:
+        sum1 -= ADLER_BASE
+    if sum1 >= ADLER_BASE:
+        sum1 -= ADLER_BASE
+    if sum2 >= ADLER_BASE << 1:
+        sum2 -= ADLER_BASE << 1
+    if sum2 >= ADLER_BASE:
+        sum2 -= ADLER_BASE
+    return sum1 | (sum2 << 16)
+
+
+class Segment(object):
+    """
+    A piece of the request body, compressed on its own
+    """
+    __slots__ = ('data', 'size', 'adler')
+
+    def __init__(self, raw, level):
+        self.size = len(raw)
+        if level:
+            # raw deflate flushed to a byte boundary, so segments from independent compressors can be concatenated
+            compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+            self.data = compressor.compress(raw) + compressor.flush(zlib.Z_FULL_FLUSH)
+            self.adler = zlib.adler32(raw) & 0xffffffff
+        else:
+            self.data = raw
+            self.adler = None
+
+
+class Payload(object):
+    """
+    Bridge payload: buckets of flushed entries which are json encoded and
+    compressed once, when they are added.  The request body is assembled
+    from these segments, so retries after failed sends don't encode or
+    compress anything again.
+
+    The body is the same json object ({"meta": [...], "metrics": [...], ...})
+    compressed as a single zlib stream, like HTTPClient does for other
+    requests.
+
+    With metric_names enabled, metric names in metrics entries are replaced
+    by ids ("0", "1", ...) and the body gets one more key, "metric_names",
+    which maps ids back to names.  Names are repeated across every object, so
+    each name is sent once per body instead of once per object.  Ids are
+    scoped to a body, so retried and spooled bodies can be decoded on their own.
+    """
+
+    keys = ('meta', 'metrics', 'events', 'configs')
+
+    def __init__(self, maxlen=360, level=6, metric_names=False):
+        self.level = level
+        self.buckets = dict((key, deque(maxlen=maxlen)) for key in self.keys)
+        self.metric_ids = {} if metric_names else None
+
+        # json punctuation between entries
+        self._separator = Segment(',', level)
+        self._end = Segment(']}', level)
+        self._starts = [Segment('%s"%s":[' % ('{' if i == 0 else '],', key), level) for i, key in enumerate(self.keys)]
+
+    def __getitem__(self, key):
+        return self.buckets[key]
+
+    def append(self, key, entry):
+        """
+        :param key: str bucket
+        :param entry: {} flushed data
+        """
+        if key == 'metrics' and self.metric_ids is not None:
+            self._encode_names(entry)
+        self.buckets[key].append(Segment(ujson.encode(entry), self.level))
+
+    def _encode_names(self, tree):
+        """
+        Replaces metric names with ids in a flushed tree (in place)
+
+        :param tree: {} flushed data of an object and its children
+        """
+        for metric_type, metrics in tree.get('metrics', {}).iteritems():
+            encoded = {}
+            for name, points in metrics.iteritems():
+                metric_id = self.metric_ids.get(name)
+                if metric_id is None:
+                    metric_id = self.metric_ids[name] = str(len(self.metric_ids))
+                encoded[metric_id] = points
+            tree['metrics'][metric_type] = encoded
+
+        for child in tree.get('children', ()):
+            self._encode_names(child)
+
+    def segments(self):
+        for start, key in zip(self._starts, self.keys):
+            yield start
+            for i, segment in enumerate(self.buckets[key]):
+                if i:
+                    yield self._separator
+                yield segment
+
+        if self.metric_ids:
+            # entries evicted from the buckets may leave unused names here, which is harmless
+            names = dict((metric_id, name) for name, metric_id in self.metric_ids.iteritems())
+            yield Segment('],"metric_names":%s}' % ujson.encode(names), self.level)
+        else:
+            yield self._end
+
+    def body(self):
+        """
+        :return: str request body (compressed if level is not 0)
+        """
+        segments = list(self.segments())
+        if not self.level:
+            return ''.join(segment.data for segment in segments)
+
+        adler = 1
+        for segment in segments:
+            adler = adler32_combine(adler, segment.adler, segment.size)
+
+        parts = [ZLIB_HEADER]
+        parts.extend(segment.data for segment in segments)
+        parts.append(DEFLATE_END)
+        parts.append(struct.pack('>I', adler))
+        return ''.join(parts)
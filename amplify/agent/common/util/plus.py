@@ -1,4 +1,10 @@
 # -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+from gevent.pool import Pool
+from requests import Session
+from requests.adapters import HTTPAdapter
+
 from amplify.agent.common.context import context
 
 
@@ -11,6 +17,57 @@ __email__ = "raymond.lau@nginx.com"
 
 SUPPORTED_API_VERSIONS = [2]
 
+# endpoints fetched at once during traversal (see "api_concurrency" in the [nginx] section)
+DEFAULT_API_CONCURRENCY = 8
+
+# endpoints the agent collects metrics from : fields of their objects it uses (None for all fields).
+# Everything else in the API (keyvals, resolvers, ...) is skipped unless the whole tree is requested.
+API_ENDPOINTS = {
+    ('connections',): None,
+    ('processes',): None,
+    ('ssl',): None,
+    ('slabs',): 'pages,slots',
+    ('http', 'requests'): None,
+    ('http', 'caches'): 'size,max_size,bypass,expired,hit,miss,revalidated,stale,updating',
+    ('http', 'server_zones'): 'requests,responses,discarded,received,sent',
+    ('http', 'upstreams'): 'peers,queue,keepalive,zombies',
+    ('stream', 'server_zones'): 'connections,sessions,discarded,processing,received,sent',
+    ('stream', 'upstreams'): 'peers,zombies',
+}
+
+# location prefix -> uri of the latest supported api version, kept until a traversal fails
+API_URIS = {}
+
+_api_session = None
+
+
+def get_api_session():
+    """
+    Returns a keep-alive session for N+ API requests.  It's separate from the
+    cloud session (no cloud headers) and keeps up to api_concurrency connections
+    open, so endpoints are fetched without reconnecting on every collect.
+
+    :return: requests.Session
+    """
+    global _api_session
+    if _api_session is None:
+        concurrency = api_concurrency()
+        _api_session = Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        _api_session.mount('http://', adapter)
+        _api_session.mount('https://', adapter)
+    return _api_session
+
+
+def api_concurrency():
+    """
+    :return: int number of N+ API endpoints to fetch at once
+    """
+    try:
+        return max(int(context.app_config.get('nginx', {}).get('api_concurrency') or DEFAULT_API_CONCURRENCY), 1)
+    except ValueError:
+        return DEFAULT_API_CONCURRENCY
+
 
 def get_latest_supported_api(location_prefix, timeout=1, log=False):
     """
@@ -25,7 +82,7 @@ def get_latest_supported_api(location_prefix, timeout=1, log=False):
     :param log: Boolean
     :return: str
     """
-    api_versions_list = context.http_client.get(location_prefix, timeout=timeout, log=log)
+    api_versions_list = context.http_client.get(location_prefix, timeout=timeout, log=log, session=get_api_session())
     supported_by_agent = set(api_versions_list).intersection(set(SUPPORTED_API_VERSIONS))
     if len(supported_by_agent) == 0:
         context.log.debug("No Nginx+ API versions %s are supported by this agent (%s)." % (api_versions_list, supported_by_agent))
@@ -38,7 +95,8 @@ def get_latest_supported_api(location_prefix, timeout=1, log=False):
     return api_uri
 
 
-def _traverse_versioned_plus_api(api_url, timeout=1, log=False, root_endpoints_to_skip=None):
+def _traverse_versioned_plus_api(api_url, timeout=1, log=False, root_endpoints_to_skip=None, errors=None,
+                                 endpoints=None):
     """
     Get data from all of the Plus API endpoints and combine them into a
     single dict, similar to how the now-deprecated plus status module would
@@ -50,8 +108,13 @@ def _traverse_versioned_plus_api(api_url, timeout=1, log=False, root_endpoints_t
     /api/2/connections, and so on.
     If it returns a json dictionary, we just take the output and return.
 
+    Endpoints of every level of the tree are fetched concurrently by a pool of
+    api_concurrency greenlets.
+
     http://demo.nginx.com/api/2
     :param api_url: str - base API endpoint
+    :param errors: [] that urls which couldn't be fetched are appended to
+    :param endpoints: {} of endpoint paths to fetch (see API_ENDPOINTS) or None to fetch all of them
     :return: dict containing aggregated responses of all the api endpoints
     {
         "processes" : {             #output of /api/2/processes
@@ -84,45 +147,94 @@ def _traverse_versioned_plus_api(api_url, timeout=1, log=False, root_endpoints_t
 
     """
     aggregated_responses = {}
-
-    try:
-        api_response = context.http_client.get(
-            api_url,
-            timeout=timeout,
-            log=log
-        )
-    except Exception as e:
-        context.log.error(
-            'Caught "%s" error during api traverse' % e.__class__.__name__
-        )
-        context.log.debug('additional info:', exc_info=True)
-        api_response = {}
-
-    if isinstance(api_response, list):
-        for endpoint in api_response:
-            if root_endpoints_to_skip is not None and endpoint in root_endpoints_to_skip:
-                aggregated_responses[endpoint] = {}
-                continue
-            api_response = _traverse_versioned_plus_api("%s/%s" % (api_url, endpoint), timeout=timeout, log=log)
-            aggregated_responses[endpoint] = api_response
-    elif isinstance(api_response, dict):
-        aggregated_responses = api_response
+    errors = errors if errors is not None else []
+
+    def fetch(url):
+        try:
+            return context.http_client.get(url, timeout=timeout, log=log, session=get_api_session())
+        except Exception as e:
+            context.log.error(
+                'Caught "%s" error during api traverse' % e.__class__.__name__
+            )
+            context.log.debug('additional info:', exc_info=True)
+            errors.append(url)
+            return {}
+
+    api_response = fetch(api_url)
+    if isinstance(api_response, dict):
+        return api_response
+    elif not isinstance(api_response, list):
+        return aggregated_responses
+
+    # paths of endpoints to fetch and of the lists leading to them
+    wanted = None
+    if endpoints is not None:
+        wanted = set(path[:i] for path in endpoints for i in xrange(1, len(path) + 1))
+
+    # (dict to put the response into, endpoint, path, url) of every endpoint of the current level
+    pending = []
+
+    def add_pending(parent, endpoint, path, url):
+        if wanted is None or path in wanted:
+            pending.append((parent, endpoint, path, url))
+
+    for endpoint in api_response:
+        if root_endpoints_to_skip is not None and endpoint in root_endpoints_to_skip:
+            aggregated_responses[endpoint] = {}
+            continue
+        add_pending(aggregated_responses, endpoint, (endpoint,), "%s/%s" % (api_url, endpoint))
+
+    pool = Pool(api_concurrency())
+    while pending:
+        urls = []
+        for _, _, path, url in pending:
+            fields = endpoints.get(path) if endpoints is not None else None
+            urls.append("%s?fields=%s" % (url, fields) if fields else url)
+        responses = pool.map(fetch, urls)
+
+        current, pending = pending, []
+        for (parent, endpoint, path, url), api_response in zip(current, responses):
+            if isinstance(api_response, list):
+                parent[endpoint] = {}
+                for child in api_response:
+                    add_pending(parent[endpoint], child, path + (child,), "%s/%s" % (url, child))
+            elif isinstance(api_response, dict):
+                parent[endpoint] = api_response
+            else:
+                parent[endpoint] = {}
 
     return aggregated_responses
 
 
-def traverse_plus_api(location_prefix, timeout=1, log=False, root_endpoints_to_skip=None):
+def traverse_plus_api(location_prefix, timeout=1, log=False, root_endpoints_to_skip=None, endpoints=API_ENDPOINTS):
     """
     Does basically the same thing as traverse_versioned_plus_api except that it gets the
-    current API from root endpoint before and traverses based on that
+    current API from root endpoint before and traverses based on that.
+
+    The API version is resolved once and reused until a traversal fails (e.g. after
+    N+ was upgraded and the version is gone).
+
+    Only the endpoints the agent collects from are fetched by default, pass
+    endpoints=None to get the whole tree.
 
     :param location_prefix: str (ex. http://demo.nginx.com/api/)
     :param timeout:
     :param log:
     :param root_endpoints_to_skip: list of strings
+    :param endpoints: {} of endpoint paths to fetch (see API_ENDPOINTS) or None to fetch all of them
     :return: dict containing aggregated responses of all the api endpoints
     """
-    current_api = get_latest_supported_api(location_prefix, timeout, log)
+    current_api = API_URIS.get(location_prefix)
     if current_api is None:
-        return None
-    return _traverse_versioned_plus_api(current_api, timeout, log, root_endpoints_to_skip)
+        current_api = get_latest_supported_api(location_prefix, timeout, log)
+        if current_api is None:
+            return None
+        API_URIS[location_prefix] = current_api
+
+    errors = []
+    aggregated_responses = _traverse_versioned_plus_api(
+        current_api, timeout, log, root_endpoints_to_skip, errors, endpoints
+    )
+    if errors:
+        API_URIS.pop(location_prefix, None)
+    return aggregated_responses
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import math
+
+from collections import defaultdict
+
+__author__ = "Mike Belov"
+__copyright__ = "Copyright (C) Nginx, Inc. All rights reserved."
+__license__ = ""
+__maintainer__ = "Mike Belov"
+__email__ = "dedm@nginx.com"
+
+
+DEFAULT_ACCURACY = 0.01
+DEFAULT_MAX_BUCKETS = 2048
+
+# values at or below this are treated as zero
+MIN_INDEXABLE_VALUE = 1e-9
+
+
+class QuantileSketch(object):
+    """
+    Mergeable quantile sketch with logarithmic buckets (DDSketch style).
+
+    Every positive value is put into bucket ceil(log(value, gamma)) where
+    gamma = (1 + accuracy) / (1 - accuracy), so any value returned by
+    value_at() is within `accuracy` relative error of the exact value of that
+    rank.  count, sum, min and max are tracked exactly.
+
+    Memory is bounded by max_buckets: when there are more buckets than that,
+    the lowest ones are collapsed together, which only affects accuracy of the
+    lowest quantiles.
+
+    It supports append() and extend() so that it can be used anywhere a list
+    of samples is expected by StatsdClient.
+    """
+
+    def __init__(self, values=None, accuracy=DEFAULT_ACCURACY, max_buckets=DEFAULT_MAX_BUCKETS):
+        self.accuracy = accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1.0 + accuracy) / (1.0 - accuracy)
+        self.log_gamma = math.log(self.gamma)
+
+        self.buckets = defaultdict(int)
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+
+        if values:
+            self.extend(values)
+
+    def __len__(self):
+        return self.count
+
+    def append(self, value):
+        """
+        Adds a single value to the sketch
+
+        :param value: int/float value
+        """
+        if value > MIN_INDEXABLE_VALUE:
+            key = int(math.ceil(math.log(value) / self.log_gamma))
+            self.buckets[key] += 1
+            if len(self.buckets) > self.max_buckets:
+                self._collapse()
+        else:
+            self.zero_count += 1
+
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def extend(self, values):
+        """
+        Adds a batch of values to the sketch
+
+        :param values: iterable of int/float values
+        """
+        for value in values:
+            self.append(value)
+
+    def merge(self, other):
+        """
+        Merges another sketch with the same accuracy into this one
+
+        :param other: QuantileSketch
+        """
+        if other.gamma != self.gamma:
+            raise ValueError('can not merge sketches with different accuracy')
+
+        if not other.count:
+            return
+
+        for key, count in other.buckets.iteritems():
+            self.buckets[key] += count
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def value_at(self, rank):
+        """
+        Returns the value which would be at the rank position of a sorted list
+        of all added values.  Negative ranks count from the end, like list
+        indexes do.
+
+        :param rank: int position
+        :return: float value
+        """
+        if not self.count:
+            raise IndexError('sketch is empty')
+
+        if rank < 0:
+            rank += self.count
+        if rank < 0 or rank >= self.count:
+            raise IndexError('sketch rank out of range')
+
+        # the edges are known exactly
+        if rank == 0:
+            return self.min
+        elif rank == self.count - 1:
+            return self.max
+
+        seen = self.zero_count
+        if rank < seen:
+            return max(self.min, 0)
+
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if rank < seen:
+                value = 2.0 * math.pow(self.gamma, key) / (self.gamma + 1.0)
+                return min(max(value, self.min), self.max)
+
+        return self.max
+
+    def _collapse(self):
+        """
+        Merges the lowest buckets together to keep the number of buckets within max_buckets
+        """
+        keys = sorted(self.buckets)
+        excess = len(keys) - self.max_buckets
+        target = keys[excess]
+        for key in keys[:excess]:
+            self.buckets[target] += self.buckets.pop(key)
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+import os
+import struct
+
+from amplify.agent.common.context import context
+
+__author__ = "Mike Belov"
+__copyright__ = "Copyright (C) Nginx, Inc. All rights reserved."
+__license__ = ""
+__maintainer__ = "Mike Belov"
+__email__ = "dedm@nginx.com"
+
+
+RECORD_HEADER = struct.Struct('>I')  # record length
+SEGMENT_SUFFIX = '.spool'
+OFFSET_FILENAME = 'offset'  # "<segment> <offset>" of the next record to read
+
+
+class Spool(object):
+    """
+    Disk queue of records (compressed bridge payloads that couldn't be sent).
+
+    Records are appended to segment files in a directory and read back
+    oldest first.  A segment is removed once all of its records are popped.
+    If the spool grows over max_size, the oldest segments are evicted.
+
+    The read position is saved to a file next to the segments after every
+    pop(), so popped records are not read again after a restart.
+    """
+
+    def __init__(self, directory, max_size=100 * 1024 * 1024, segment_size=4 * 1024 * 1024):
+        self.directory = directory
+        self.max_size = max_size
+        self.segment_size = min(segment_size, max_size)
+        self.read_offset = 0  # position of the next record in the oldest segment
+        self.peeked_length = None  # length of the record returned by peek()
+
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        self.segments = sorted(
+            filename for filename in os.listdir(self.directory) if filename.endswith(SEGMENT_SUFFIX)
+        )
+        self._load_offset()
+
+    def __len__(self):
+        return len(self.segments)
+
+    def _path(self, segment):
+        return os.path.join(self.directory, segment)
+
+    def _new_segment(self):
+        last_id = int(self.segments[-1].split('.')[0]) if self.segments else 0
+        segment = '%016d%s' % (last_id + 1, SEGMENT_SUFFIX)
+        self.segments.append(segment)
+        return segment
+
+    def _load_offset(self):
+        """
+        Restores the read position saved by _save_offset()
+        """
+        try:
+            with open(self._path(OFFSET_FILENAME)) as f:
+                segment, offset = f.read().split()
+            if self.segments and segment == self.segments[0]:
+                self.read_offset = int(offset)
+        except (IOError, OSError, ValueError):
+            pass
+
+    def _save_offset(self):
+        """
+        Atomically writes the read position
+        """
+        path = self._path(OFFSET_FILENAME)
+        tmp_path = '%s.tmp' % path
+        try:
+            with open(tmp_path, 'w') as f:
+                f.write('%s %s' % (self.segments[0] if self.segments else '', self.read_offset))
+                f.flush()
+                os.fsync(f.fileno())
+            os.rename(tmp_path, path)
+        except (IOError, OSError):
+            context.log.debug('failed to save spool offset', exc_info=True)
+
+    def _remove_oldest(self):
+        segment = self.segments.pop(0)
+        self.read_offset = 0
+        self.peeked_length = None
+        try:
+            os.remove(self._path(segment))
+        except OSError:
+            context.log.debug('failed to remove spool segment %s' % segment, exc_info=True)
+
+        # an empty spool has nothing to resume
+        if not self.segments and os.path.exists(self._path(OFFSET_FILENAME)):
+            try:
+                os.remove(self._path(OFFSET_FILENAME))
+            except OSError:
+                context.log.debug('failed to remove spool offset', exc_info=True)
+
+    def size(self):
+        """
+        :return: int total size of segments in bytes
+        """
+        total = 0
+        for segment in self.segments:
+            try:
+                total += os.path.getsize(self._path(segment))
+            except OSError:
+                pass
+        return total
+
+    def append(self, record):
+        """
+        Writes a record to the newest segment and evicts the oldest segments if the spool is too big
+
+        :param record: str
+        """
+        segment = self.segments[-1] if self.segments else None
+        if segment is None or os.path.getsize(self._path(segment)) >= self.segment_size:
+            segment = self._new_segment()
+
+        with open(self._path(segment), 'ab') as f:
+            f.write(RECORD_HEADER.pack(len(record)))
+            f.write(record)
+            f.flush()
+            os.fsync(f.fileno())
+
+        evicted = 0
+        while len(self.segments) > 1 and self.size() > self.max_size:
+            self._remove_oldest()
+            evicted += 1
+        if evicted:
+            context.log.warning('spool is over %s bytes, evicted %s oldest segment(s)' % (self.max_size, evicted))
+
+    def peek(self):
+        """
+        :return: str the oldest record or None if the spool is empty
+        """
+        while self.segments:
+            path = self._path(self.segments[0])
+            try:
+                with open(path, 'rb') as f:
+                    f.seek(self.read_offset)
+                    header = f.read(RECORD_HEADER.size)
+                    if len(header) == RECORD_HEADER.size:
+                        length, = RECORD_HEADER.unpack(header)
+                        record = f.read(length)
+                        if len(record) == length:
+                            self.peeked_length = length
+                            return record
+            except (IOError, OSError):
+                context.log.debug('failed to read spool segment %s' % path, exc_info=True)
+
+            # the segment is read through (or its tail is broken)
+            self._remove_oldest()
+        return None
+
+    def pop(self):
+        """
+        Removes the record returned by the last peek()
+        """
+        # nothing was peeked or the record was evicted since then
+        if self.peeked_length is None:
+            return
+
+        self.read_offset += RECORD_HEADER.size + self.peeked_length
+        self.peeked_length = None
+        self._save_offset()
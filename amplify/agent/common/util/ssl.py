@@ -1,11 +1,14 @@
 # -*- coding: utf-8 -*-
 import datetime
+import hashlib
 import os
 import re
 import time
 
 from amplify.agent.common.context import context
+from amplify.agent.common.errors import AmplifyParseException
 from amplify.agent.common.util import subp
+from amplify.agent.common.util.x509 import load_certificate
 
 __author__ = "Grant Hulegaard"
 __copyright__ = "Copyright (C) Nginx, Inc. All rights reserved."
@@ -175,11 +178,84 @@ def certificate_full(filename):
     return results or None
 
 
-def ssl_analysis(filename):
+def certificate_analysis(data):
+    """
+    Same as openssl_analysis(), but without running openssl
+
+    :param data: str contents of the certificate file
+    :return: {} analysis results
+    """
+    cert = load_certificate(data)
+    results = {
+        'dates': cert.dates or None,
+        'subject': cert.subject,
+        'issuer': cert.issuer,
+        'purpose': cert.purpose,
+        'ocsp_uri': cert.ocsp_uri,
+        'public_key_algorithm': cert.public_key_algorithm,
+        'signature_algorithm': cert.signature_algorithm,
+    }
+    if cert.length:
+        results['length'] = cert.length
+    if cert.names:
+        results['names'] = cert.names
+    return results
+
+
+def openssl_analysis(filename):
+    """
+    :param filename: str path to the certificate
+    :return: {} analysis results
+    """
+    results = {
+        'dates': certificate_dates(filename),
+        'subject': certificate_subject(filename),
+        'issuer': certificate_issuer(filename),
+        'purpose': certificate_purpose(filename),
+        'ocsp_uri': certificate_ocsp_uri(filename)
+    }
+
+    # Domain names, etc
+    additional_info = certificate_full(filename)
+    if additional_info:
+        results.update(additional_info)
+
+    return results
+
+
+class CertificateCache(object):
+    """
+    Results of ssl_analysis() keyed by sha256 of certificate files, so a
+    certificate is only analyzed again when the file has changed
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.used = set()
+
+    def get(self, digest):
+        self.used.add(digest)
+        return self.entries.get(digest)
+
+    def put(self, digest, results):
+        self.used.add(digest)
+        self.entries[digest] = results
+
+    def prune(self):
+        """
+        Drops results of certificates that weren't used since the previous prune()
+        """
+        for digest in set(self.entries) - self.used:
+            del self.entries[digest]
+        self.used = set()
+
+
+def ssl_analysis(filename, cache=None):
     """
     Get information about SSL certificates found by NginxConfigParser.
 
     :param filename: String Path/filename
+    :param cache: CertificateCache
     :return: Dict Information dict about ssl certificate
     """
     results = dict()
@@ -189,8 +265,8 @@ def ssl_analysis(filename):
 
     # Check if we can open certificate file
     try:
-        cert_handler = open(filename, 'r')
-        cert_handler.close()
+        with open(filename, 'rb') as cert_handler:
+            data = cert_handler.read()
     except IOError:
         context.log.info('could not read %s (maybe permissions?)' % filename)
         return None
@@ -199,34 +275,28 @@ def ssl_analysis(filename):
         # Modified date/time
         results['modified'] = int(os.path.getmtime(filename))
 
-        # Certificate dates
-        results['dates'] = certificate_dates(filename)
-
-        # Subject information
-        results['subject'] = certificate_subject(filename)
+        digest = hashlib.sha256(data).hexdigest()
+        analysis = cache.get(digest) if cache is not None else None
+        if analysis is None:
+            try:
+                analysis = certificate_analysis(data)
+            except (AmplifyParseException, IndexError, ValueError):
+                context.log.debug('failed to decode certificate %s, running openssl' % filename, exc_info=True)
+                analysis = openssl_analysis(filename)
 
-        # Issuer information
-        results['issuer'] = certificate_issuer(filename)
+            if 'length' in analysis:
+                analysis['length'] = int(analysis['length'])
 
-        # Purpose information
-        results['purpose'] = certificate_purpose(filename)
+            if analysis.get('names'):
+                if analysis['subject']['common_name'] not in analysis['names']:
+                    analysis['names'].append(analysis['subject']['common_name'])  # add subject name
+            else:
+                analysis['names'] = [analysis['subject']['common_name']]  # create a new list of 1
 
-        # OCSP URI
-        results['ocsp_uri'] = certificate_ocsp_uri(filename)
+            if cache is not None:
+                cache.put(digest, analysis)
 
-        # Domain names, etc
-        additional_info = certificate_full(filename)
-        if additional_info:
-            results.update(additional_info)
-
-        if 'length' in results:
-            results['length'] = int(results['length'])
-
-        if results.get('names'):
-            if results['subject']['common_name'] not in results['names']:
-                results['names'].append(results['subject']['common_name'])  # add subject name
-        else:
-            results['names'] = [results['subject']['common_name']]  # create a new list of 1
+        results.update(analysis)
     except Exception as e:
         exception_name = e.__class__.__name__
         message = 'failed to analyze certificate %s due to: %s' % (filename, exception_name)
@@ -237,4 +307,3 @@ def ssl_analysis(filename):
         context.log.debug('ssl analysis took %.3f seconds for %s' % (end_time-start_time, filename))
 
     return results
-
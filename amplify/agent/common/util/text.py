@@ -164,10 +164,11 @@ def parse_line(line, keys=None, trie=None):
     return dict(zip(keys, values))
 
 
-def parse_line_split(line, keys=None, non_key_patterns=None, first_value_is_key=False):
+def split_line_values(line, non_key_patterns=None, first_value_is_key=False, keys_count=0):
     """
-    Take a raw access log line and parse it.  It works by taking all found
-    non-key patterns and iteratively splitting the line.
+    Take a raw access log line and split it into an ordered list of values by
+    iteratively splitting on all found non-key patterns.  Values are returned
+    in the same order as the keys they belong to.
     """
     values = []
     for i, pattern in enumerate(non_key_patterns):
@@ -178,7 +179,21 @@ def parse_line_split(line, keys=None, non_key_patterns=None, first_value_is_key=
             values.append(value)
 
     # if there are characters in line or there's one more value left to find
-    if len(line) or len(keys) == len(values) + 1:
+    if len(line) or keys_count == len(values) + 1:
         values.append(line)
 
+    return values
+
+
+def parse_line_split(line, keys=None, non_key_patterns=None, first_value_is_key=False):
+    """
+    Take a raw access log line and parse it.  It works by taking all found
+    non-key patterns and iteratively splitting the line.
+    """
+    values = split_line_values(
+        line,
+        non_key_patterns=non_key_patterns,
+        first_value_is_key=first_value_is_key,
+        keys_count=len(keys)
+    )
     return dict(zip(keys, values))
@@ -0,0 +1,549 @@
+# -*- coding: utf-8 -*-
+"""
+Decoding of X.509 certificates in pure python.
+
+ssl_analysis() used to run "openssl x509" several times for every
+certificate.  The agent can't rely on openssl bindings for python, so the
+few fields it reports are decoded from DER here.  Names of algorithms and
+certificate purposes are the same as in openssl output.
+"""
+from __future__ import absolute_import
+
+import base64
+import datetime
+import re
+
+from amplify.agent.common.errors import AmplifyParseException
+
+__author__ = "Grant Hulegaard"
+__copyright__ = "Copyright (C) Nginx, Inc. All rights reserved."
+__license__ = ""
+__maintainer__ = "Grant Hulegaard"
+__email__ = "grant.hulegaard@nginx.com"
+
+
+# DER tags
+DER_BOOLEAN = 0x01
+DER_INTEGER = 0x02
+DER_BIT_STRING = 0x03
+DER_OCTET_STRING = 0x04
+DER_OID = 0x06
+DER_UTC_TIME = 0x17
+DER_GENERALIZED_TIME = 0x18
+DER_VERSION = 0xa0  # [0] EXPLICIT in TBSCertificate
+DER_EXTENSIONS = 0xa3  # [3] EXPLICIT in TBSCertificate
+DER_DNS_NAME = 0x82  # [2] IMPLICIT IA5String in GeneralName
+DER_URI = 0x86  # [6] IMPLICIT IA5String in GeneralName
+
+DER_STRING_CODECS = {
+    0x0c: 'utf-8',  # UTF8String
+    0x13: 'latin-1',  # PrintableString
+    0x14: 'latin-1',  # T61String
+    0x16: 'latin-1',  # IA5String
+    0x1a: 'latin-1',  # VisibleString
+    0x1c: 'utf-32-be',  # UniversalString
+    0x1e: 'utf-16-be',  # BMPString
+}
+
+PEM_CERTIFICATE_RE = re.compile(
+    r'-----BEGIN (?:TRUSTED |X509 )?CERTIFICATE-----(.+?)-----END (?:TRUSTED |X509 )?CERTIFICATE-----', re.S
+)
+
+# names of object identifiers as "openssl x509 -text" prints them
+OID_NAMES = {
+    '1.2.840.113549.1.1.1': 'rsaEncryption',
+    '1.2.840.113549.1.1.4': 'md5WithRSAEncryption',
+    '1.2.840.113549.1.1.5': 'sha1WithRSAEncryption',
+    '1.2.840.113549.1.1.10': 'rsassaPss',
+    '1.2.840.113549.1.1.11': 'sha256WithRSAEncryption',
+    '1.2.840.113549.1.1.12': 'sha384WithRSAEncryption',
+    '1.2.840.113549.1.1.13': 'sha512WithRSAEncryption',
+    '1.2.840.113549.1.1.14': 'sha224WithRSAEncryption',
+    '1.2.840.10040.4.1': 'dsaEncryption',
+    '1.2.840.10040.4.3': 'dsaWithSHA1',
+    '2.16.840.1.101.3.4.3.1': 'dsa_with_SHA224',
+    '2.16.840.1.101.3.4.3.2': 'dsa_with_SHA256',
+    '1.2.840.10045.2.1': 'id-ecPublicKey',
+    '1.2.840.10045.4.1': 'ecdsa-with-SHA1',
+    '1.2.840.10045.4.3.1': 'ecdsa-with-SHA224',
+    '1.2.840.10045.4.3.2': 'ecdsa-with-SHA256',
+    '1.2.840.10045.4.3.3': 'ecdsa-with-SHA384',
+    '1.2.840.10045.4.3.4': 'ecdsa-with-SHA512',
+    '1.3.101.112': 'ED25519',
+    '1.3.101.113': 'ED448',
+}
+
+# key type of signature algorithms (used to tell if a certificate is self-signed)
+SIGNATURE_KEY_TYPES = {
+    'md5WithRSAEncryption': 'rsaEncryption',
+    'sha1WithRSAEncryption': 'rsaEncryption',
+    'sha224WithRSAEncryption': 'rsaEncryption',
+    'sha256WithRSAEncryption': 'rsaEncryption',
+    'sha384WithRSAEncryption': 'rsaEncryption',
+    'sha512WithRSAEncryption': 'rsaEncryption',
+    'rsassaPss': 'rsaEncryption',
+    'dsaWithSHA1': 'dsaEncryption',
+    'dsa_with_SHA224': 'dsaEncryption',
+    'dsa_with_SHA256': 'dsaEncryption',
+    'ecdsa-with-SHA1': 'id-ecPublicKey',
+    'ecdsa-with-SHA224': 'id-ecPublicKey',
+    'ecdsa-with-SHA256': 'id-ecPublicKey',
+    'ecdsa-with-SHA384': 'id-ecPublicKey',
+    'ecdsa-with-SHA512': 'id-ecPublicKey',
+    'ED25519': 'ED25519',
+    'ED448': 'ED448',
+}
+
+# key length of named elliptic curves
+EC_CURVE_BITS = {
+    '1.2.840.10045.3.1.1': 192,  # prime192v1
+    '1.3.132.0.33': 224,  # secp224r1
+    '1.2.840.10045.3.1.7': 256,  # prime256v1
+    '1.3.132.0.10': 256,  # secp256k1
+    '1.3.132.0.34': 384,  # secp384r1
+    '1.3.132.0.35': 521,  # secp521r1
+    '1.3.36.3.3.2.8.1.1.7': 256,  # brainpoolP256r1
+    '1.3.36.3.3.2.8.1.1.11': 384,  # brainpoolP384r1
+    '1.3.36.3.3.2.8.1.1.13': 512,  # brainpoolP512r1
+}
+
+# subject/issuer attributes
+NAME_ATTRIBUTES = {
+    '2.5.4.6': 'country',
+    '2.5.4.8': 'state',
+    '2.5.4.7': 'location',
+    '2.5.4.10': 'organization',
+    '2.5.4.11': 'unit',
+    '2.5.4.3': 'common_name',
+}
+
+# extensions
+OID_SUBJECT_ALT_NAME = '2.5.29.17'
+OID_BASIC_CONSTRAINTS = '2.5.29.19'
+OID_KEY_USAGE = '2.5.29.15'
+OID_EXT_KEY_USAGE = '2.5.29.37'
+OID_NETSCAPE_CERT_TYPE = '2.16.840.1.113730.1.1'
+OID_AUTHORITY_INFO_ACCESS = '1.3.6.1.5.5.7.1.1'
+OID_OCSP = '1.3.6.1.5.5.7.48.1'
+
+# key usage bits (as in openssl)
+KU_DIGITAL_SIGNATURE = 0x0080
+KU_NON_REPUDIATION = 0x0040
+KU_KEY_ENCIPHERMENT = 0x0020
+KU_KEY_AGREEMENT = 0x0008
+KU_KEY_CERT_SIGN = 0x0004
+KU_CRL_SIGN = 0x0002
+KU_TLS = KU_DIGITAL_SIGNATURE | KU_KEY_ENCIPHERMENT | KU_KEY_AGREEMENT
+
+# extended key usage bits (as in openssl)
+XKU_SSL_SERVER = 0x1
+XKU_SSL_CLIENT = 0x2
+XKU_SMIME = 0x4
+XKU_CODE_SIGN = 0x8
+XKU_SGC = 0x10
+XKU_OCSP_SIGN = 0x20
+XKU_TIMESTAMP = 0x40
+XKU_DVCS = 0x80
+XKU_ANYEKU = 0x100
+
+EXT_KEY_USAGES = {
+    '1.3.6.1.5.5.7.3.1': XKU_SSL_SERVER,
+    '1.3.6.1.5.5.7.3.2': XKU_SSL_CLIENT,
+    '1.3.6.1.5.5.7.3.4': XKU_SMIME,
+    '1.3.6.1.5.5.7.3.3': XKU_CODE_SIGN,
+    '2.16.840.1.113730.4.1': XKU_SGC,
+    '1.3.6.1.4.1.311.10.3.3': XKU_SGC,
+    '1.3.6.1.5.5.7.3.9': XKU_OCSP_SIGN,
+    '1.3.6.1.5.5.7.3.8': XKU_TIMESTAMP,
+    '1.3.6.1.5.5.7.3.10': XKU_DVCS,
+    '2.5.29.37.0': XKU_ANYEKU,
+}
+
+# netscape cert type bits (as in openssl)
+NS_SSL_CLIENT = 0x80
+NS_SSL_SERVER = 0x40
+NS_SMIME = 0x20
+NS_SSL_CA = 0x04
+NS_SMIME_CA = 0x02
+NS_ANY_CA = 0x07
+
+
+def der_read(data, offset, end=None):
+    """
+    Reads a DER element header
+
+    :param data: str DER data
+    :param offset: int offset of the element
+    :param end: int offset where the enclosing element ends
+    :return: (int tag, int offset of the content, int offset of the end of the content)
+    """
+    end = len(data) if end is None else end
+    if offset + 2 > end:
+        raise AmplifyParseException(message='truncated DER element at %s' % offset)
+
+    tag, length = ord(data[offset]), ord(data[offset + 1])
+    offset += 2
+    if length & 0x80:
+        size = length & 0x7f
+        if not 0 < size <= 4 or offset + size > end:
+            raise AmplifyParseException(message='bad DER length at %s' % offset)
+        length = int(data[offset:offset + size].encode('hex'), 16)
+        offset += size
+
+    if offset + length > end:
+        raise AmplifyParseException(message='truncated DER element at %s' % offset)
+    return tag, offset, offset + length
+
+
+def der_children(data, element):
+    """
+    :param data: str DER data
+    :param element: (tag, start, end) of a constructed element
+    :return: [] of (tag, start, end) of its children
+    """
+    _, offset, end = element
+    children = []
+    while offset < end:
+        child = der_read(data, offset, end)
+        children.append(child)
+        offset = child[2]
+    return children
+
+
+def der_oid(value):
+    """
+    :param value: str content of an OBJECT IDENTIFIER
+    :return: str dotted object identifier
+    """
+    first = ord(value[0])
+    parts = [min(first // 40, 2), first - min(first // 40, 2) * 40]
+    number = 0
+    for char in value[1:]:
+        number = (number << 7) | (ord(char) & 0x7f)
+        if not ord(char) & 0x80:
+            parts.append(number)
+            number = 0
+    return '.'.join(map(str, parts))
+
+
+def der_bits(value):
+    """
+    :param value: str content of an INTEGER
+    :return: int number of significant bits
+    """
+    value = value.lstrip('\x00')
+    return len(value) * 8 - (8 - len(bin(ord(value[0]))[2:])) if value else 0
+
+
+def der_time(tag, value):
+    """
+    :param tag: int DER_UTC_TIME or DER_GENERALIZED_TIME
+    :param value: str content
+    :return: int timestamp (same as certificate_dates() returns)
+    """
+    # YYMMDDHHMMSS (UTCTime) or YYYYMMDDHHMMSS (GeneralizedTime) followed by Z
+    digits = 12 if tag == DER_UTC_TIME else 14
+    if not value[:digits].isdigit() or len(value) < digits:
+        raise AmplifyParseException(message='bad DER time "%s"' % value.encode('string_escape'))
+
+    if tag == DER_UTC_TIME:
+        year = int(value[:2])
+        value = '%d%s' % (year + (1900 if year >= 50 else 2000), value[2:])
+    return int(datetime.datetime.strptime(value[:14], '%Y%m%d%H%M%S').strftime('%s'))
+
+
+class X509Certificate(object):
+    """
+    Fields of a DER encoded X.509 certificate that ssl_analysis() reports.
+    Decoded in pure python, as the agent can't rely on openssl bindings.
+    """
+
+    def __init__(self, der):
+        """
+        :param der: str DER encoded certificate
+        """
+        self.der = der
+        certificate = der_read(der, 0)
+        tbs, signature_algorithm = der_children(der, certificate)[:2]
+
+        fields = der_children(der, tbs)
+        self.version = 1
+        if fields[0][0] == DER_VERSION:
+            version = der_children(der, fields[0])[0]
+            self.version = int(self.value(version).encode('hex'), 16) + 1
+            fields = fields[1:]
+
+        _, _, issuer, validity, subject, public_key = fields[:6]
+        self.issuer_der = der[issuer[1]:issuer[2]]
+        self.subject_der = der[subject[1]:subject[2]]
+        self.issuer = self.parse_name(issuer)
+        self.subject = self.parse_name(subject)
+        not_before, not_after = der_children(der, validity)
+        self.dates = {'start': der_time(not_before[0], self.value(not_before)), 'end': der_time(not_after[0], self.value(not_after))}
+        self.signature_algorithm = self.algorithm(signature_algorithm)[0]
+        self.public_key_algorithm, self.length = self.parse_public_key(public_key)
+
+        self.extensions = {}
+        for field in fields[6:]:
+            if field[0] == DER_EXTENSIONS:
+                for extension in der_children(der, der_children(der, field)[0]):
+                    parts = der_children(der, extension)
+                    oid = der_oid(self.value(parts[0]))
+                    critical = parts[1][0] == DER_BOOLEAN and self.value(parts[1]) != '\x00'
+                    content = der_read(der, parts[-1][1], parts[-1][2])
+                    self.extensions[oid] = (critical, content)
+
+    def value(self, element):
+        return self.der[element[1]:element[2]]
+
+    def algorithm(self, element):
+        """
+        :return: (str name, (tag, start, end) of parameters or None) of an AlgorithmIdentifier
+        """
+        parts = der_children(self.der, element)
+        oid = der_oid(self.value(parts[0]))
+        return OID_NAMES.get(oid, oid), parts[1] if len(parts) > 1 else None
+
+    def parse_name(self, element):
+        """
+        :return: {} of subject/issuer attributes or None
+        """
+        results = {}
+        for rdn in der_children(self.der, element):
+            for attribute in der_children(self.der, rdn):
+                oid, value = der_children(self.der, attribute)
+                key = NAME_ATTRIBUTES.get(der_oid(self.value(oid)))
+                codec = DER_STRING_CODECS.get(value[0])
+                # the first attribute wins, like the last one in RFC2253 output of openssl
+                if key and codec and key not in results:
+                    results[key] = self.value(value).decode(codec, 'replace').encode('utf-8')
+        return results or None
+
+    def parse_public_key(self, element):
+        """
+        :return: (str public key algorithm, int length in bits or None)
+        """
+        algorithm, public_key = der_children(self.der, element)
+        name, parameters = self.algorithm(algorithm)
+
+        length = None
+        if name in ('rsaEncryption', 'rsassaPss'):
+            key = der_read(self.der, public_key[1] + 1, public_key[2])  # skip unused bits of the BIT STRING
+            modulus = der_children(self.der, key)[0]
+            length = der_bits(self.value(modulus))
+        elif name == 'dsaEncryption' and parameters:
+            prime = der_children(self.der, parameters)[0]
+            length = der_bits(self.value(prime))
+        elif name == 'id-ecPublicKey' and parameters and parameters[0] == DER_OID:
+            length = EC_CURVE_BITS.get(der_oid(self.value(parameters)))
+        return name, length
+
+    def extension(self, oid):
+        """
+        :return: (tag, start, end) of the extension value or None
+        """
+        extension = self.extensions.get(oid)
+        return extension[1] if extension else None
+
+    @property
+    def names(self):
+        """
+        :return: [] of DNS names from subjectAltName
+        """
+        extension = self.extension(OID_SUBJECT_ALT_NAME)
+        if not extension:
+            return []
+        return [self.value(name) for name in der_children(self.der, extension) if name[0] == DER_DNS_NAME]
+
+    @property
+    def ocsp_uri(self):
+        """
+        :return: str the first OCSP uri from authorityInfoAccess or None
+        """
+        extension = self.extension(OID_AUTHORITY_INFO_ACCESS)
+        for access in der_children(self.der, extension) if extension else ():
+            method, location = der_children(self.der, access)
+            if der_oid(self.value(method)) == OID_OCSP and location[0] == DER_URI:
+                return self.value(location)
+        return None
+
+    @property
+    def purpose(self):
+        return X509Purposes(self).check()
+
+
+class X509Purposes(object):
+    """
+    Port of X509_check_purpose() from openssl (crypto/x509/v3_purp.c), so the
+    results are the same as in "openssl x509 -purpose" output
+    """
+
+    def __init__(self, cert):
+        der = cert.der
+
+        self.kusage, self.xkusage, self.nscert = None, None, None
+        self.bcons, self.ca, self.xkusage_critical = False, False, False
+
+        extension = cert.extension(OID_BASIC_CONSTRAINTS)
+        if extension:
+            self.bcons = True
+            parts = der_children(der, extension)
+            self.ca = bool(parts) and parts[0][0] == DER_BOOLEAN and cert.value(parts[0]) != '\x00'
+
+        extension = cert.extension(OID_KEY_USAGE)
+        if extension:
+            bits = cert.value(extension)[1:3]
+            self.kusage = sum(ord(byte) << (8 * i) for i, byte in enumerate(bits))
+
+        extension = cert.extension(OID_EXT_KEY_USAGE)
+        if extension:
+            self.xkusage_critical = cert.extensions[OID_EXT_KEY_USAGE][0]
+            self.xkusage = 0
+            for oid in der_children(der, extension):
+                self.xkusage |= EXT_KEY_USAGES.get(der_oid(cert.value(oid)), 0)
+
+        extension = cert.extension(OID_NETSCAPE_CERT_TYPE)
+        if extension:
+            bits = cert.value(extension)[1:2]
+            self.nscert = ord(bits) if bits else 0
+
+        # v1 root: v1 certificate with the same subject and issuer, signed with its own key type
+        self.v1_root = (
+            cert.version == 1 and
+            cert.subject_der == cert.issuer_der and
+            SIGNATURE_KEY_TYPES.get(cert.signature_algorithm) == cert.public_key_algorithm
+        )
+
+    def ku_reject(self, usage):
+        return self.kusage is not None and not self.kusage & usage
+
+    def xku_reject(self, usage):
+        return self.xkusage is not None and not self.xkusage & usage
+
+    def ns_reject(self, usage):
+        return self.nscert is not None and not self.nscert & usage
+
+    def check_ca(self):
+        if self.ku_reject(KU_KEY_CERT_SIGN):
+            return 0
+        if self.bcons:
+            return int(self.ca)
+        if self.v1_root:
+            return 3
+        if self.kusage is not None:
+            return 4
+        if self.nscert is not None and self.nscert & NS_ANY_CA:
+            return 5
+        return 0
+
+    def check_ssl_ca(self):
+        ca = self.check_ca()
+        if not ca:
+            return 0
+        return int(ca != 5 or bool(self.nscert & NS_SSL_CA))
+
+    def ssl_client(self, require_ca):
+        if self.xku_reject(XKU_SSL_CLIENT):
+            return 0
+        if require_ca:
+            return self.check_ssl_ca()
+        if self.ku_reject(KU_DIGITAL_SIGNATURE | KU_KEY_AGREEMENT):
+            return 0
+        return int(not self.ns_reject(NS_SSL_CLIENT))
+
+    def ssl_server(self, require_ca):
+        if self.xku_reject(XKU_SSL_SERVER | XKU_SGC):
+            return 0
+        if require_ca:
+            return self.check_ssl_ca()
+        if self.ns_reject(NS_SSL_SERVER) or self.ku_reject(KU_TLS):
+            return 0
+        return 1
+
+    def ns_ssl_server(self, require_ca):
+        result = self.ssl_server(require_ca)
+        if not result or require_ca:
+            return result
+        return 0 if self.ku_reject(KU_KEY_ENCIPHERMENT) else result
+
+    def smime(self, require_ca):
+        if self.xku_reject(XKU_SMIME):
+            return 0
+        if require_ca:
+            ca = self.check_ca()
+            if not ca:
+                return 0
+            return ca if ca != 5 or self.nscert & NS_SMIME_CA else 0
+        if self.nscert is not None:
+            if self.nscert & NS_SMIME:
+                return 1
+            return 2 if self.nscert & NS_SSL_CLIENT else 0
+        return 1
+
+    def smime_sign(self, require_ca):
+        result = self.smime(require_ca)
+        if not result or require_ca:
+            return result
+        return 0 if self.ku_reject(KU_DIGITAL_SIGNATURE | KU_NON_REPUDIATION) else result
+
+    def smime_encrypt(self, require_ca):
+        result = self.smime(require_ca)
+        if not result or require_ca:
+            return result
+        return 0 if self.ku_reject(KU_KEY_ENCIPHERMENT) else result
+
+    def crl_sign(self, require_ca):
+        if require_ca:
+            ca = self.check_ca()
+            return 0 if ca == 2 else ca
+        return int(not self.ku_reject(KU_CRL_SIGN))
+
+    def any_purpose(self, require_ca):
+        return 1
+
+    def ocsp_helper(self, require_ca):
+        return self.check_ca() if require_ca else 1
+
+    def timestamp_sign(self, require_ca):
+        if require_ca:
+            return self.check_ca()
+
+        signing = KU_NON_REPUDIATION | KU_DIGITAL_SIGNATURE
+        if self.kusage is not None and (self.kusage & ~signing or not self.kusage & signing):
+            return 0
+        if self.xkusage != XKU_TIMESTAMP or not self.xkusage_critical:
+            return 0
+        return 1
+
+    def check(self):
+        """
+        :return: {} of purpose: "Yes", "No" or "Yes (WARNING code=N)"
+        """
+        results = {}
+        for name, check in (
+            ('SSL client', self.ssl_client),
+            ('SSL server', self.ssl_server),
+            ('Netscape SSL server', self.ns_ssl_server),
+            ('S/MIME signing', self.smime_sign),
+            ('S/MIME encryption', self.smime_encrypt),
+            ('CRL signing', self.crl_sign),
+            ('Any Purpose', self.any_purpose),
+            ('OCSP helper', self.ocsp_helper),
+            ('Time Stamp signing', self.timestamp_sign),
+        ):
+            for require_ca in (False, True):
+                result = check(require_ca)
+                key = '%s CA' % name if require_ca else name
+                results[key] = {0: 'No', 1: 'Yes'}.get(result, 'Yes (WARNING code=%s)' % result)
+        return results
+
+
+def load_certificate(data):
+    """
+    :param data: str contents of a PEM (the first certificate is used) or DER file
+    :return: X509Certificate
+    """
+    match = PEM_CERTIFICATE_RE.search(data)
+    if match:
+        data = base64.b64decode(''.join(match.group(1).split()))
+    return X509Certificate(data)
@@ -2,7 +2,7 @@
 import copy
 import time
 
-from amplify.agent.common.util.math import median
+from amplify.agent.common.util.sketch import QuantileSketch, DEFAULT_ACCURACY
 from collections import defaultdict
 
 __author__ = "Mike Belov"
@@ -12,6 +12,62 @@ __maintainer__ = "Mike Belov"
 __email__ = "dedm@nginx.com"
 
 
+# with suppress_zero_counters, every n-th flush reports all counters
+DEFAULT_KEYFRAME_INTERVAL = 10
+
+
+class CounterHandle(object):
+    """
+    Pre-registered counter (see StatsdClient.counter_handle).  Increments are
+    accumulated in the handle and moved to the client storage on flush, so
+    hot loops don't format names, look them up or take timestamps.
+    """
+    __slots__ = ('name', 'value', 'stamp')
+
+    def __init__(self, name):
+        self.name = name
+        self.value = 0
+        self.stamp = None
+
+    def incr(self, value=1):
+        """
+        :param value: int value, negative values are skipped like in StatsdClient.incr
+        """
+        if value < 0:
+            return
+        if self.stamp is None:
+            self.stamp = int(time.time())  # once per flush
+        self.value += value
+
+    def collect(self, client):
+        if self.stamp is not None:
+            client.incr(self.name, self.value, stamp=self.stamp)
+            self.value, self.stamp = 0, None
+
+
+class SamplesHandle(object):
+    """
+    Pre-registered average or timer (see StatsdClient.average_handle/timer_handle)
+    """
+    __slots__ = ('name', 'values', 'method')
+
+    def __init__(self, name, method):
+        self.name = name
+        self.values = []
+        self.method = method
+
+    def add(self, value):
+        self.values.append(value)
+
+    def add_values(self, values):
+        self.values.extend(values)
+
+    def collect(self, client):
+        if self.values:
+            getattr(client, self.method)(self.name, self.values)
+            self.values = []
+
+
 class StatsdClient(object):
     def __init__(self, address=None, port=None, interval=None, object=None):
         # Import context as a class object to avoid circular import on statsd.  This could be refactored later.
@@ -24,6 +80,69 @@ class StatsdClient(object):
         self.interval = interval
         self.current = defaultdict(dict)
         self.delivery = defaultdict(dict)
+        self.handles = {}
+
+        # timer samples are stored either as plain lists (exact) or as quantile sketches (bounded memory)
+        statsd_config = context.app_config.get('statsd', {})
+        self.timer_backend = statsd_config.get('timer_backend', 'exact')
+        self.timer_accuracy = float(statsd_config.get('timer_accuracy', DEFAULT_ACCURACY))
+
+        # counters that stay at zero are only reported once and then every keyframe_interval flushes
+        self.suppress_zero_counters = str(statsd_config.get('suppress_zero_counters', False)).lower() in ('true', '1')
+        self.keyframe_interval = int(statsd_config.get('keyframe_interval') or DEFAULT_KEYFRAME_INTERVAL)
+        self.zero_counters = set()
+        self.flushes = 0
+
+    def new_timer(self, values):
+        """
+        Creates a storage for timer samples according to the configured backend
+
+        :param values: [] of initial metric values
+        :return: list or QuantileSketch
+        """
+        if self.timer_backend == 'sketch':
+            return QuantileSketch(values, accuracy=self.timer_accuracy)
+        return list(values)
+
+    def counter_handle(self, metric_name):
+        """
+        Returns a handle for a counter that is updated often.  Handles are
+        interned, so the same handle is returned for the same name.
+
+        :param metric_name: metric name
+        :return: CounterHandle
+        """
+        key = ('counter', metric_name)
+        if key not in self.handles:
+            self.handles[key] = CounterHandle(metric_name)
+        return self.handles[key]
+
+    def average_handle(self, metric_name):
+        """
+        :param metric_name: metric name
+        :return: SamplesHandle for average()
+        """
+        key = ('average', metric_name)
+        if key not in self.handles:
+            self.handles[key] = SamplesHandle(metric_name, 'average_values')
+        return self.handles[key]
+
+    def timer_handle(self, metric_name):
+        """
+        :param metric_name: metric name
+        :return: SamplesHandle for timer()
+        """
+        key = ('timer', metric_name)
+        if key not in self.handles:
+            self.handles[key] = SamplesHandle(metric_name, 'timer_values')
+        return self.handles[key]
+
+    def collect_handles(self):
+        """
+        Moves values accumulated by handles to the current storage
+        """
+        for handle in self.handles.itervalues():
+            handle.collect(self)
 
     def latest(self, metric_name, value, stamp=None):
         """
@@ -50,6 +169,18 @@ class StatsdClient(object):
         else:
             self.current['average'][metric_name] = [value]
 
+    def average_values(self, metric_name, values):
+        """
+        Same thing as average() but for a batch of values at once
+
+        :param metric_name:  metric name
+        :param values:  [] of metric values
+        """
+        if metric_name in self.current['average']:
+            self.current['average'][metric_name].extend(values)
+        else:
+            self.current['average'][metric_name] = list(values)
+
     def timer(self, metric_name, value):
         """
         Histogram with 95 percentile
@@ -60,13 +191,28 @@ class StatsdClient(object):
         Sort the data set by value from highest to lowest and discard the highest 5% of the sorted samples.
         The next highest sample is the 95th percentile value for the data set.
 
+        With the "sketch" timer backend samples are not kept, so median and pctl95 are
+        reported within timer_accuracy relative error (1% by default).
+
         :param metric_name: metric name
         :param value: metric value
         """
         if metric_name in self.current['timer']:
             self.current['timer'][metric_name].append(value)
         else:
-            self.current['timer'][metric_name] = [value]
+            self.current['timer'][metric_name] = self.new_timer([value])
+
+    def timer_values(self, metric_name, values):
+        """
+        Same thing as timer() but for a batch of values at once
+
+        :param metric_name: metric name
+        :param values: [] of metric values
+        """
+        if metric_name in self.current['timer']:
+            self.current['timer'][metric_name].extend(values)
+        else:
+            self.current['timer'][metric_name] = self.new_timer(values)
 
     def incr(self, metric_name, value=None, rate=None, stamp=None):
         """
@@ -138,12 +284,58 @@ class StatsdClient(object):
         else:
             self.current['gauge'][metric_name] = [(timestamp, value)]
 
+    def gauge_values(self, metric_name, values, stamp=None):
+        """
+        Same thing as gauge() but for a batch of values at once
+
+        :param metric_name: metric name
+        :param values: [] of metric values
+        :param stamp: timestamp (current timestamp will be used if this is not specified)
+        """
+        timestamp = stamp or int(time.time())
+        gauges = self.current['gauge']
+        if metric_name not in gauges:
+            gauges[metric_name] = []
+        gauges[metric_name].extend((timestamp, value) for value in values)
+
+    def merge(self, current):
+        """
+        Merges metrics stored by another client (e.g. the "current" storage of a
+        client that lives in a log worker process) into this one.  Timer sketches
+        are merged as sketches, so a list of exact samples is converted if needed.
+
+        :param current: {} of metric type - metric name - stored values
+        """
+        for metric_name, slots in current.get('counter', {}).iteritems():
+            for stamp, value in slots:
+                self.incr(metric_name, value, stamp=stamp)
+
+        for metric_name, values in current.get('average', {}).iteritems():
+            self.average_values(metric_name, values)
+
+        for metric_name, values in current.get('gauge', {}).iteritems():
+            for stamp, value in values:
+                self.gauge(metric_name, value, stamp=stamp)
+
+        timers = self.current['timer']
+        for metric_name, values in current.get('timer', {}).iteritems():
+            if not isinstance(values, QuantileSketch):
+                self.timer_values(metric_name, values)
+            elif metric_name not in timers:
+                timers[metric_name] = values
+            else:
+                if not isinstance(timers[metric_name], QuantileSketch):
+                    timers[metric_name] = QuantileSketch(timers[metric_name], accuracy=values.accuracy)
+                timers[metric_name].merge(values)
+
     def flush(self):
+        self.collect_handles()
+
         if not self.current:
             return {'object': self.object.definition}
 
         results = {}
-        delivery = copy.deepcopy(self.current)
+        delivery = self.current  # nothing else refers to current storage, so swap instead of copying
         self.current = defaultdict(dict)
 
         # histogram
@@ -152,22 +344,35 @@ class StatsdClient(object):
             timestamp = int(time.time())
             for metric_name, metric_values in delivery['timer'].iteritems():
                 if len(metric_values):
-                    metric_values.sort()
+                    if isinstance(metric_values, QuantileSketch):
+                        total, value_at = metric_values.sum, metric_values.value_at
+                    else:
+                        metric_values.sort()
+                        total, value_at = sum(metric_values), metric_values.__getitem__
+
                     length = len(metric_values)
-                    timers['G|%s' % metric_name] = [[timestamp, sum(metric_values) / float(length)]]
+                    if length % 2 == 1:
+                        median = value_at(length // 2)
+                    else:
+                        median = (value_at(length // 2 - 1) + value_at(length // 2)) / 2.0
+
+                    timers['G|%s' % metric_name] = [[timestamp, total / float(length)]]
                     filter_suffix = ""
                     filter_suffix_index = metric_name.find("||")
                     if filter_suffix_index > 0:
                         filter_suffix = metric_name[filter_suffix_index:]
                         metric_name = metric_name[:filter_suffix_index]
                     timers['C|%s.count%s' % (metric_name, filter_suffix)] = [[timestamp, length]]
-                    timers['G|%s.max%s' % (metric_name, filter_suffix)] = [[timestamp, metric_values[-1]]]
-                    timers['G|%s.median%s' % (metric_name, filter_suffix)] = [[timestamp, median(metric_values, presorted=True)]]
-                    timers['G|%s.pctl95%s' % (metric_name, filter_suffix)] = [[timestamp, metric_values[-int(round(length * .05))]]]
+                    timers['G|%s.max%s' % (metric_name, filter_suffix)] = [[timestamp, value_at(-1)]]
+                    timers['G|%s.median%s' % (metric_name, filter_suffix)] = [[timestamp, median]]
+                    timers['G|%s.pctl95%s' % (metric_name, filter_suffix)] = [[timestamp, value_at(-int(round(length * .05)))]]
             results['timer'] = timers
 
         # counters
         if 'counter' in delivery:
+            self.flushes += 1
+            keyframe = self.flushes % self.keyframe_interval == 0
+
             counters = {}
             for k, v in delivery['counter'].iteritems():
                 # Aggregate all observed counters into a single record.
@@ -176,6 +381,15 @@ class StatsdClient(object):
                 for timestamp, value in v:
                     total_value += value
 
+                # a zero counter that was zero in the previous flush too is implied by the backend
+                if self.suppress_zero_counters:
+                    if total_value:
+                        self.zero_counters.discard(k)
+                    elif k not in self.zero_counters:
+                        self.zero_counters.add(k)
+                    elif not keyframe:
+                        continue
+
                 # Condense the list of lists 'v' into a list of a single element.  Remember that we are using lists
                 # instead of tuples because we need mutability during self.incr().
                 counters['C|%s' % k] = [[last_stamp, total_value]]
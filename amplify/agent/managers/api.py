@@ -40,6 +40,16 @@ class ApiManager(ObjectManager):
         'slab'
     )
 
+    # payload location/path : object (all paths have to be fetched by traverse_plus_api, see API_ENDPOINTS)
+    api_object_map = {
+        ('http', 'caches'): NginxApiHttpCacheObject,
+        ('http', 'server_zones'): NginxApiHttpServerZoneObject,
+        ('http', 'upstreams'): NginxApiHttpUpstreamObject,
+        ('slabs',): NginxApiSlabObject,
+        ('stream', 'server_zones'): NginxApiStreamServerZoneObject,
+        ('stream', 'upstreams'): NginxApiStreamUpstreamObject
+    }
+
     def _api_objects(self):
         return filter(
             lambda obj: context.objects.find_parent(obj=obj).api_enabled,
@@ -76,17 +86,7 @@ class ApiManager(ObjectManager):
             if not plus_payload or not stamp:
                 continue
 
-            # payload location/path : object
-            api_object_map = {
-                ('http', 'caches'): NginxApiHttpCacheObject,
-                ('http', 'server_zones'): NginxApiHttpServerZoneObject,
-                ('http', 'upstreams'): NginxApiHttpUpstreamObject,
-                ('slabs',): NginxApiSlabObject,
-                ('stream', 'server_zones'): NginxApiStreamServerZoneObject,
-                ('stream', 'upstreams'): NginxApiStreamUpstreamObject
-            }
-
-            for path, cls in api_object_map.iteritems():
+            for path, cls in self.api_object_map.iteritems():
                 area = plus_payload
 
                 for key in path:
@@ -2,12 +2,13 @@
 import gc
 import time
 
-from collections import deque
 from requests.exceptions import HTTPError
 
 from amplify.agent.common.context import context
 from amplify.agent.common.cloud import HTTP503Error
 from amplify.agent.common.util.backoff import exponential_delay
+from amplify.agent.common.util.payload import Payload
+from amplify.agent.common.util.spool import Spool
 from amplify.agent.managers.abstract import AbstractManager
 
 
@@ -21,6 +22,14 @@ __email__ = "dedm@nginx.com"
 class Bridge(AbstractManager):
     """
     Manager that flushes object bins and stores them in deques.  These deques are then sent to backend.
+
+    Flushed data is encoded and compressed right away (see Payload), so a payload that couldn't be sent is
+    not encoded again on the next attempt.
+
+    If "spool_dir" is set in the [cloud] section, payloads that couldn't be sent are moved to a disk spool instead
+    of staying in memory, and are sent again (spool_replay_rate of them per push) after a successful push.
+
+    If "metric_names_dictionary" is set, metric names are sent once per payload and referenced by ids.
     """
     name = 'bridge_manager'
 
@@ -29,13 +38,27 @@ class Bridge(AbstractManager):
             kwargs['interval'] = context.app_config['cloud']['push_interval']
         super(Bridge, self).__init__(**kwargs)
 
-        self.payload = {}
+        self.payload = None
         self.first_run = True
 
         self.last_http_attempt = 0
         self.http_fail_count = 0
         self.http_delay = 0
 
+        # send metric names once per payload (see Payload)
+        self.metric_names = str(context.app_config['cloud'].get('metric_names_dictionary', False)).lower() in ('true', '1')
+
+        self.spool = None
+        self.spool_replay_rate = int(context.app_config['cloud'].get('spool_replay_rate') or 10)
+        spool_dir = context.app_config['cloud'].get('spool_dir')
+        if spool_dir:
+            try:
+                max_size = int(context.app_config['cloud'].get('spool_max_size') or 100) * 1024 * 1024
+                self.spool = Spool(spool_dir, max_size=max_size)
+            except (IOError, OSError):
+                context.log.error('failed to set up payload spool in "%s"' % spool_dir)
+                context.log.debug('additional info:', exc_info=True)
+
         # Instantiate payload with appropriate keys and buckets.
         self._reset_payload()
 
@@ -63,7 +86,7 @@ class Bridge(AbstractManager):
         """
         flush_data = self._flush_metrics()
         if flush_data:
-            self.payload['metrics'].append(flush_data)
+            self.payload.append('metrics', flush_data)
         self._send_payload()
 
     def flush_all(self, force=False):
@@ -82,13 +105,13 @@ class Bridge(AbstractManager):
             # If this is the first run, flush meta only to ensure object creation.
             flush_data = self._flush_meta()
             if flush_data:
-                self.payload['meta'].append(flush_data)
+                self.payload.append('meta', flush_data)
         else:
-            for client_type in self.payload.keys():
+            for client_type in self.payload.keys:
                 if client_type in clients:
                     flush_data = clients[client_type].__call__()
                     if flush_data:
-                        self.payload[client_type].append(flush_data)
+                        self.payload.append(client_type, flush_data)
 
         now = time.time()
         if force or (
@@ -112,12 +135,13 @@ class Bridge(AbstractManager):
         )
 
         # Send payload to backend.
+        body = None
         try:
             self.last_http_attempt = time.time()
 
-            self._pre_process_payload()  # Convert deques to lists for encoding
-            context.http_client.post('update/', data=self.payload)
-            context.default_log.debug(self.payload)
+            body = self.payload.body()
+            context.http_client.post('update/', body=body)
+            context.default_log.debug('sent payload of %s bytes' % len(body))
             self._reset_payload()  # Clear payload after successful
 
             if self.first_run:
@@ -128,25 +152,18 @@ class Bridge(AbstractManager):
                 self.http_delay = 0  # Reset HTTP delay on success
                 context.log.debug('successful update, reset http delay')
         except Exception as e:
-            self._post_process_payload()  # Convert lists to deques since send failed
-
-            if isinstance(e, HTTPError) and e.response.status_code == 503:
-                backpressure_error = HTTP503Error(e)
-                context.backpressure_time = int(time.time() + backpressure_error.delay)
-                context.log.debug(
-                    'back pressure delay %s added (next talk: %s)' % (
-                        backpressure_error.delay,
-                        context.backpressure_time
-                    )
-                )
-            else:
-                self.http_fail_count += 1
-                self.http_delay = exponential_delay(self.http_fail_count)
-                context.log.debug('http delay set to %s (fails: %s)' % (self.http_delay, self.http_fail_count))
-
-            exception_name = e.__class__.__name__
-            context.log.error('failed to push data due to %s' % exception_name)
-            context.log.debug('additional info:', exc_info=True)
+            self._handle_send_error(e)
+
+            # keep the payload on disk rather than in memory
+            if self.spool is not None and body is not None:
+                try:
+                    self.spool.append(body)
+                    self._reset_payload()
+                except (IOError, OSError):
+                    context.log.error('failed to spool payload')
+                    context.log.debug('additional info:', exc_info=True)
+        else:
+            self._replay_spool()
 
         context.log.debug(
             'finished flush_all; new payload stats: '
@@ -158,6 +175,52 @@ class Bridge(AbstractManager):
             )
         )
 
+    def _handle_send_error(self, e):
+        """
+        Sets back pressure or http delay after a failed push
+        """
+        if isinstance(e, HTTPError) and e.response.status_code == 503:
+            backpressure_error = HTTP503Error(e)
+            context.backpressure_time = int(time.time() + backpressure_error.delay)
+            context.log.debug(
+                'back pressure delay %s added (next talk: %s)' % (
+                    backpressure_error.delay,
+                    context.backpressure_time
+                )
+            )
+        else:
+            self.http_fail_count += 1
+            self.http_delay = exponential_delay(self.http_fail_count)
+            context.log.debug('http delay set to %s (fails: %s)' % (self.http_delay, self.http_fail_count))
+
+        exception_name = e.__class__.__name__
+        context.log.error('failed to push data due to %s' % exception_name)
+        context.log.debug('additional info:', exc_info=True)
+
+    def _replay_spool(self):
+        """
+        Sends spooled payloads oldest first, not more than spool_replay_rate of them at once
+        """
+        if self.spool is None:
+            return
+
+        for _ in xrange(self.spool_replay_rate):
+            if time.time() <= context.backpressure_time:
+                break
+
+            body = self.spool.peek()
+            if body is None:
+                break
+
+            try:
+                context.http_client.post('update/', body=body)
+            except Exception as e:
+                self._handle_send_error(e)
+                break
+
+            self.spool.pop()
+            context.log.debug('sent spooled payload of %s bytes' % len(body))
+
     def _flush_meta(self):
         return self._flush(clients=['meta'])
 
@@ -212,24 +275,4 @@ class Bridge(AbstractManager):
         """
         After payload has been successfully sent, clear the queues (reset them to empty deques).
         """
-        self.payload = {
-            'meta': deque(maxlen=360),
-            'metrics': deque(maxlen=360),
-            'events': deque(maxlen=360),
-            'configs': deque(maxlen=360)
-        }
-
-    def _pre_process_payload(self):
-        """
-        ujson.encode does not handle deque objects well.  So before attempting a send, convert all the deques to lists.
-        """
-        for key in self.payload.keys():
-            self.payload[key] = list(self.payload[key])
-
-    def _post_process_payload(self):
-        """
-        If a payload is NOT reset (cannot be sent), then we should reconvert the lists to deques with maxlen to enforce
-        memory management.
-        """
-        for key in self.payload.keys():
-            self.payload[key] = deque(self.payload[key], maxlen=360)
+        self.payload = Payload(maxlen=360, level=context.http_client.gzip, metric_names=self.metric_names)
@@ -10,9 +10,11 @@ from crossplane.lexer import _iterescape
 from amplify.agent.common.context import context
 from amplify.agent.common.util import subp
 from amplify.agent.common.util.glib import glib
-from amplify.agent.common.util.ssl import ssl_analysis
+from amplify.agent.common.util.ssl import CertificateCache, ssl_analysis
 from amplify.agent.objects.nginx.binary import nginx_v
-from amplify.agent.objects.nginx.config.parser import NginxConfigParser, get_filesystem_info
+from amplify.agent.objects.nginx.config.parser import (
+    NginxConfigParser, ParsedFilesCache, _stat_key, get_filesystem_info, iter_statements, simplify
+)
 
 __author__ = "Mike Belov"
 __copyright__ = "Copyright (C) Nginx, Inc. All rights reserved."
@@ -31,6 +33,29 @@ ERROR_LOG_LEVELS = (
     'emerg'
 )
 
+DIGEST_CHUNK_SIZE = 64 * 1024
+
+
+def _file_digest(path, cache):
+    """
+    Returns sha256 hexdigest of a file.  Digests are kept in the cache, so a
+    file is only read again if its device, inode, mtime or size has changed.
+
+    :param path: str path to file
+    :param cache: ParsedFilesCache
+    :return: str hexdigest
+    """
+    key, stat_key = ('sha256', path), _stat_key(path)
+    digest = cache.get(key, stat_key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(DIGEST_CHUNK_SIZE), ''):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        cache.put(key, stat_key, digest)
+    return digest
+
 
 def _enquote(arg):
     arg = str(arg.encode('utf-8'))
@@ -63,7 +88,6 @@ class NginxConfig(object):
         self.files = {}
         self.directories = {}
         self.directory_map = {}
-        self.subtree = []
         self.ssl_certificates = {}
         self.parser_ssl_certificates = []
         self.parser_errors = []
@@ -73,10 +97,12 @@ class NginxConfig(object):
         self.api_external_urls = []
         self.api_internal_urls = []
         self.parser = None
+        self.parser_cache = ParsedFilesCache()  # files are only parsed and hashed again if they have changed
+        self.ssl_cache = CertificateCache()  # certificates are only analyzed again if they have changed
         self.wait_until = 0
 
     def _setup_parser(self):
-        self.parser = NginxConfigParser(filename=self.filename)
+        self.parser = NginxConfigParser(filename=self.filename, cache=self.parser_cache)
 
     def _teardown_parser(self):
         self.parser = None
@@ -120,7 +146,6 @@ class NginxConfig(object):
         self.files = self.parser.files
         self.directories = self.parser.directories
         self.directory_map = self.parser.directory_map
-        self.subtree = self.parser.simplify()
         self.ssl_certificates = {}  # gets populated in run_ssl_analysis()
         self.parser_ssl_certificates = self.parser.ssl_certificates
         self.parser_errors = self.parser.errors
@@ -137,7 +162,17 @@ class NginxConfig(object):
         self.api_internal_urls = []
 
         # go through and collect all logical data
-        self._collect_data(self.subtree)
+        self._collect_data(iter_statements(self.tree))
+
+    @property
+    def subtree(self):
+        """
+        Include-expanded copy of the config tree.  It's built on demand and
+        not kept, as it would double the memory held by the config.
+
+        :return: [] of statement dicts
+        """
+        return simplify(self.tree)
 
     def collect_structure(self, include_ssl_certs=False):
         """
@@ -170,7 +205,7 @@ class NginxConfig(object):
         """
         Searches needed data in config's tree
 
-        :param block: list of statement dicts to parse
+        :param block: iterable of statement dicts to parse (from iter_statements())
         :param ctx: dict with context
         """
         ctx = ctx if ctx is not None else {}
@@ -217,10 +252,14 @@ class NginxConfig(object):
                 )
 
             elif directive == 'server' and 'upstream' not in ctx:
-                listens = []
-                for inner_stmt in stmt['block']:
+                listens, server_name, server_schema = [], None, None
+                for inner_stmt in iter_statements(self.tree, stmt['block']):
                     if inner_stmt['directive'] == 'listen':
                         listens.append(inner_stmt['args'][0])
+                        if server_schema is None:
+                            server_schema = 'https' if 'ssl' in inner_stmt['args'] else 'http'
+                    elif inner_stmt['directive'] == 'server_name' and server_name is None:
+                        server_name = inner_stmt['args'][0]
 
                 if not listens:
                     listens += ['80', '8000']
@@ -234,27 +273,22 @@ class NginxConfig(object):
                         context.log.debug('additional info:', exc_info=True)
 
                 server_ctx = dict(ctx, ip_port=ip_port)
-                for inner_stmt in stmt['block']:
-                    if inner_stmt['directive'] == 'server_name':
-                        server_ctx['server_name'] = inner_stmt['args'][0]
-                        break
-
-                for inner_stmt in stmt['block']:
-                    if inner_stmt['directive'] == 'listen':
-                        server_ctx['server_schema'] = 'https' if 'ssl' in inner_stmt['args'] else 'http'
-                        break
+                if server_name is not None:
+                    server_ctx['server_name'] = server_name
+                if server_schema is not None:
+                    server_ctx['server_schema'] = server_schema
 
-                self._collect_data(stmt['block'], ctx=server_ctx)
+                self._collect_data(iter_statements(self.tree, stmt['block']), ctx=server_ctx)
 
             elif directive == 'upstream':
                 upstream = args[0]
                 upstream_ctx = dict(ctx, upstream=upstream)
-                self._collect_data(stmt['block'], ctx=upstream_ctx)
+                self._collect_data(iter_statements(self.tree, stmt['block']), ctx=upstream_ctx)
 
             elif directive == 'location':
                 location = ' '.join(map(_enquote, args))
                 location_ctx = dict(ctx, location=location)
-                self._collect_data(stmt['block'], ctx=location_ctx)
+                self._collect_data(iter_statements(self.tree, stmt['block']), ctx=location_ctx)
 
             elif directive == 'stub_status' and 'ip_port' in ctx:
                 for url in self._status_url(ctx):
@@ -286,7 +320,7 @@ class NginxConfig(object):
                         self.api_internal_urls.append(url)
 
             elif 'block' in stmt:
-                self._collect_data(stmt['block'], ctx=ctx)
+                self._collect_data(iter_statements(self.tree, stmt['block']), ctx=ctx)
 
     @staticmethod
     def _status_url(ctx, server_preferred=False):
@@ -362,14 +396,14 @@ class NginxConfig(object):
         """
         checksums = []
         for file_path, file_data in self.files.iteritems():
-            checksums.append(hashlib.sha256(open(file_path).read()).hexdigest())
+            checksums.append(_file_digest(file_path, self.parser_cache))
             checksums.append(file_data['permissions'])
             checksums.append(str(file_data['mtime']))
         for dir_data in self.directories.itervalues():
             checksums.append(dir_data['permissions'])
             checksums.append(str(dir_data['mtime']))
         for cert in self.ssl_certificates.iterkeys():
-            checksums.append(hashlib.sha256(open(cert).read()).hexdigest())
+            checksums.append(_file_digest(cert, self.parser_cache))
         return hashlib.sha256('.'.join(checksums)).hexdigest()
 
     def _parse_listen(self, listen):
@@ -447,14 +481,16 @@ class NginxConfig(object):
         :return: float run time
         """
         if not self.parser_ssl_certificates:
+            self.ssl_cache.prune()
             return
 
         start_time = time.time()
 
         for cert_filename in set(self.parser_ssl_certificates):
-            ssl_analysis_result = ssl_analysis(cert_filename)
+            ssl_analysis_result = ssl_analysis(cert_filename, cache=self.ssl_cache)
             if ssl_analysis_result:
                 self.ssl_certificates[cert_filename] = ssl_analysis_result
+        self.ssl_cache.prune()
 
         end_time = time.time()
         return end_time - start_time
@@ -3,10 +3,13 @@ import fnmatch
 import glob
 import os
 import re
-import sys
 
 import crossplane
 import scandir
+from crossplane.analyzer import analyze, enter_block_ctx
+from crossplane.errors import NgxParserDirectiveError
+from crossplane.lexer import lex
+from crossplane.parser import _prepare_if_args
 
 from amplify.agent.common.context import context
 
@@ -68,14 +71,184 @@ def _getline(filename, lineno):
                 return line.rstrip('\r\n')
 
 
+def _stat_key(path):
+    """
+    :param path: str path to file
+    :return: tuple that changes whenever the file is changed or replaced, None if the file can't be stat'ed
+    """
+    try:
+        info = os.stat(path)
+        return info.st_dev, info.st_ino, info.st_mtime, info.st_size
+    except OSError:
+        return None
+
+
+def _parse_file(filename, ctx=()):
+    """
+    Parses a single config file the same way crossplane.parse() does, except
+    that include directives are not followed (their "includes" are resolved by
+    NginxConfigParser), so the result depends on the file only and can be cached.
+
+    :param filename: str path to file
+    :param ctx: tuple of block directives the file is included in
+    :return: ({} crossplane "config" item of the file, [] of exceptions matching its errors)
+    """
+    parsing = {'file': filename, 'status': 'ok', 'errors': [], 'parsed': []}
+    exceptions = []
+
+    def handle_error(e):
+        parsing['status'] = 'failed'
+        parsing['errors'].append({'error': str(e), 'line': getattr(e, 'lineno', None)})
+        exceptions.append(e)
+
+    def parse_block(tokens, ctx=(), consume=False):
+        parsed = []
+        for token, lineno, quoted in tokens:
+            if token == '}' and not quoted:
+                break
+
+            # consume everything until the end of the context (blocks inside it too)
+            if consume:
+                if token == '{' and not quoted:
+                    parse_block(tokens, consume=True)
+                continue
+
+            # comments are not included in the payload
+            if token.startswith('#') and not quoted:
+                continue
+
+            stmt = {'directive': token, 'line': lineno, 'args': []}
+
+            token, _, quoted = next(tokens)
+            while token not in ('{', ';', '}') or quoted:
+                stmt['args'].append(token)
+                token, _, quoted = next(tokens)
+
+            if stmt['directive'] in IGNORED_DIRECTIVES:
+                if token == '{' and not quoted:
+                    parse_block(tokens, consume=True)
+                continue
+
+            if stmt['directive'] == 'if':
+                _prepare_if_args(stmt)
+
+            try:
+                analyze(filename, stmt, token, ctx, strict=False)
+            except NgxParserDirectiveError as e:
+                handle_error(e)
+                if e.strerror.endswith(' is not terminated by ";"'):
+                    if token != '}' and not quoted:
+                        parse_block(tokens, consume=True)
+                    else:
+                        break
+                continue
+
+            if token == '{' and not quoted:
+                stmt['block'] = parse_block(tokens, ctx=enter_block_ctx(stmt, ctx))
+
+            parsed.append(stmt)
+        return parsed
+
+    try:
+        parsing['parsed'] = parse_block(lex(filename), ctx=ctx)
+    except Exception as e:
+        handle_error(e)
+
+    return parsing, exceptions
+
+
+def iter_statements(tree, block=None):
+    """
+    Streams statements of a block with statements of included files following
+    their include directives, so the include-expanded config is visited
+    without building it.  Nested blocks are not expanded, iterate them with
+    iter_statements(tree, stmt['block']).
+
+    :param tree: {} crossplane payload
+    :param block: [] of statements (main context of the payload by default)
+    :return: generator of statement dicts
+    """
+    if block is None:
+        if not tree.get('config'):
+            return
+        block = tree['config'][0]['parsed']
+
+    for stmt in block:
+        # ignore comments
+        if 'comment' in stmt:
+            continue
+
+        yield stmt
+
+        # do yield from contexts included from other files
+        if stmt['directive'] == 'include':
+            for index in stmt['includes']:
+                for incl_stmt in iter_statements(tree, tree['config'][index]['parsed']):
+                    yield incl_stmt
+
+
+def simplify(tree, block=None):
+    """
+    :param tree: {} crossplane payload
+    :param block: [] of statements (main context of the payload by default)
+    :return: [] include-expanded copy of the block
+    """
+    result = []
+    for stmt in iter_statements(tree, block):
+        # recurse deeper into block contexts
+        if 'block' in stmt:
+            stmt = dict(stmt, block=simplify(tree, stmt['block']))
+        result.append(stmt)
+    return result
+
+
+class ParsedFilesCache(object):
+    """
+    Results of parsing single config files (and their line counts) kept between
+    parses.  An entry is only used while the file has the same device, inode,
+    mtime and size, so after a change just the changed files are lexed and
+    parsed again.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.used = set()
+
+    def get(self, key, stat_key):
+        """
+        :param key: tuple cache key
+        :param stat_key: tuple from _stat_key() of the file
+        :return: cached value or None
+        """
+        self.used.add(key)
+        entry = self.entries.get(key)
+        if entry is not None and stat_key is not None and entry[0] == stat_key:
+            return entry[1]
+        return None
+
+    def put(self, key, stat_key, value):
+        self.used.add(key)
+        if stat_key is not None:
+            self.entries[key] = (stat_key, value)
+
+    def prune(self):
+        """
+        Drops entries of files that weren't used since the previous prune()
+        """
+        for key in set(self.entries) - self.used:
+            del self.entries[key]
+        self.used = set()
+
+
 class NginxConfigParser(object):
     """
     Parser responsible for parsing the NGINX config and following all includes.
     It is created on demand and discarded after use (to save system resources).
     """
 
-    def __init__(self, filename='/etc/nginx/nginx.conf'):
+    def __init__(self, filename='/etc/nginx/nginx.conf', cache=None):
         self.filename = filename
+        self.cache = cache if cache is not None else ParsedFilesCache()
         self.directory = self._dirname(filename)
 
         self.files = {}
@@ -141,7 +314,12 @@ class NginxConfigParser(object):
             self._add_directory(dirname, check=True)
             try:
                 info = get_filesystem_info(filename)
-                info['lines'] = open(filename).read().count('\n')
+                stat_key = _stat_key(filename)
+                lines = self.cache.get(('lines', filename), stat_key)
+                if lines is None:
+                    lines = open(filename).read().count('\n')
+                    self.cache.put(('lines', filename), stat_key, lines)
+                info['lines'] = lines
                 self.files[filename] = info
             except Exception as e:
                 self._handle_error(filename, e, is_dir=False)
@@ -229,13 +407,8 @@ class NginxConfigParser(object):
         self.includes = []
         self.ssl_certificates = []
 
-        # use the new parser to parse the nginx config
-        self.tree = crossplane.parse(
-            filename=self.filename,
-            onerror=(lambda e: sys.exc_info()),
-            catch_errors=True,
-            ignore=IGNORED_DIRECTIVES
-        )
+        # parse the nginx config (files that haven't changed since the previous parse come from the cache)
+        self.tree = self._parse_tree()
 
         for error in self.tree['errors']:
             path = error['file']
@@ -255,6 +428,9 @@ class NginxConfigParser(object):
                 self._add_file(config['file'])
                 self._collect_included_files_and_cert_dirs(config['parsed'], include_ssl_certs=include_ssl_certs)
 
+        # forget files that are not part of the config anymore
+        self.cache.prune()
+
         # construct directory_map
         for dirname, info in self.directories.iteritems():
             self.directory_map[dirname] = {'info': info, 'files': {}}
@@ -272,35 +448,89 @@ class NginxConfigParser(object):
             self.directory_map[dirname]['files'].setdefault(filename, {'info': {}})
             self.directory_map[dirname]['files'][filename]['error'] = error
 
-    def simplify(self):
-        """
-        This will return one giant list that uses all of the includes logic
-        to compile one large nginx context (similar to parsing nginx -T).
-        It's very useful for post-analysis and testing.
+    def _parse_tree(self):
         """
+        Builds the same payload as crossplane.parse(), but every file is parsed
+        on its own by _parse_file() and the results are kept in self.cache
 
-        def simplify_block(block):
-            for stmt in block:
-                # ignore comments
-                if 'comment' in stmt:
-                    continue
+        :return: {} crossplane payload
+        """
+        config_dir = os.path.dirname(self.filename)
+        payload = {'status': 'ok', 'errors': [], 'config': []}
 
-                # recurse deeper into block contexts
-                if 'block' in stmt:
-                    ctx = simplify_block(stmt['block'])
-                    stmt = dict(stmt, block=list(ctx))
+        includes = [(self.filename, ())]  # (filename, context) tuples, grows while includes are resolved
+        included = {self.filename: 0}  # filename: index in payload['config']
 
-                yield stmt
+        def handle_error(parsing, e):
+            error = {'error': str(e), 'line': getattr(e, 'lineno', None)}
+            parsing['status'] = 'failed'
+            parsing['errors'].append(error)
+            payload['status'] = 'failed'
+            payload['errors'].append(dict(error, file=parsing['file'], callback=(e.__class__, e, None)))
 
-                # do yield from contexts included from other files
+        def resolve_includes(parsing, block, ctx):
+            """
+            Returns a copy of the block with "includes" of include directives (statements
+            without includes inside are shared with the cached block)
+            """
+            resolved = []
+            for stmt in block:
                 if stmt['directive'] == 'include':
-                    for index in stmt['includes']:
-                        incl_block = self.tree['config'][index]['parsed']
-                        for incl_stmt in simplify_block(incl_block):
-                            yield incl_stmt
+                    stmt = dict(stmt, includes=[])
+                    pattern = stmt['args'][0]
+                    if not os.path.isabs(pattern):
+                        pattern = os.path.join(config_dir, pattern)
+
+                    if glob.has_magic(pattern):
+                        fnames = sorted(glob.glob(pattern))
+                    else:
+                        try:
+                            # if the file pattern was explicit, nginx will check that the file can be read
+                            open(str(pattern)).close()
+                            fnames = [pattern]
+                        except Exception as e:
+                            fnames = []
+                            e.lineno = stmt['line']
+                            handle_error(parsing, e)
+
+                    for fname in fnames:
+                        if fname not in included:
+                            included[fname] = len(includes)
+                            includes.append((fname, ctx))
+                        stmt['includes'].append(included[fname])
+
+                elif 'block' in stmt:
+                    stmt = dict(stmt, block=resolve_includes(parsing, stmt['block'], enter_block_ctx(stmt, ctx)))
+
+                resolved.append(stmt)
+            return resolved
+
+        for fname, ctx in includes:
+            cache_key = ('parsed', fname, ctx)
+            stat_key = _stat_key(fname)
+            cached = self.cache.get(cache_key, stat_key)
+            if cached is None:
+                cached = _parse_file(fname, ctx)
+                self.cache.put(cache_key, stat_key, cached)
+            parsed_file, exceptions = cached
+
+            parsing = dict(parsed_file, errors=list(parsed_file['errors']))
+            for error, e in zip(parsed_file['errors'], exceptions):
+                payload['status'] = 'failed'
+                payload['errors'].append(dict(error, file=fname, callback=(e.__class__, e, None)))
+
+            parsing['parsed'] = resolve_includes(parsing, parsed_file['parsed'], ctx)
+            payload['config'].append(parsing)
+
+        return payload
 
-        main_ctx = simplify_block(self.tree['config'][0]['parsed'])
-        return list(main_ctx)
+    def simplify(self):
+        """
+        This will return one giant list that uses all of the includes logic
+        to compile one large nginx context (similar to parsing nginx -T).
+        It's very useful for post-analysis and testing.
+        """
+        return simplify(self.tree)
 
     def get_structure(self, include_ssl_certs=False):
         """
@@ -88,3 +88,98 @@ class Filter(object):
             return True
         else:
             return False
+
+
+class FilterEngine(object):
+    """
+    Matches parsed lines against a set of filters at once.
+
+    Conditions of all filters are grouped by key and deduplicated, so every
+    distinct (key, value) condition is evaluated once per line no matter how
+    many filters use it.  Results for a value are cached per key, which makes
+    repeated values (methods, statuses, upstream addresses) almost free.
+    """
+
+    # max number of cached values per key
+    cache_size = 1024
+
+    def __init__(self, filters):
+        self.filters = list(filters)
+
+        conditions = {}  # (key, kind, value) - index in self.conditions
+        self.conditions = []  # [] of (key, str or compiled regex)
+        self.keys = {}  # key - [] of condition indexes
+        self.filter_conditions = []  # [] of (filter, [] of (condition index, negated))
+
+        for log_filter in self.filters:
+            checks = []
+            for key, value in log_filter.data.iteritems():
+                if isinstance(value, RE_TYPE):
+                    condition = (key, 're', value.pattern)
+                else:
+                    condition = (key, 'str', value)
+
+                if condition not in conditions:
+                    conditions[condition] = len(self.conditions)
+                    self.conditions.append((key, value))
+                    self.keys.setdefault(key, []).append(conditions[condition])
+
+                checks.append((conditions[condition], log_filter._negated_conditions[key]))
+            self.filter_conditions.append((log_filter, checks))
+
+        self.cache = dict((key, {}) for key in self.keys)
+
+    def _evaluate(self, key, value):
+        """
+        :param key: str key of parsed line
+        :param value: parsed value
+        :return: [] of bools for every condition of the key
+        """
+        value = str(value)
+        results = []
+        for index in self.keys[key]:
+            filter_value = self.conditions[index][1]
+            if isinstance(filter_value, RE_TYPE):
+                results.append(filter_value.match(value) is not None)
+            else:
+                results.append(isinstance(filter_value, str) and filter_value == value)
+        return results
+
+    def match(self, parsed):
+        """
+        Finds all filters matching a parsed line
+
+        :param parsed: {} of parsed string
+        :return: [] of matched filters
+        """
+        results = [None] * len(self.conditions)  # None means that the key is missing
+
+        for key, indexes in self.keys.iteritems():
+            if key not in parsed:
+                continue
+
+            value = parsed[key]
+            cache = self.cache[key]
+            try:
+                key_results = cache[value]
+            except KeyError:
+                key_results = self._evaluate(key, value)
+                if len(cache) >= self.cache_size:
+                    cache.clear()
+                cache[value] = key_results
+            except TypeError:  # unhashable, e.g. a list of upstream values
+                key_results = self._evaluate(key, value)
+
+            for index, result in zip(indexes, key_results):
+                results[index] = result
+
+        matched = []
+        for log_filter, checks in self.filter_conditions:
+            for index, negated in checks:
+                result = results[index]
+                # if the key isn't in parsed, then filter is irrelevant
+                if result is None or result == negated:
+                    break
+            else:
+                matched.append(log_filter)
+        return matched
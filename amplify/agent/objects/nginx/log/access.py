@@ -3,7 +3,7 @@ import re
 
 from amplify.agent.common.context import context
 from amplify.agent.common.util.text import (
-    decompose_format, parse_line_split
+    decompose_format, split_line_values
 )
 
 
@@ -16,6 +16,14 @@ __email__ = "dedm@nginx.com"
 
 REQUEST_RE = re.compile(r'(?P<request_method>[A-Z]+) (?P<request_uri>/.*) (?P<server_protocol>.+)')
 
+# kinds of post-processing applied to a compiled field
+FIELD_VALUE = 0
+FIELD_TIME = 1
+FIELD_LIST = 2
+
+# workaround for an old nginx bug with time. ask lonerr@ for details
+MAX_TIME_VALUE = 10000000
+
 
 class NginxAccessLogParser(object):
     """
@@ -72,88 +80,116 @@ class NginxAccessLogParser(object):
         self.keys, self.trie, self.non_key_patterns, self.first_value_is_key = \
             decompose_format(self.raw_format, full=True)
 
+        self.fields = self.compile_fields()
+
+    def compile_fields(self):
+        """
+        Compiles the decomposed format into a list of per-position field
+        handlers so that parse() doesn't have to probe variable dicts for
+        every key of every line.
+
+        If a key appears several times in the format the last value wins, the
+        same way it did with dict(zip(keys, values)).
+
+        :return: [] of (key, value index, caster or None, field kind) tuples
+        """
+        positions = {}
+        for index, key in enumerate(self.keys):
+            positions[key] = index
+
+        fields = []
+        for key in self.keys:
+            if key not in positions:
+                continue  # duplicate that was already compiled
+            index = positions.pop(key)
+
+            func = self.common_variables[key][1] \
+                if key in self.common_variables \
+                else self.default_variable[1]
+
+            # values are already strings, so don't waste a call on them
+            caster = None if func is str else func
+
+            if key.endswith('_time'):
+                kind = FIELD_TIME
+            elif key in self.comma_separated_keys:
+                kind = FIELD_LIST
+            else:
+                kind = FIELD_VALUE
+
+            fields.append((key, index, caster, kind))
+
+        return fields
+
     def parse(self, line):
         """
         Parses the line and if there are some special fields - parse them too
         For example we can get HTTP method and HTTP version from request
 
-        The difference between this and above is that this one uses split
-        mechanic rather than trie matching direclty.
+        Values are split out by non-key patterns and then fed through the
+        field handlers compiled in compile_fields().
 
         :param line: log line
         :return: dict with parsed info
         """
-        result = {'malformed': False}
-
-        # parse the line
-        parsed = parse_line_split(
+        values = split_line_values(
             line,
-            keys=self.keys,
             non_key_patterns=self.non_key_patterns,
-            first_value_is_key=self.first_value_is_key
+            first_value_is_key=self.first_value_is_key,
+            keys_count=len(self.keys)
         )
 
-        if parsed:
-            for key in self.keys:
-                # key local vars
-                time_var = False
+        if not self.keys or not values:
+            context.default_log.debug(
+                'could not parse line "%s" with format "%s"' % (
+                    line, self.raw_format
+                )
+            )
+            return None
 
-                func = self.common_variables[key][1] \
-                    if key in self.common_variables \
-                    else self.default_variable[1]
+        result = {'malformed': False}
+        values_count = len(values)
+
+        for key, index, caster, kind in self.fields:
+            if index >= values_count:  # something went wrong with line parsing
+                context.default_log.warn(
+                    'failed to find expected log variable "%s" in access '
+                    'log line, skipping' % key
+                )
+                context.default_log.debug('additional info:')
+                context.default_log.debug(
+                    'keys: %s\nformat: "%s"\nline:"%s"' % (
+                        self.keys,
+                        self.raw_format,
+                        line
+                    )
+                )
+                continue
 
+            value = values[index]
+            if caster is not None:
                 try:
-                    value = func(parsed[key])
+                    value = caster(value)
                 # for example gzip ratio can be '-' and float
                 except ValueError:  # couldn't cast log value
                     value = 0
-                except KeyError:  # something went wrong with line parsing
-                    context.default_log.warn(
-                        'failed to find expected log variable "%s" in access '
-                        'log line, skipping' % key
-                    )
-                    context.default_log.debug('additional info:')
-                    context.default_log.debug(
-                        'keys: %s\nformat: "%s"\nline:"%s"' % (
-                            self.keys,
-                            self.raw_format,
-                            line
-                        )
-                    )
 
-                # time variables should be parsed to array of float
-                if key.endswith('_time'):
-                    time_var = True
-                    # skip empty vars
-                    if value not in ('', '-'):
-                        array_value = []
-                        for x in value.replace(' ', '').split(','):
-                            x = float(x)
-                            # workaround for an old nginx bug with time. ask lonerr@ for details
-                            if x > 10000000:
-                                continue
-                            else:
-                                array_value.append(x)
-                        if array_value:
-                            result[key] = array_value
-
-                # Handle comma separated keys
-                if key in self.comma_separated_keys:
-                    if ',' in value:
-                        list_value = value.replace(' ', '').split(',')  # remove spaces and split values into list
-                        result[key] = list_value
-                    else:
-                        result[key] = [value]
-
-                if key not in result and not time_var:
-                    result[key] = value
-        else:
-            context.default_log.debug(
-                'could not parse line "%s" with format "%s"' % (
-                    line, self.raw_format
-                )
-            )
-            return None
+            if kind is FIELD_VALUE:
+                result[key] = value
+            elif kind is FIELD_TIME:
+                # time variables should be parsed to array of float, skip empty vars
+                if value not in ('', '-'):
+                    array_value = [
+                        x for x in map(float, value.replace(' ', '').split(','))
+                        if x <= MAX_TIME_VALUE
+                    ]
+                    if array_value:
+                        result[key] = array_value
+            elif ',' in value:
+                # remove spaces and split values into list
+                result[key] = value.replace(' ', '').split(',')
+            else:
+                result[key] = [value]
 
         if 'request' in result:
             try:
@@ -36,12 +36,49 @@ error_re = {
 }
 
 
+# most lines with errors we count contain one of these
+PREFILTER_LITERALS = ('upstream', 'is buffered')
+
+REGEX_SPECIAL_CHARS = set('\\[](){}?*+|^$.')
+
+
+def compile_rules(rules):
+    """
+    Compiles error regexps into a cheap two step check: a line is a candidate
+    only if it contains one of the prefilter literals, and a regexp is tried
+    only if the line contains the longest literal part of it.
+
+    :param rules: {} of error - [] of compiled regexps (see error_re)
+    :return: (prefilter literals, [] of (error, literal, regexp))
+    """
+    prefilter = list(PREFILTER_LITERALS)
+    compiled = []
+
+    for error, regexps in rules.iteritems():
+        for regexp in regexps:
+            literals = [part for part in regexp.pattern.split('.*') if part]
+            if any(REGEX_SPECIAL_CHARS.intersection(part) for part in literals):
+                literals = []  # not a plain ".*literal.*" pattern, always try it
+            literal = max(literals, key=len) if literals else ''
+
+            # never skip a line that can match
+            if not any(word in part for part in literals for word in prefilter):
+                prefilter.append(literal)
+
+            compiled.append((error, literal, regexp))
+
+    return tuple(prefilter), compiled
+
+
 class NginxErrorLogParser(object):
     """
     Nginx error log parser
     """
     keys = []  # Included for compatibility with 0 counter handling.
 
+    def __init__(self):
+        self.prefilter, self.rules = compile_rules(error_re)
+
     def parse(self, line):
         """
         Parses the line to find any kind of errors and return it once any first is found
@@ -49,8 +86,13 @@ class NginxErrorLogParser(object):
         :param line: log line
         :return: str or None: error
         """
-        for error, regexps in error_re.iteritems():
-            for regexp in regexps:
-                if re.match(regexp, line):
-                    return error
+        for literal in self.prefilter:
+            if literal in line:
+                break
+        else:
+            return None
+
+        for error, literal, regexp in self.rules:
+            if literal in line and regexp.match(line):
+                return error
         return None
@@ -4,15 +4,19 @@ import time
 from amplify.agent.collectors.nginx.accesslog import NginxAccessLogsCollector
 from amplify.agent.collectors.nginx.config import NginxConfigCollector
 from amplify.agent.collectors.nginx.errorlog import NginxErrorLogsCollector
+from amplify.agent.collectors.nginx.logworkers import (
+    AmplifyLogWorkerError, LogWorkerTail, NginxAccessLogsWorkerCollector, log_workers_count
+)
 
 from amplify.agent.common.context import context
 from amplify.agent.common.util import http, net, plus
 from amplify.agent.data.eventd import INFO, WARNING
 from amplify.agent.objects.abstract import AbstractObject
 from amplify.agent.objects.nginx.binary import nginx_v
+from amplify.agent.objects.nginx.config.parser import iter_statements
 from amplify.agent.objects.nginx.filters import Filter
 from amplify.agent.pipelines.syslog import SyslogTail
-from amplify.agent.pipelines.file import FileTail
+from amplify.agent.pipelines.inotify import create_file_tail
 
 
 __author__ = "Mike Belov"
@@ -103,7 +107,7 @@ class NginxObject(AbstractObject):
         Searches main context for http and stream blocks and returns which ones were not found.
         """
         to_find = set(['http', 'stream'])
-        main_ctx = set(stmt['directive'] for stmt in self.config.subtree)
+        main_ctx = set(stmt['directive'] for stmt in iter_statements(self.config.tree))
         return list(to_find - main_ctx)
 
     def get_alive_stub_status_url(self):
@@ -254,16 +258,19 @@ class NginxObject(AbstractObject):
         try:
             if name.startswith('syslog'):
                 address_bucket = name.split(',', 1)[0]
-                host, port, address = net.ipv4_address(
-                    address=address_bucket.split('=')[1], full_format=True, silent=True
-                )
-                # Right now we assume AFNET address/port...e.g. no support for unix sockets
-
-                if address in context.listeners:
-                    port = int(port)  # socket requires integer port
-                    tail = SyslogTail(address=(host, port))
+                server = address_bucket.split('=', 1)[1]
+
+                if server.startswith('unix:'):
+                    # unix datagram socket, the address is a path
+                    if server in context.listeners:
+                        tail = SyslogTail(address=server[len('unix:'):])
+                else:
+                    host, port, address = net.ipv4_address(address=server, full_format=True, silent=True)
+                    if address in context.listeners:
+                        port = int(port)  # socket requires integer port
+                        tail = SyslogTail(address=(host, port), tcp=address in context.tcp_listeners)
             else:
-                tail = FileTail(name)
+                tail = create_file_tail(name)
         except Exception as e:
             context.log.error(
                 'failed to initialize pipeline for "%s" due to %s (maybe has no rights?)' % (name, e.__class__.__name__)
@@ -313,6 +320,25 @@ class NginxObject(AbstractObject):
         for log_description, log_data in self.config.access_logs.iteritems():
             format_name = log_data['log_format']
             log_format = self.config.log_formats.get(format_name)
+
+            # parse log files in worker processes if they are enabled
+            if log_workers_count() and not log_description.startswith('syslog'):
+                try:
+                    tail = LogWorkerTail(log_description, log_format, self)
+                except AmplifyLogWorkerError as e:
+                    context.log.error('failed to set up log worker for "%s" due to %s' % (log_description, e))
+                    context.log.debug('additional info:', exc_info=True)
+                else:
+                    self.collectors.append(
+                        NginxAccessLogsWorkerCollector(
+                            object=self,
+                            interval=self.intervals['logs'],
+                            tail=tail
+                        )
+                    )
+                    self.eventd.event(level=INFO, message='nginx access log %s found' % log_description)
+                    continue
+
             tail = self.__setup_pipeline(log_description)
 
             if tail:
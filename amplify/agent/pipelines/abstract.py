@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import time
 
 
 __author__ = "Grant Hulegaard"
@@ -28,6 +29,13 @@ class Pipeline(object):
     def next(self):
         return self.__next__()
 
+    def wait(self, timeout):
+        """
+        Blocks until there may be new data to read, but not longer than timeout.  Pipelines that can be notified
+        about new data should override this, by default it just sleeps.
+        """
+        time.sleep(timeout)
+
     # This is a Pipeline API requirement
     def stop(self):
         """As collectors stop, pipelines should too."""
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent offsets of tailed files.
+
+FileTail keeps offsets in memory only, so after an agent restart it used to
+seek to the end of every file and lose everything written while the agent
+was down.  CheckpointStore saves offsets to a small json file (configured by
+"checkpoint_file" in the [tail] section of the agent config) and FileTail
+continues from the saved offset on startup if the file is still the same.
+
+Every checkpoint holds device and inode of the file along with a fingerprint
+of the bytes right before the offset.  A checkpoint is only used if the file
+at the path still has the same device/inode, is not smaller than the offset
+and the fingerprint matches.  If the inode changed, the file was rotated
+while the agent was down and it is read from the beginning.
+"""
+import json
+import os
+import time
+import zlib
+
+from amplify.agent.common.context import context
+
+
+__author__ = "Mike Belov"
+__copyright__ = "Copyright (C) Nginx, Inc. All rights reserved."
+__license__ = ""
+__maintainer__ = "Mike Belov"
+__email__ = "dedm@nginx.com"
+
+
+CHECKPOINT_VERSION = 1
+
+# number of bytes before the offset used as a fingerprint
+FINGERPRINT_SIZE = 64
+
+
+def fingerprint(data):
+    """
+    :param data: str bytes right before the offset
+    :return: [] of length and crc32 of data
+    """
+    return [len(data), zlib.crc32(data) & 0xffffffff]
+
+
+class CheckpointStore(object):
+    """
+    Offsets of tailed files, flushed to disk not more often than every
+    "checkpoint_interval" seconds.  Writes are atomic (temporary file + rename),
+    so a crash never leaves a half-written checkpoint file.
+
+    Log worker processes keep their store read-only and pass checkpoints to
+    the agent process, so there's a single writer.
+    """
+
+    # checkpoints of files that weren't read for this long are dropped
+    max_age = 7 * 24 * 3600
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets configuration and checkpoints, they are loaded again on the next use
+        """
+        self.filename = None
+        self.interval = 10.0
+        self.checkpoints = {}
+        self.dirty = False
+        self.last_flush = 0
+        self.failed = False
+        self.writable = True
+        self._loaded = False
+
+    def _load(self):
+        """
+        Reads configuration and saved checkpoints on the first use
+        """
+        self._loaded = True
+
+        tail_config = context.app_config.get('tail', {})
+        self.filename = tail_config.get('checkpoint_file') or None
+        try:
+            self.interval = float(tail_config.get('checkpoint_interval') or self.interval)
+        except ValueError:
+            pass
+
+        if not self.filename or not os.path.exists(self.filename):
+            return
+
+        try:
+            with open(self.filename, 'r') as f:
+                data = json.load(f)
+            if data.get('version') == CHECKPOINT_VERSION:
+                self.checkpoints = data.get('files', {})
+        except (IOError, OSError, ValueError, AttributeError):
+            context.log.error('failed to read tail checkpoints from "%s"' % self.filename)
+            context.log.debug('additional info:', exc_info=True)
+
+    @property
+    def enabled(self):
+        if not self._loaded:
+            self._load()
+        return self.filename is not None
+
+    def restore(self, path, fd):
+        """
+        Returns saved offset of the file if it can be trusted
+
+        :param path: str path to file
+        :param fd: int file descriptor of an open file
+        :return: int offset or None
+        """
+        if not self.enabled:
+            return None
+
+        checkpoint = self.checkpoints.get(path)
+        if not checkpoint:
+            return None
+
+        try:
+            stat = os.fstat(fd)
+            if (stat.st_dev, stat.st_ino) != (checkpoint['dev'], checkpoint['ino']):
+                context.log.debug('"%s" was rotated since the last checkpoint, reading from the start' % path)
+                return 0
+
+            offset = checkpoint['offset']
+            if stat.st_size < offset:
+                context.log.debug('"%s" was truncated since the last checkpoint, reading from the start' % path)
+                return 0
+
+            length = checkpoint['fingerprint'][0]
+            os.lseek(fd, offset - length, os.SEEK_SET)
+            if fingerprint(os.read(fd, length)) != checkpoint['fingerprint']:
+                context.log.debug('"%s" does not match the last checkpoint, skipping it' % path)
+                return None
+        except (OSError, KeyError, IndexError, TypeError, ValueError):
+            context.log.debug('failed to restore checkpoint of "%s"' % path, exc_info=True)
+            return None
+
+        return offset
+
+    def update(self, path, stat, offset, data):
+        """
+        Saves a new offset of the file and flushes checkpoints if it's time to
+
+        :param path: str path to file
+        :param stat: os.stat_result of the file
+        :param offset: int offset
+        :param data: str up to FINGERPRINT_SIZE bytes right before the offset
+        """
+        if not self.enabled:
+            return
+
+        self.set(path, dict(
+            dev=stat.st_dev,
+            ino=stat.st_ino,
+            offset=offset,
+            fingerprint=fingerprint(data),
+            stamp=int(time.time())
+        ))
+
+    def get(self, path):
+        """
+        :param path: str path to file
+        :return: {} checkpoint of the file or None
+        """
+        return self.checkpoints.get(path) if self.enabled else None
+
+    def set(self, path, checkpoint):
+        """
+        Stores a checkpoint made elsewhere (e.g. in a log worker process)
+
+        :param path: str path to file
+        :param checkpoint: {} checkpoint
+        """
+        if not self.enabled:
+            return
+
+        self.checkpoints[path] = checkpoint
+        self.dirty = True
+        self.flush()
+
+    def flush(self, force=False):
+        """
+        Atomically writes checkpoints to disk
+
+        :param force: bool write even if checkpoint_interval hasn't passed yet
+        """
+        if not self.dirty or not self.writable or not self.enabled:
+            return
+
+        now = time.time()
+        if not force and now - self.last_flush < self.interval:
+            return
+
+        min_stamp = now - self.max_age
+        for path, checkpoint in self.checkpoints.items():
+            if checkpoint.get('stamp', 0) < min_stamp:
+                del self.checkpoints[path]
+
+        tmp_filename = '%s.tmp' % self.filename
+        try:
+            with open(tmp_filename, 'w') as f:
+                json.dump({'version': CHECKPOINT_VERSION, 'files': self.checkpoints}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.rename(tmp_filename, self.filename)
+        except (IOError, OSError):
+            # don't flood the log if the location is not writable
+            log_method = context.log.debug if self.failed else context.log.error
+            log_method('failed to write tail checkpoints to "%s"' % self.filename)
+            context.log.debug('additional info:', exc_info=True)
+            self.failed = True
+        else:
+            self.dirty = False
+            self.failed = False
+
+        self.last_flush = now
+
+
+CHECKPOINTS = CheckpointStore()
@@ -1,10 +1,11 @@
 # -*- coding: utf-8 -*-
+import os
 import time
-from os import stat
 
 from amplify.agent.common.context import context
 
 from amplify.agent.pipelines.abstract import Pipeline
+from amplify.agent.pipelines.checkpoint import CHECKPOINTS, FINGERPRINT_SIZE
 
 
 __author__ = "Mike Belov"
@@ -22,6 +23,13 @@ class FileTail(Pipeline):
     """
     Creates an iterable object that returns only unread lines.
 
+    Offsets are kept in OFFSET_CACHE between objects' reloads and in
+    CHECKPOINTS between agent restarts.
+
+    The file is read in large blocks which are split into lines in bulk.  A
+    partial line at the end of a block is carried over to the next block; a
+    partial line at the end of the file is left unread until it's complete.
+
     Based on some code of Pygtail
     pygtail - a python "port" of logtail2
     Copyright (C) 2011 Brad Greenlee <brad@footle.org>
@@ -29,16 +37,25 @@ class FileTail(Pipeline):
     https://raw.githubusercontent.com/bgreenlee/pygtail/master/pygtail/core.py
     """
 
+    block_size = 1024 * 1024  # 1MB
+
     def __init__(self, filename):
         super(FileTail, self).__init__(name='file:%s' % filename)
         self.filename = filename
-        self._fh = None
+        self._fd = None
+        self._fd_stat = None
+        self._lines = []
+        self._line_index = 0
+        self._partial = ''
 
-        # open a file and seek to the end
+        # open a file and continue from the last checkpoint or seek to the end
         if self.filename not in OFFSET_CACHE:
             with open(self.filename, "r") as f:
-                f.seek(0, 2)
-                self._offset = OFFSET_CACHE[self.filename] = f.tell()
+                offset = CHECKPOINTS.restore(self.filename, f.fileno())
+                if offset is None:
+                    f.seek(0, 2)
+                    offset = f.tell()
+                self._offset = OFFSET_CACHE[self.filename] = offset
         else:
             self._offset = OFFSET_CACHE[self.filename]
 
@@ -46,18 +63,17 @@ class FileTail(Pipeline):
         self._inode = self._st_ino()
 
     def __del__(self):
-        try:
-            if self._filehandle():
-                self._fh.close()
-        except StopIteration:
-            pass
+        self._close()
 
     def __iter__(self):
         self._filehandle()
         return self
 
+    def _stat(self):
+        return os.stat(self.filename)
+
     def _st_ino(self):
-        return stat(self.filename).st_ino
+        return self._stat().st_ino
 
     def _update_inode(self):
         self._inode = self._st_ino()
@@ -69,11 +85,11 @@ class FileTail(Pipeline):
         """
         # wait for new file
         tries = 0
-        new_inode = self._inode
+        new_stat = None
 
         while tries < 2:  # Try twice before moving on.
             try:
-                new_inode = self._st_ino()
+                new_stat = self._stat()
             except:
                 time.sleep(0.5)
                 tries += 1
@@ -88,30 +104,25 @@ class FileTail(Pipeline):
             raise StopIteration
 
         # check for copytruncate
-        # it will use the same file so inode will stay the same
-        file_truncated = False
-        if new_inode == self._inode and self.filename in OFFSET_CACHE:
-            with open(self.filename, 'r') as temp_fh:
-                temp_fh.seek(0, 2)
-                if temp_fh.tell() < OFFSET_CACHE[self.filename]:
-                    # this means the file is smaller than previously cached
-                    # so file must have been truncated
-                    file_truncated = True
-
-        if file_truncated:
-            return True
-        return new_inode != self._inode
+        # it will use the same file so inode will stay the same, but the file
+        # is smaller than previously cached
+        if new_stat.st_ino == self._inode:
+            return new_stat.st_size < OFFSET_CACHE.get(self.filename, 0)
+        return True
 
     def __next__(self):
         """
-        Return the next line in the file, updating the offset.
+        Return the next line in the file, reading a new block if all lines
+        of the current one were returned.
         """
-        try:
-            line = self._get_next_line()
-        except StopIteration:
-            # we've reached the end of the file;
-            self._update_offset()
-            raise
+        while self._line_index >= len(self._lines):
+            if not self._read_block():
+                # we've reached the end of the file
+                self._lines, self._line_index, self._partial = [], 0, ''
+                raise StopIteration
+
+        line = self._lines[self._line_index]
+        self._line_index += 1
         return line
 
     def readlines(self):
@@ -121,34 +132,66 @@ class FileTail(Pipeline):
         return [line for line in self]
 
     def _is_closed(self):
-        if not self._fh:
-            return True
-        return self._fh.closed
+        return self._fd is None
+
+    def _close(self):
+        if not self._is_closed():
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+            self._fd = None
+            self._fd_stat = None
 
     def _filehandle(self):
         """
-        Return a filehandle to the file being tailed, with the position set
-        to the current offset.
+        Return a file descriptor of the file being tailed, with the position
+        set to the current offset.  Rotation and truncation are checked here
+        once per iteration.
         """
         file_was_rotated = self._file_was_rotated()
 
-        if not self._fh or self._is_closed() or file_was_rotated:
-            if not self._is_closed():
-                self._fh.close()
+        if self._is_closed() or file_was_rotated:
+            self._close()
 
             if file_was_rotated:
                 self._update_inode()
                 self._offset = OFFSET_CACHE[self.filename] = 0
 
-            self._fh = open(self.filename, "r")
-            self._fh.seek(self._offset)
-        return self._fh
+            self._fd = os.open(self.filename, os.O_RDONLY)
+            self._fd_stat = os.fstat(self._fd)
+
+        os.lseek(self._fd, self._offset, os.SEEK_SET)
+        self._lines, self._line_index, self._partial = [], 0, ''
+        return self._fd
 
     def _update_offset(self):
-        self._offset = OFFSET_CACHE[self.filename] = self._filehandle().tell()
+        OFFSET_CACHE[self.filename] = self._offset
 
-    def _get_next_line(self):
-        line = self._fh.readline()
-        if not line:
-            raise StopIteration
-        return line.rstrip('\n\r')
+    def _read_block(self):
+        """
+        Reads the next block of the file and splits it into complete lines.
+        Offset is moved to the end of the last complete line.
+
+        :return: bool False if there is nothing more to read
+        """
+        block = os.read(self._fd, self.block_size)
+        if not block:
+            return False
+
+        if self._partial:
+            block = self._partial + block
+
+        lines = block.split('\n')
+        self._partial = lines.pop()
+        end = len(block) - len(self._partial)
+        self._offset += end
+        self._update_offset()
+        if end:
+            CHECKPOINTS.update(self.filename, self._fd_stat, self._offset, block[max(0, end - FINGERPRINT_SIZE):end])
+
+        if '\r' in block:
+            lines = [line.rstrip('\r') for line in lines]
+
+        self._lines, self._line_index = lines, 0
+        return True
@@ -0,0 +1,412 @@
+# -*- coding: utf-8 -*-
+"""
+inotify backed tailing of log files and watching of config directories.
+
+InotifyFileTail watches a log file and its parent directory and only touches
+the file when the kernel reported changes since the previous read.  It also
+lets collectors sleep until data arrives instead of polling on a fixed
+interval.  All tails share a single inotify instance.  When inotify is not
+available (not Linux, no libc, watch limit reached) create_file_tail() falls
+back to the regular polling FileTail.
+
+DirectoryWatcher tells if anything changed in a set of directories, so the
+nginx config collector doesn't have to re-read the whole config tree to
+find out that nothing did.
+"""
+import ctypes
+import ctypes.util
+import errno
+import os
+import struct
+import time
+import weakref
+
+from gevent import select
+
+from amplify.agent.common.context import context
+from amplify.agent.common.errors import AmplifyException
+from amplify.agent.pipelines.file import FileTail
+
+
+__author__ = "Mike Belov"
+__copyright__ = "Copyright (C) Nginx, Inc. All rights reserved."
+__license__ = ""
+__maintainer__ = "Mike Belov"
+__email__ = "dedm@nginx.com"
+
+
+# inotify event masks (see inotify(7))
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_MASK_ADD = 0x20000000
+
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+FILE_EVENTS = IN_MODIFY | IN_MOVE_SELF | IN_DELETE_SELF
+DIR_EVENTS = IN_CREATE | IN_MOVED_TO
+WATCHED_DIR_EVENTS = (
+    IN_MODIFY | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF |
+    IN_ONLYDIR
+)
+
+EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+
+
+class AmplifyInotifyError(AmplifyException):
+    description = "Couldn't set up inotify watches"
+
+
+_libc = None
+
+
+def _get_libc():
+    global _libc
+    if _libc is None:
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            libc.inotify_init1  # check that symbols exist
+            libc.inotify_add_watch
+            libc.inotify_rm_watch
+        except (OSError, AttributeError) as e:
+            raise AmplifyInotifyError(message='inotify is not supported (%s)' % e)
+        _libc = libc
+    return _libc
+
+
+class Inotify(object):
+    """
+    Minimal ctypes wrapper around inotify(7)
+    """
+
+    def __init__(self):
+        self.libc = _get_libc()
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise AmplifyInotifyError(message='inotify_init1 failed: %s' % os.strerror(ctypes.get_errno()))
+
+    def add_watch(self, path, mask):
+        wd = self.libc.inotify_add_watch(self.fd, path, mask)
+        if wd < 0:
+            raise AmplifyInotifyError(
+                message='failed to watch "%s": %s' % (path, os.strerror(ctypes.get_errno())),
+                payload=dict(path=path)
+            )
+        return wd
+
+    def rm_watch(self, wd):
+        self.libc.inotify_rm_watch(self.fd, wd)
+
+    def read_events(self):
+        """
+        Reads all pending events without blocking
+
+        :return: [] of (wd, mask, name) tuples
+        """
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
+
+            if not data:
+                break
+
+            position = 0
+            while position + EVENT_HEADER.size <= len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, position)
+                position += EVENT_HEADER.size
+                name = data[position:position + length].rstrip('\0')
+                position += length
+                events.append((wd, mask, name))
+        return events
+
+    def wait(self, timeout):
+        """
+        Blocks the current greenlet until there are pending events
+
+        :param timeout: float seconds
+        :return: bool True if there are events to read
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        return bool(readable)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class SharedInotify(object):
+    """
+    One inotify instance shared by all file tails.
+
+    Every inotify instance is a file descriptor counted against
+    fs.inotify.max_user_instances (128 by default), so tails don't get one
+    each.  Watches are reference counted by wd (the kernel returns the same
+    wd for the same inode, e.g. for the parent directory of several logs)
+    and events are dispatched to the tails that registered the wd.
+    """
+
+    def __init__(self):
+        self._inotify = Inotify()
+        self._tails = {}  # wd: WeakSet of tails
+
+    def add_watch(self, path, mask, tail):
+        # IN_MASK_ADD keeps masks of other tails watching the same inode
+        wd = self._inotify.add_watch(path, mask | IN_MASK_ADD)
+        self._tails.setdefault(wd, weakref.WeakSet()).add(tail)
+        return wd
+
+    def rm_watch(self, wd, tail):
+        tails = self._tails.get(wd)
+        if tails is None:
+            return
+
+        tails.discard(tail)
+        if not tails:
+            del self._tails[wd]
+            self._inotify.rm_watch(wd)
+
+    def dispatch(self):
+        """
+        Reads all pending events and passes them to the tails
+        """
+        for wd, mask, name in self._inotify.read_events():
+            if mask & IN_Q_OVERFLOW:
+                # events were lost, so everyone has to check their files
+                tails = set()
+                for wd_tails in self._tails.values():
+                    tails.update(wd_tails)
+            elif mask & IN_IGNORED:
+                # the watch is removed by the kernel
+                tails = self._tails.pop(wd, ())
+            else:
+                tails = self._tails.get(wd, ())
+
+            for tail in list(tails):
+                tail._handle_event(wd, mask, name)
+
+    def wait(self, timeout):
+        return self._inotify.wait(timeout)
+
+
+_shared_inotify = None
+
+
+def _get_shared_inotify():
+    global _shared_inotify
+    if _shared_inotify is None:
+        _shared_inotify = SharedInotify()
+    return _shared_inotify
+
+
+class InotifyFileTail(FileTail):
+    """
+    FileTail that reads the file only after inotify reported changes to it.
+
+    Rotation is noticed from IN_MOVE_SELF/IN_DELETE_SELF on the file and
+    IN_CREATE/IN_MOVED_TO of its name in the parent directory.  All tails
+    share one inotify instance (see SharedInotify).
+    """
+
+    # don't wake collectors more often than this even if data keeps coming
+    min_wait = 1.0
+
+    def __init__(self, filename):
+        self._inotify = None
+        self._dir_wd = None
+        self._file_wd = None
+        self._changed = True  # read whatever is there on the first iteration
+
+        super(InotifyFileTail, self).__init__(filename)
+
+        self._basename = os.path.basename(self.filename)
+        self._inotify = _get_shared_inotify()
+        try:
+            self._dir_wd = self._inotify.add_watch(
+                os.path.dirname(os.path.abspath(self.filename)), DIR_EVENTS, self
+            )
+            self._watch_file()
+        except:
+            self.stop()
+            raise
+
+    def __iter__(self):
+        self._read_events()
+
+        # nothing happened to the file since the last read
+        if not self._changed and not self._is_closed():
+            return iter(())
+
+        result = super(InotifyFileTail, self).__iter__()
+        self._changed = False
+        return result
+
+    def _watch_file(self):
+        if self._file_wd is not None:
+            self._inotify.rm_watch(self._file_wd, self)
+            self._file_wd = None
+        self._file_wd = self._inotify.add_watch(self.filename, FILE_EVENTS, self)
+
+    def _update_inode(self):
+        super(InotifyFileTail, self)._update_inode()
+        if self._inotify is not None:
+            self._watch_file()
+
+    def _read_events(self):
+        if self._inotify is None:
+            # stopped, so behave like a polling tail
+            self._changed = True
+            return
+
+        self._inotify.dispatch()
+
+    def _handle_event(self, wd, mask, name):
+        """
+        Called by SharedInotify for events of watches added by this tail
+        """
+        if mask & IN_IGNORED:
+            # the watch is gone, a new file watch will be added after reopening
+            if wd == self._file_wd:
+                self._file_wd = None
+            elif wd == self._dir_wd:
+                self._dir_wd = None
+            self._changed = True
+        elif wd == self._dir_wd:
+            if name == self._basename:
+                self._changed = True
+        else:
+            self._changed = True
+
+    def wait(self, timeout):
+        """
+        Sleeps until new data is written to the file, but not longer than
+        timeout and not shorter than min_wait
+        """
+        start = time.time()
+        time.sleep(min(self.min_wait, timeout))
+
+        while self._inotify is not None:
+            self._read_events()
+            remaining = timeout - (time.time() - start)
+            if self._changed or remaining <= 0:
+                break
+
+            # wakes up for events of other tails too, so check again
+            self._inotify.wait(remaining)
+
+    def __del__(self):
+        self.stop()
+        super(InotifyFileTail, self).__del__()
+
+    def stop(self):
+        if self._inotify is not None:
+            for wd in (self._dir_wd, self._file_wd):
+                if wd is not None:
+                    self._inotify.rm_watch(wd, self)
+            self._dir_wd = self._file_wd = None
+            self._inotify = None
+        super(InotifyFileTail, self).stop()
+
+
+class DirectoryWatcher(object):
+    """
+    Watches directories for any changes of them and of files in them
+    (content, attributes, creation, removal and renames).
+    """
+
+    def __init__(self):
+        self._inotify = None
+        self._watches = {}  # path: wd
+        self._paths = {}  # wd: set of paths (paths resolving to the same directory share a wd)
+        self._changed = True
+        self._inotify = Inotify()
+
+    def watch(self, paths):
+        """
+        Sets the watched directories.  Paths that don't exist or aren't
+        directories are skipped.
+
+        :param paths: set of str paths to directories
+        """
+        if self._inotify is None:
+            return
+
+        for path in set(self._watches) - paths:
+            wd = self._watches.pop(path)
+            wd_paths = self._paths[wd]
+            wd_paths.discard(path)
+
+            # the directory is still watched through another path (e.g. a symlink)
+            if not wd_paths:
+                del self._paths[wd]
+                self._inotify.rm_watch(wd)
+
+        for path in paths - set(self._watches):
+            if not os.path.isdir(path):
+                continue
+
+            wd = self._inotify.add_watch(path, WATCHED_DIR_EVENTS)
+            self._watches[path] = wd
+            self._paths.setdefault(wd, set()).add(path)
+
+            # whatever happened in the directory before the watch was added is unknown
+            self._changed = True
+
+    def changed(self):
+        """
+        :return: bool True if anything changed since the previous call (or if watcher is stopped)
+        """
+        if self._inotify is None:
+            return True
+
+        for wd, mask, _ in self._inotify.read_events():
+            if mask & IN_Q_OVERFLOW:
+                self._changed = True
+            elif wd in self._paths:
+                self._changed = True
+                if mask & IN_IGNORED:
+                    # the directory is gone, watch() will add it again if it comes back
+                    for path in self._paths.pop(wd):
+                        del self._watches[path]
+
+        changed, self._changed = self._changed, False
+        return changed
+
+    def __del__(self):
+        self.stop()
+
+    def stop(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+        self._watches = {}
+        self._paths = {}
+
+
+def create_file_tail(filename):
+    """
+    Returns inotify driven tail for the file if inotify can be used and
+    polling FileTail otherwise
+
+    :param filename: str path to file
+    :return: FileTail
+    """
+    try:
+        return InotifyFileTail(filename)
+    except AmplifyInotifyError as e:
+        context.log.warning('falling back to polling tail for "%s" due to %s' % (filename, e))
+        return FileTail(filename)
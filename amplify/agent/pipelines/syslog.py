@@ -5,11 +5,21 @@ inspiration for asyncore implementation derived from pymotw (https://pymotw.com/
 
 SyslogTail spawns coroutine which in turns spawns an asyncore implemented syslog server and handler/cache and returns
 the received messages when iterated.
+
+Messages are received as UDP datagrams or, if the address is a path, as unix socket datagrams
+(nginx "syslog:server=unix:/path").  Optionally the same UDP address also accepts syslog over TCP framed with
+octet-counting (RFC 6587) or newlines, for relays that need lossless delivery.
 """
 # -*- coding: utf-8 -*-
-import copy
 import asyncore
+import errno
+import grp
+import itertools
+import os
 import socket
+import stat
+import time
+import weakref
 from collections import deque
 
 from threading import current_thread
@@ -31,53 +41,396 @@ __email__ = "grant.hulegaard@nginx.com"
 
 SYSLOG_ADDRESSES = set()
 
+# buffers of all running syslog tails, for agent self-metrics
+SYSLOG_BUFFERS = weakref.WeakSet()
+
+# nginx syslog messages look like "<190>Jul 14 08:42:57 host amplify: <log line>"
+SYSLOG_TAG = 'amplify: '
+
+# permissions of unix syslog sockets, anyone who can write to the socket can inject log lines
+DEFAULT_SOCKET_MODE = 0o660
+
 
 class AmplifyAddresssAlreadyInUse(AmplifyException):
     description = "Couldn't start socket listener because address already in use"
 
 
-class SyslogServer(asyncore.dispatcher):
-    """Simple socket server that creates a socket and listens for and caches UDP packets"""
+class SyslogBuffer(object):
+    """
+    Ring buffer of received log records shared by a listener and a tail.
+
+    The listener appends records and the tail takes all of them at once with
+    swap(), which just replaces the underlying deque.  Everything runs in
+    greenlets of one thread, so no locking is needed.
+
+    If more records arrive between two swaps than the buffer holds, the
+    oldest ones are dropped.  Drops are counted, and on every swap the buffer
+    is resized to fit twice the number of records received since the previous
+    swap (i.e. arrival rate * drain interval), but not below the initial size
+    and not above max_memory bytes of records.
+    """
+
+    headroom = 2
+    sample_size = 100  # records used to estimate record size
+
+    def __init__(self, maxlen, max_memory=64 * 1024 * 1024):
+        self.maxlen = self.min_len = maxlen
+        self.max_memory = max_memory
+        self.records = deque(maxlen=maxlen)
+
+        self.received = 0  # since the last swap
+        self.stats = dict(received=0, dropped=0, processed=0)  # since the last pop_stats()
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index):
+        return self.records[index]
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def append(self, record):
+        self.received += 1
+        self.records.append(record)
+
+    def swap(self):
+        """
+        :return: deque of all records received since the previous swap
+        """
+        records = self.records
+        received, self.received = self.received, 0
+
+        self.stats['received'] += received
+        self.stats['dropped'] += received - len(records)
+        self.stats['processed'] += len(records)
+
+        self._resize(received, records)
+        self.records = deque(maxlen=self.maxlen)
+        return records
+
+    def _resize(self, received, records):
+        """
+        Adjusts buffer size to the number of records received since the previous swap
+
+        :param received: int number of received records
+        :param records: deque of records
+        """
+        if records:
+            sample = [len(record) for record in itertools.islice(records, self.sample_size)]
+            record_size = max(sum(sample) / len(sample), 1)
+            max_len = max(self.min_len, self.max_memory // record_size)
+        else:
+            max_len = self.maxlen
+
+        wanted = received * self.headroom
+        if wanted > self.maxlen:
+            maxlen = min(wanted, max_len)
+        elif wanted * 4 < self.maxlen:
+            maxlen = max(self.maxlen // 2, wanted, self.min_len)  # shrink gradually
+        else:
+            maxlen = self.maxlen
+
+        if maxlen != self.maxlen:
+            context.log.debug('syslog buffer resized from %s to %s records' % (self.maxlen, maxlen))
+            self.maxlen = maxlen
+
+    def pop_stats(self):
+        """
+        :return: {} of received, dropped and processed records since the previous call
+        """
+        stats = self.stats
+        self.stats = dict(received=0, dropped=0, processed=0)
+        return stats
+
+    def clear(self):
+        self.stats['dropped'] += len(self.records)
+        self.records.clear()
+
+
+def pop_syslog_stats():
+    """
+    Sums stats of all syslog buffers
+
+    :return: {} of received, dropped and processed records or None if there are no syslog tails
+    """
+    buffers = list(SYSLOG_BUFFERS)
+    if not buffers:
+        return None
+
+    total = dict(received=0, dropped=0, processed=0)
+    for syslog_buffer in buffers:
+        for name, value in syslog_buffer.pop_stats().iteritems():
+            total[name] += value
+    return total
+
+
+def syslog_record(message):
+    """
+    :param message: str syslog message
+    :return: str log record sent by nginx or None
+    """
+    # this implicitly relies on the nginx syslog format specifically
+    position = message.find(SYSLOG_TAG)
+    if position == -1:
+        return None
+    return message[position + len(SYSLOG_TAG):].rstrip()
+
 
-    def __init__(self, cache, address, chunk_size=8192):
+class SyslogServer(asyncore.dispatcher):
+    """
+    Simple socket server that creates a socket and listens for and caches UDP packets.
+    If address is a str, it's a path of a unix datagram socket.  The socket is
+    only writable by its owner and socket_group (set it to the group of nginx
+    workers).
+    """
+
+    # max number of datagrams read per read event, so other greenlets aren't starved
+    max_batch = 1024
+
+    def __init__(self, cache, address, chunk_size=8192, rcvbuf=None, socket_mode=DEFAULT_SOCKET_MODE,
+                 socket_group=None):
         # Explicitly passed shared cache object
         self.cache = cache
 
         # Custom constants
         self.chunk_size = chunk_size
 
+        # preallocated receive buffer
+        self.buffer = bytearray(chunk_size)
+        self.view = memoryview(self.buffer)
+
         # Old-style class super
         asyncore.dispatcher.__init__(self)
 
         # asyncore server init
-        self.create_socket(socket.AF_INET, socket.SOCK_DGRAM)  # asyncore socket wrapper
-        self.bind(address)  # bind afore wrapped socket to address
+        self.unix = isinstance(address, basestring)
+        if self.unix:
+            self.create_socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._remove_stale_socket(address)
+            self.bind(address)
+            self._set_permissions(address, socket_mode, socket_group)
+        else:
+            self.create_socket(socket.AF_INET, socket.SOCK_DGRAM)  # asyncore socket wrapper
+            self.bind(address)  # bind afore wrapped socket to address
+        if rcvbuf:
+            self.set_rcvbuf(rcvbuf)
         self.address = self.socket.getsockname()  # use socket api to retrieve address (address we actually bound to)
         SYSLOG_ADDRESSES.add(self.address)
         context.log.debug('syslog server binding to %s' % str(self.address))
 
-    def handle_read(self):
-        """Called when a read event happens on the socket"""
-        data = bytes.decode(self.recv(self.chunk_size).strip())
+    @staticmethod
+    def _set_permissions(path, mode, group=None):
+        """
+        :param path: str path to unix socket
+        :param mode: int permissions
+        :param group: str name of the group allowed to write to the socket (nginx workers run as another user)
+        """
+        if group:
+            try:
+                os.chown(path, -1, grp.getgrnam(group).gr_gid)
+            except (KeyError, OSError):
+                context.log.warning('failed to change group of syslog socket %s to "%s"' % (path, group))
+                context.log.debug('additional info:', exc_info=True)
+        os.chmod(path, mode)
+
+    @staticmethod
+    def _remove_stale_socket(path):
+        """
+        Removes a socket file left by a previous agent run
+        """
         try:
-            log_record = data.split('amplify: ', 1)[1]  # this implicitly relies on the nginx syslog format specifically
-            self.cache.append(log_record)
-        except Exception:
-            context.log.error('error handling syslog message (address:%s, message:"%s")' % (self.address, data))
+            if stat.S_ISSOCK(os.stat(path).st_mode):
+                os.unlink(path)
+        except OSError:
+            pass
+
+    def set_rcvbuf(self, size):
+        """
+        Enlarges kernel receive buffer of the socket to survive bursts between reads
+
+        :param size: int bytes (the kernel may cap it with net.core.rmem_max)
+        """
+        try:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, size)
+            actual = self.socket.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+            context.log.debug('syslog server receive buffer is %s bytes (requested %s)' % (actual, size))
+        except socket.error:
+            context.log.warning('failed to set receive buffer of syslog server to %s bytes' % size)
             context.log.debug('additional info:', exc_info=True)
 
+    def handle_read(self):
+        """
+        Called when a read event happens on the socket.  Reads all pending
+        datagrams (up to max_batch) into the preallocated buffer.
+        """
+        for _ in xrange(self.max_batch):
+            try:
+                size = self.socket.recv_into(self.buffer, self.chunk_size)
+            except socket.error as e:
+                if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
+
+            self.handle_datagram(size)
+
+    def handle_datagram(self, size):
+        """
+        Extracts the log record from a datagram in the receive buffer (same as syslog_record() without copying
+        the whole datagram)
+
+        :param size: int size of datagram
+        """
+        position = self.buffer.find(SYSLOG_TAG, 0, size)
+        if position == -1:
+            data = self.view[:size].tobytes()
+            context.log.error('error handling syslog message (address:%s, message:"%s")' % (self.address, data))
+            return
+
+        log_record = self.view[position + len(SYSLOG_TAG):size].tobytes().rstrip()
+        self.cache.append(log_record)
+
     def close(self):
         context.log.debug('syslog server closing')
         asyncore.dispatcher.close(self)
+        SYSLOG_ADDRESSES.discard(self.address)
+        if self.unix:
+            self._remove_stale_socket(self.address)
+
+
+class SyslogTCPServer(asyncore.dispatcher):
+    """Accepts TCP syslog connections and creates a handler for each of them"""
+
+    def __init__(self, cache, address):
+        self.cache = cache
+
+        asyncore.dispatcher.__init__(self)
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.set_reuse_addr()
+        self.bind(address)
+        self.listen(16)
+        self.address = self.socket.getsockname()
+        self.handlers = {}  # id - SyslogTCPHandler (dispatchers aren't hashable)
+        context.log.debug('syslog tcp server binding to %s' % str(self.address))
+
+    def handle_accept(self):
+        pair = self.accept()
+        if pair is not None:
+            sock, address = pair
+            handler = SyslogTCPHandler(self.cache, sock, server=self)
+            self.handlers[id(handler)] = handler
+
+    def handle_error(self):
+        context.log.error('syslog tcp server failed to accept a connection')
+        context.log.debug('additional info:', exc_info=True)
+
+    def close(self):
+        context.log.debug('syslog tcp server closing')
+        for handler in self.handlers.values():
+            handler.close()
+        asyncore.dispatcher.close(self)
+
+
+class SyslogTCPHandler(asyncore.dispatcher):
+    """
+    Reads syslog messages from a TCP connection.  Messages are framed either
+    with octet-counting ("<length> <message>") or with newlines.
+    """
+
+    # drop the connection if a single message doesn't fit into this
+    max_pending = 1024 * 1024
+
+    def __init__(self, cache, sock, chunk_size=65536, server=None):
+        asyncore.dispatcher.__init__(self, sock)
+        self.cache = cache
+        self.chunk_size = chunk_size
+        self.server = server
+        self.pending = ''
+
+    def writable(self):
+        return False
+
+    def handle_read(self):
+        data = self.recv(self.chunk_size)
+        if data:
+            self.pending += data
+            self.handle_messages()
+
+    def handle_messages(self):
+        """
+        Extracts all complete messages from the pending data
+        """
+        data, position = self.pending, 0
+
+        while position < len(data):
+            char = data[position]
+            if char in ' \r\n':
+                position += 1
+            elif char.isdigit():
+                space = data.find(' ', position)
+                if space == -1:
+                    break
+                try:
+                    end = space + 1 + int(data[position:space])
+                except ValueError:
+                    context.log.error('bad octet count in syslog tcp stream, closing connection')
+                    self.close()
+                    return
+                if end > len(data):
+                    break
+                self.handle_message(data[space + 1:end])
+                position = end
+            else:
+                newline = data.find('\n', position)
+                if newline == -1:
+                    break
+                self.handle_message(data[position:newline])
+                position = newline + 1
+
+        self.pending = data[position:]
+        if len(self.pending) > self.max_pending:
+            context.log.error('too long message in syslog tcp stream, closing connection')
+            self.close()
+
+    def handle_message(self, message):
+        log_record = syslog_record(message)
+        if log_record is None:
+            context.log.error('error handling syslog message (message:"%s")' % message)
+        else:
+            self.cache.append(log_record)
+
+    def handle_close(self):
+        self.close()
+
+    def close(self):
+        if self.server is not None:
+            self.server.handlers.pop(id(self), None)
+            self.server = None
+        asyncore.dispatcher.close(self)
+
+    def handle_error(self):
+        context.log.error('syslog tcp connection failed')
+        context.log.debug('additional info:', exc_info=True)
+        self.close()
 
 
 class SyslogListener(AbstractManager):
     """This is just a container to manage the SyslogServer listen/handle loop."""
     name = 'syslog_listener'
 
-    def __init__(self, cache, address, **kwargs):
+    def __init__(self, cache, address, rcvbuf=None, tcp=False, socket_mode=DEFAULT_SOCKET_MODE, socket_group=None,
+                 **kwargs):
         super(SyslogListener, self).__init__(**kwargs)
-        self.server = SyslogServer(cache, address)
+        self.server = SyslogServer(
+            cache, address, rcvbuf=rcvbuf, socket_mode=socket_mode, socket_group=socket_group
+        )
+        self.tcp_server = None
+        if tcp:
+            try:
+                self.tcp_server = SyslogTCPServer(cache, address)
+            except:
+                self.server.close()
+                raise
 
     def start(self):
         current_thread().name = self.name
@@ -94,17 +447,28 @@ class SyslogListener(AbstractManager):
 
     def stop(self):
         self.server.close()
+        if self.tcp_server is not None:
+            self.tcp_server.close()
         context.teardown_thread_id()
         super(SyslogListener, self).stop()
 
 
 class SyslogTail(Pipeline):
-    """Generalized Pipeline wrapper to provide a developer API for interacting with UDP listener."""
+    """Generalized Pipeline wrapper to provide a developer API for interacting with UDP/unix socket listener."""
     def __init__(self, address, maxlen=10000, **kwargs):
         super(SyslogTail, self).__init__(name='syslog:%s' % str(address))
         self.kwargs = kwargs  # only have to record this due to new listener fail-over logic
         self.maxlen = maxlen
-        self.cache = deque(maxlen=self.maxlen)
+
+        # buffer and socket tuning, see [listeners] in agent config
+        listeners_config = context.app_config.get('listeners', {})
+        max_memory = int(listeners_config.get('syslog_buffer_memory') or 64) * 1024 * 1024
+        self.kwargs.setdefault('rcvbuf', int(listeners_config.get('syslog_rcvbuf') or 0))
+        self.kwargs.setdefault('socket_mode', int(str(listeners_config.get('syslog_socket_mode') or '0660'), 8))
+        self.kwargs.setdefault('socket_group', listeners_config.get('syslog_socket_group') or None)
+
+        self.cache = SyslogBuffer(self.maxlen, max_memory=max_memory)
+        SYSLOG_BUFFERS.add(self.cache)
         self.address = address  # This stores the address that we were passed
         self.listener = None
         self.listener_setup_attempts = 0
@@ -150,9 +514,8 @@ class SyslogTail(Pipeline):
                     )
                     context.log.debug('additional info:', exc_info=True)
 
-        current_cache = copy.deepcopy(self.cache)
+        current_cache = self.cache.swap()
         context.log.debug('syslog tail returned %s lines captured from %s' % (len(current_cache), self.name))
-        self.cache.clear()
         return iter(current_cache)
 
     def _setup_listener(self, **kwargs):
@@ -167,17 +530,22 @@ class SyslogTail(Pipeline):
             )
 
         SYSLOG_ADDRESSES.add(self.address)
-        self.listener = SyslogListener(cache=self.cache, address=self.address, **kwargs)
+        try:
+            self.listener = SyslogListener(cache=self.cache, address=self.address, **kwargs)
+        except:
+            # binding failed (e.g. the tcp port is taken), so the address is free for the next attempt
+            SYSLOG_ADDRESSES.discard(self.address)
+            raise
         self.thread = spawn(self.listener.start)
 
     def stop(self):
         if self.running:
-            # Remove from used addresses
-            for address in set((self.address, self.listener.server.address)):
-                SYSLOG_ADDRESSES.remove(address)
+            # Remove from used addresses (the server discards the address it's bound to on close)
+            SYSLOG_ADDRESSES.discard(self.address)
 
-            self.listener.stop()  # Close the UDP server
-            self.thread.kill()  # Kill the greenlet
+            if self.listener is not None:
+                self.listener.stop()  # Close the UDP server
+                self.thread.kill()  # Kill the greenlet
 
             # Unassign variables to reduce reference count for GC
             self.listener = None
@@ -185,6 +553,7 @@ class SyslogTail(Pipeline):
 
             # For good measure clear the cache to free memory and set running variable manually to False
             self.cache.clear()
+            SYSLOG_BUFFERS.discard(self.cache)
             self.running = False
             context.log.debug('syslog tail stopped')
 
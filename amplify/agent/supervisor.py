@@ -16,6 +16,7 @@ from amplify.agent.common.util import loader
 from amplify.agent.common.util.threads import spawn
 from amplify.agent.common.util.system import get_root_definition
 from amplify.agent.managers.bridge import Bridge
+from amplify.agent.pipelines.checkpoint import CHECKPOINTS
 
 
 __author__ = "Mike Belov"
@@ -317,6 +318,9 @@ class Supervisor(object):
             object_manager = self.object_managers[object_manager_name]
             object_manager.stop()
 
+        # save offsets of tailed files
+        CHECKPOINTS.flush(force=True)
+
         # log agent stopped event
         context.log.info(
             'agent stopped, version=%s pid=%s uuid=%s' %
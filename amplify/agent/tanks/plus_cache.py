@@ -11,10 +11,64 @@ __maintainer__ = "Grant Hulegaard"
 __email__ = "grant.hulegaard@nginx.com"
 
 
+class ReadOnlyDict(dict):
+    """
+    dict that can't be changed after it's created
+    """
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('%s is read-only' % self.__class__.__name__)
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _read_only
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memodict=None):
+        return self
+
+
+class ReadOnlyList(list):
+    """
+    list that can't be changed after it's created
+    """
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('%s is read-only' % self.__class__.__name__)
+
+    __setitem__ = __delitem__ = __setslice__ = __delslice__ = __iadd__ = __imul__ = _read_only
+    append = extend = insert = pop = remove = reverse = sort = _read_only
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memodict=None):
+        return self
+
+
+def freeze(data):
+    """
+    Returns a read-only copy of decoded json (dicts and lists are replaced by ReadOnlyDict and ReadOnlyList)
+
+    :param data: decoded json
+    :return: read-only copy of data
+    """
+    if isinstance(data, dict):
+        return ReadOnlyDict((key, freeze(value)) for key, value in data.iteritems())
+    elif isinstance(data, list):
+        return ReadOnlyList(freeze(value) for value in data)
+    elif isinstance(data, tuple):
+        return tuple(freeze(value) for value in data)
+    return data
+
+
 class PlusCache(Singleton):
     """
     Cache object that accepts and maintains cached values of plus_status.  Key-value store where the keys are the plus
     status urls.
+
+    Payloads are frozen when they are put, so all collectors of a plus instance can read their parts of the same
+    payload without copying them.
     """
 
     def __init__(self):
@@ -34,12 +88,12 @@ class PlusCache(Singleton):
 
     def put(self, plus_url, data):
         """
-        Simple put method that appends data onto the specified deque.
+        Simple put method that appends a read-only copy of data onto the specified deque.
 
         :plus_url: Str Key
         :data: Tuple (Plus Status JSON, stamp)
         """
-        self.__getitem__(plus_url).append(data)
+        self.__getitem__(plus_url).append(freeze(data))
 
     def get_last(self, plus_url):
         if plus_url in self.caches and len(self.caches[plus_url]):
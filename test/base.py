@@ -62,8 +62,13 @@ class BaseTestCase(TestCase):
         HTTPClient.get = fake_get
         HTTPClient.post = fake_post
 
+        import amplify.agent.pipelines.checkpoint
         import amplify.agent.pipelines.file
         amplify.agent.pipelines.file.OFFSET_CACHE = {}
+        amplify.agent.pipelines.checkpoint.CHECKPOINTS.reset()  # forget config and checkpoints of previous tests
+
+        import amplify.agent.common.util.plus
+        amplify.agent.common.util.plus.API_URIS.clear()
 
     def teardown_method(self, method):
         pass
@@ -3,7 +3,9 @@ from collections import defaultdict
 
 from hamcrest import *
 
-from amplify.agent.collectors.nginx.accesslog import NginxAccessLogParser, NginxAccessLogsCollector
+from amplify.agent.collectors.nginx.accesslog import (
+    AccessLogBatch, NginxAccessLogParser, NginxAccessLogsCollector
+)
 from test.base import NginxCollectorTestCase
 from test.helpers import collected_metric
 
@@ -20,9 +22,9 @@ class LogsPerMethodTestCase(NginxCollectorTestCase):
         line = '127.0.0.1 - - [02/Jul/2015:14:49:48 +0000] "GET /basic_status HTTP/1.1" 200 110 "-" ' + \
                '"python-requests/2.2.1 CPython/2.7.6 Linux/3.13.0-48-generic"'
 
-        # run single method
+        # run single method for a batch of one line
         collector = NginxAccessLogsCollector(object=self.fake_object, tail=[])
-        collector.http_method(NginxAccessLogParser().parse(line))
+        collector.http_method(AccessLogBatch([NginxAccessLogParser().parse(line)]))
 
         # check
         metrics = self.fake_object.statsd.current
@@ -35,9 +37,9 @@ class LogsPerMethodTestCase(NginxCollectorTestCase):
         line = '127.0.0.1 - - [02/Jul/2015:14:49:48 +0000] "PROPFIND /basic_status HTTP/1.1" 200 110 "-" ' + \
                '"python-requests/2.2.1 CPython/2.7.6 Linux/3.13.0-48-generic"'
 
-        # run single method
+        # run single method for a batch of one line
         collector = NginxAccessLogsCollector(object=self.fake_object, tail=[])
-        collector.http_method(NginxAccessLogParser().parse(line))
+        collector.http_method(AccessLogBatch([NginxAccessLogParser().parse(line)]))
 
         # check
         metrics = self.fake_object.statsd.current
@@ -50,9 +52,9 @@ class LogsPerMethodTestCase(NginxCollectorTestCase):
         line = '127.0.0.1 - - [02/Jul/2015:14:49:48 +0000] "GET /basic_status HTTP/1.1" 200 110 "-" ' + \
                '"python-requests/2.2.1 CPython/2.7.6 Linux/3.13.0-48-generic"'
 
-        # run single method
+        # run single method for a batch of one line
         collector = NginxAccessLogsCollector(object=self.fake_object, tail=[])
-        collector.http_status(NginxAccessLogParser().parse(line))
+        collector.http_status(AccessLogBatch([NginxAccessLogParser().parse(line)]))
 
         # check
         metrics = self.fake_object.statsd.current
@@ -94,9 +96,9 @@ class LogsPerMethodTestCase(NginxCollectorTestCase):
             '1.2.3.4 - - [22/Jan/2010:19:34:21 +0300] "GET /foo/ HTTP/1.1" 200 11078 ' + \
             '"http://www.rambler.ru/" "Mozilla/5.0 (Windows; U; Windows NT 5.1" rt=0.010 ut="2.001, 0.345" cs=MISS'
 
-        # run single method
+        # run single method for a batch of one line
         collector = NginxAccessLogsCollector(object=self.fake_object, tail=[])
-        collector.upstreams(NginxAccessLogParser(log_format).parse(line))
+        collector.upstreams(AccessLogBatch([NginxAccessLogParser(log_format).parse(line)]))
 
         # check
         metrics = self.fake_object.statsd.current
@@ -126,9 +128,9 @@ class LogsPerMethodTestCase(NginxCollectorTestCase):
             '1.2.3.4 - - [22/Jan/2010:19:34:21 +0300] "GET /foo/ HTTP/1.1" 200 11078 ' + \
             '"http://www.rambler.ru/" "Mozilla/5.0 (Windows; U; Windows NT 5.1" rt=0.010 cs=- ut="-"'
 
-        # run single method
+        # run single method for a batch of one line
         collector = NginxAccessLogsCollector(object=self.fake_object, tail=[])
-        collector.upstreams(NginxAccessLogParser(log_format).parse(line))
+        collector.upstreams(AccessLogBatch([NginxAccessLogParser(log_format).parse(line)]))
 
         # check
         metrics = self.fake_object.statsd.current
@@ -151,9 +153,9 @@ class LogsPerMethodTestCase(NginxCollectorTestCase):
             '1.2.3.4 - - [22/Jan/2010:19:34:21 +0300] "GET /foo/ HTTP/1.1" 200 11078 ' + \
             '"http://www.rambler.ru/" "Mozilla/5.0 (Windows; U; Windows NT 5.1" rt=0.010 ut="-" cs=MISS'
 
-        # run single method
+        # run single method for a batch of one line
         collector = NginxAccessLogsCollector(object=self.fake_object, tail=[])
-        collector.upstreams(NginxAccessLogParser(log_format).parse(line))
+        collector.upstreams(AccessLogBatch([NginxAccessLogParser(log_format).parse(line)]))
 
         # check
         metrics = self.fake_object.statsd.current
@@ -181,9 +183,9 @@ class LogsPerMethodTestCase(NginxCollectorTestCase):
             '1.2.3.4 - - [22/Jan/2010:19:34:21 +0300] "GET /foo/ HTTP/1.1" 200 11078 ' + \
             '"http://www.rambler.ru/" "Mozilla/5.0 (Windows; U; Windows NT 5.1" rt=0.010 ut="2.001, 0.345" cs=-'
 
-        # run single method
+        # run single method for a batch of one line
         collector = NginxAccessLogsCollector(object=self.fake_object, tail=[])
-        collector.upstreams(NginxAccessLogParser(log_format).parse(line))
+        collector.upstreams(AccessLogBatch([NginxAccessLogParser(log_format).parse(line)]))
 
         # check
         metrics = self.fake_object.statsd.current
@@ -214,9 +216,9 @@ class LogsPerMethodTestCase(NginxCollectorTestCase):
             '"http://www.rambler.ru/" "Mozilla/5.0 (Windows; U; Windows NT 5.1" rt=0.010 ut="2.001, 0.345" cs=MISS ' + \
             'us=200 20'
 
-        # run single method
+        # run single method for a batch of one line
         collector = NginxAccessLogsCollector(object=self.fake_object, tail=[])
-        collector.upstreams(NginxAccessLogParser(log_format).parse(line))
+        collector.upstreams(AccessLogBatch([NginxAccessLogParser(log_format).parse(line)]))
 
         # check
         metrics = self.fake_object.statsd.current
@@ -258,9 +260,9 @@ class LogsPerMethodTestCase(NginxCollectorTestCase):
             '"http://www.rambler.ru/" "Mozilla/5.0 (Windows; U; Windows NT 5.1" rt=0.010 ut="2.001, 0.345" cs=MISS ' + \
             'us=300 40'
 
-        # run single method
+        # run single method for a batch of one line
         collector = NginxAccessLogsCollector(object=self.fake_object, tail=[])
-        collector.upstreams(NginxAccessLogParser(log_format).parse(line))
+        collector.upstreams(AccessLogBatch([NginxAccessLogParser(log_format).parse(line)]))
 
         # check
         metrics = self.fake_object.statsd.current
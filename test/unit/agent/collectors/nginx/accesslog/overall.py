@@ -834,3 +834,27 @@ class LogsOverallTestCase(NginxCollectorTestCase):
             elif counter_key is not None:
                 if counter_key not in collector.parser.request_variables:
                     assert_that(counter, not_(has_key('C|%s' % counter_name)))
+
+    def test_several_batches(self):
+        log_format = '$remote_addr "$request" $status $bytes_sent rt=$request_time'
+        lines = [
+            '10.0.0.1 "GET / HTTP/1.1" %s 10 rt=0.%03d' % ('200' if i % 2 else '404', i % 1000)
+            for i in xrange(2500)
+        ]
+        lines.append('10.0.0.1 "???" 400 10 rt=0.001')
+
+        collector = NginxAccessLogsCollector(object=self.fake_object, log_format=log_format, tail=lines)
+        collector.batch_size = 1000
+        collector.collect()
+
+        metrics = self.fake_object.statsd.flush()['metrics']
+        counter, timer = metrics['counter'], metrics['timer']
+
+        assert_that(counter['C|nginx.http.method.get'][0][1], equal_to(2500))
+        assert_that(counter['C|nginx.http.status.2xx'][0][1], equal_to(1250))
+        assert_that(counter['C|nginx.http.status.404'][0][1], equal_to(1250))
+        assert_that(counter['C|nginx.http.status.4xx'][0][1], equal_to(1250))
+        assert_that(counter['C|nginx.http.request.bytes_sent'][0][1], equal_to(25000))
+        assert_that(counter['C|nginx.http.request.malformed'][0][1], equal_to(1))
+        assert_that(timer['C|nginx.http.request.time.count'][0][1], equal_to(2500))
+        assert_that(timer['G|nginx.http.request.time.max'][0][1], equal_to(0.999))
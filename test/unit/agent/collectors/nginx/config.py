@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import os
 from copy import deepcopy
 
 from hamcrest import *
@@ -81,6 +82,40 @@ class ConfigCollectorTestCase(RealNginxTestCase):
         cfg_collector.collect(no_delay=True)
         assert_that(NginxConfig.__full_parse_calls, equal_to(2))
 
+    def test_skip_structure_walk_without_changes(self):
+        manager = NginxManager()
+        manager._discover_objects()
+
+        nginx_obj = manager.objects.objects[manager.objects.objects_by_type[manager.type][0]]
+        cfg_collector = nginx_obj.collectors[0]
+        config = nginx_obj.config
+
+        # count walks of the config structure
+        walks = []
+        original_collect_structure = config.collect_structure
+
+        def collect_structure(**kwargs):
+            walks.append(kwargs)
+            return original_collect_structure(**kwargs)
+
+        config.collect_structure = collect_structure
+
+        # the first walk sets up watches, the second one catches changes made while they were set up
+        cfg_collector.collect(no_delay=True)
+        cfg_collector.collect(no_delay=True)
+        assert_that(cfg_collector.watcher, not_none())
+        assert_that(walks, has_length(2))
+
+        # nothing changed
+        cfg_collector.collect(no_delay=True)
+        cfg_collector.collect(no_delay=True)
+        assert_that(walks, has_length(2))
+
+        # a config file changed
+        os.utime(config.filename, None)
+        cfg_collector.collect(no_delay=True)
+        assert_that(walks, has_length(3))
+
     def test_test_run_time(self):
         manager = NginxManager()
         manager._discover_objects()
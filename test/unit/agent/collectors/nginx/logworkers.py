@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+import os
+
+from hamcrest import *
+
+from amplify.agent.collectors.nginx import logworkers
+from amplify.agent.collectors.nginx.logworkers import (
+    LogWorker, LogWorkerTail, NginxAccessLogsWorkerCollector, get_log_worker
+)
+from amplify.agent.common.context import context
+from amplify.agent.common.util.sketch import QuantileSketch
+from amplify.agent.objects.nginx.filters import Filter
+from test.base import NginxCollectorTestCase
+
+__author__ = "Mike Belov"
+__copyright__ = "Copyright (C) Nginx, Inc. All rights reserved."
+__license__ = ""
+__maintainer__ = "Mike Belov"
+__email__ = "dedm@nginx.com"
+
+
+class LogWorkersTestCase(NginxCollectorTestCase):
+    test_log = 'log/worker.log'
+    log_format = '$remote_addr "$request" $status $body_bytes_sent rt=$request_time'
+
+    def setup_method(self, method):
+        super(LogWorkersTestCase, self).setup_method(method)
+        context.app_config['nginx'] = {'log_workers': '2'}
+        open(self.test_log, 'w').close()
+
+    def teardown_method(self, method):
+        for worker in logworkers.LOG_WORKERS:
+            worker.stop()
+        del logworkers.LOG_WORKERS[:]
+        context.app_config.config.pop('nginx', None)
+        if os.path.exists(self.test_log):
+            os.remove(self.test_log)
+        super(LogWorkersTestCase, self).teardown_method(method)
+
+    def write_log(self, lines):
+        with open(self.test_log, 'a') as f:
+            for line in lines:
+                f.write('%s\n' % line)
+
+    def test_pool(self):
+        first, second, third = get_log_worker(), get_log_worker(), get_log_worker()
+        assert_that(logworkers.LOG_WORKERS, has_length(2))
+        assert_that(first, is_not(same_instance(second)))
+        assert_that(third, same_instance(first))
+
+    def test_collect(self):
+        self.fake_object.filters = [
+            Filter(filter_rule_id=7, metric='nginx.http.status.4xx', data=[['$request_method', '~', 'POST']])
+        ]
+        tail = LogWorkerTail(self.test_log, self.log_format, self.fake_object)
+        collector = NginxAccessLogsWorkerCollector(object=self.fake_object, tail=tail)
+
+        self.write_log([
+            '10.0.0.1 "GET / HTTP/1.1" 200 100 rt=0.100',
+            '10.0.0.1 "POST / HTTP/1.1" 404 10 rt=0.200',
+            '10.0.0.1 "GET / HTTP/1.1" 200 100 rt=0.300',
+        ])
+        collector.collect()
+
+        current = self.fake_object.statsd.current
+        assert_that(current['timer']['nginx.http.request.time'], instance_of(QuantileSketch))
+
+        metrics = self.fake_object.statsd.flush()['metrics']
+        counter, timer = metrics['counter'], metrics['timer']
+        assert_that(counter['C|nginx.http.method.get'][0][1], equal_to(2))
+        assert_that(counter['C|nginx.http.status.4xx'][0][1], equal_to(1))
+        assert_that(counter['C|nginx.http.status.4xx||7'][0][1], equal_to(1))
+        assert_that(counter['C|nginx.http.request.body_bytes_sent'][0][1], equal_to(210))
+        assert_that(timer['C|nginx.http.request.time.count'][0][1], equal_to(3))
+        assert_that(timer['G|nginx.http.request.time.max'][0][1], equal_to(0.3))
+
+        # nothing new
+        collector.collect()
+        current = self.fake_object.statsd.current
+        assert_that(current['counter'], is_not(has_key('nginx.http.method.get')))
+        assert_that(current['counter']['nginx.http.status.4xx'][0][1], equal_to(0))
+
+        tail.stop()
+        assert_that(tail.worker, none())
+
+    def test_restart_dead_worker(self):
+        tail = LogWorkerTail(self.test_log, self.log_format, self.fake_object)
+        collector = NginxAccessLogsWorkerCollector(object=self.fake_object, tail=tail)
+
+        worker = tail.worker
+        worker.process.terminate()
+        worker.process.join()
+
+        # the tail is registered again in a new process
+        collector.collect()
+        self.write_log(['10.0.0.1 "GET / HTTP/1.1" 200 100 rt=0.100'])
+        collector.collect()
+
+        counter = self.fake_object.statsd.flush()['metrics']['counter']
+        assert_that(counter['C|nginx.http.method.get'][0][1], equal_to(1))
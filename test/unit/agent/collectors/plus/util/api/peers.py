@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+from hamcrest import *
+
+from test.base import BaseTestCase
+
+from amplify.agent.collectors.plus.util.api import http_upstream, stream_upstream
+from amplify.agent.collectors.plus.util.api.peers import column
+from amplify.agent.objects.plus.api import NginxApiHttpUpstreamObject, NginxApiStreamUpstreamObject
+
+__author__ = "Mike Belov"
+__copyright__ = "Copyright (C) Nginx, Inc. All rights reserved."
+__license__ = ""
+__maintainer__ = "Mike Belov"
+__email__ = "dedm@nginx.com"
+
+
+def http_peer(i, state='up'):
+    peer = {
+        "id": i,
+        "server": "10.0.0.%s:8080" % i,
+        "state": state,
+        "active": i % 3,
+        "requests": 100 * i,
+        "responses": {"1xx": 0, "2xx": 90 * i, "3xx": 5 * i, "4xx": 4 * i, "5xx": i, "total": 100 * i},
+        "sent": 1000 * i,
+        "received": 2000 * i,
+        "fails": i % 2,
+        "unavail": 0,
+        "health_checks": {"checks": 10 * i, "fails": i % 2, "unhealthy": 0, "last_passed": True},
+    }
+    if i % 2:
+        peer['header_time'] = 10 * i
+        peer['response_time'] = 15 * i
+    return peer
+
+
+def stream_peer(i, state='up'):
+    peer = {
+        "id": i,
+        "server": "10.0.0.%s:5432" % i,
+        "state": state,
+        "active": i % 3,
+        "connections": 10 * i,
+        "sent": 1000 * i,
+        "received": 2000 * i,
+        "fails": i % 2,
+        "unavail": 0,
+        "health_checks": {"checks": 10 * i, "fails": 0, "unhealthy": 0},
+        "downtime": 0,
+    }
+    if i % 2:
+        peer['max_conns'] = 100
+        peer['connect_time'] = 3 * i
+        peer['first_byte_time'] = 4 * i
+        peer['response_time'] = 5 * i
+    return peer
+
+
+class PeerColumnsTestCase(BaseTestCase):
+    def test_column(self):
+        peers = [{'a': 1, 'b': {'c': 2}}, {'a': 3, 'b': {}}, {}]
+        assert_that(column(peers, ('a',)), equal_to([1, 3]))
+        assert_that(column(peers, ('a',), 0), equal_to([1, 3, 0]))
+        assert_that(column(peers, ('b', 'c')), equal_to([2]))
+        assert_that(column(peers, ('b', 'c'), 0), equal_to([2, 0, 0]))
+
+    def check_same_as_index(self, obj_class, peers, columns, index):
+        """
+        Collects peers with the per peer functions and with PeerColumns and compares the results
+        """
+        expected = obj_class(local_name='backend', parent_local_id='nginx123', root_uuid='root123').collectors[-1]
+        for peer in peers:
+            for method in index:
+                method(expected, peer, 1)
+        expected.finalize_latest()
+
+        collector = obj_class(local_name='backend', parent_local_id='nginx123', root_uuid='root123').collectors[-1]
+        columns.collect(collector, peers, 1)
+        collector.finalize_latest()
+
+        assert_that(collector.current_counters, equal_to(expected.current_counters))
+        assert_that(collector.object.statsd.current, equal_to(expected.object.statsd.current))
+
+    def test_http_upstream(self):
+        peers = [http_peer(i) for i in xrange(1, 8)] + [http_peer(8, state='down')]
+        self.check_same_as_index(
+            NginxApiHttpUpstreamObject,
+            peers,
+            http_upstream.UPSTREAM_PEER_COLUMNS,
+            http_upstream.UPSTREAM_PEER_COLLECT_INDEX
+        )
+
+    def test_stream_upstream(self):
+        peers = [stream_peer(i) for i in xrange(1, 8)] + [stream_peer(8, state='unhealthy')]
+        self.check_same_as_index(
+            NginxApiStreamUpstreamObject,
+            peers,
+            stream_upstream.STREAM_UPSTREAM_PEER_COLUMNS,
+            stream_upstream.STREAM_UPSTREAM_PEER_COLLECT_INDEX
+        )
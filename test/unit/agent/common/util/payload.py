@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+import os
+import random
+import ujson
+import zlib
+
+from hamcrest import *
+
+from amplify.agent.common.util.payload import Payload, adler32_combine
+from test.base import BaseTestCase
+
+__author__ = "Mike Belov"
+__copyright__ = "Copyright (C) Nginx, Inc. All rights reserved."
+__license__ = ""
+__maintainer__ = "Mike Belov"
+__email__ = "dedm@nginx.com"
+
+
+class PayloadTestCase(BaseTestCase):
+    def test_adler32_combine(self):
+        for _ in xrange(20):
+            first = os.urandom(random.randint(0, 200000))
+            second = os.urandom(random.randint(0, 70000))
+            combined = adler32_combine(zlib.adler32(first) & 0xffffffff, zlib.adler32(second) & 0xffffffff, len(second))
+            assert_that(combined, equal_to(zlib.adler32(first + second) & 0xffffffff))
+
+    def test_body(self):
+        payload = Payload(level=6)
+        entries = [{'object': {'type': 'nginx'}, 'metrics': {'counter': {'C|nginx.http.request.count': [[1, i]]}}}
+                   for i in xrange(3)]
+        for entry in entries:
+            payload.append('metrics', entry)
+        payload.append('meta', {'object': {'type': 'system'}})
+
+        expected = {'meta': [{'object': {'type': 'system'}}], 'metrics': entries, 'events': [], 'configs': []}
+        assert_that(ujson.decode(zlib.decompress(payload.body())), equal_to(expected))
+
+        # the body is assembled from the same segments every time
+        assert_that(payload.body(), equal_to(payload.body()))
+
+    def test_empty_body(self):
+        payload = Payload(level=6)
+        expected = {'meta': [], 'metrics': [], 'events': [], 'configs': []}
+        assert_that(ujson.decode(zlib.decompress(payload.body())), equal_to(expected))
+
+    def test_uncompressed(self):
+        payload = Payload(level=0)
+        payload.append('events', {'message': 'something'})
+        assert_that(ujson.decode(payload.body())['events'], equal_to([{'message': 'something'}]))
+
+    def test_maxlen(self):
+        payload = Payload(maxlen=2, level=6)
+        for i in xrange(5):
+            payload.append('metrics', {'i': i})
+        assert_that(payload['metrics'], has_length(2))
+        assert_that(ujson.decode(zlib.decompress(payload.body()))['metrics'], equal_to([{'i': 3}, {'i': 4}]))
+
+    def test_metric_names(self):
+        payload = Payload(level=6, metric_names=True)
+        payload.append('metrics', {
+            'object': {'type': 'nginx'},
+            'metrics': {'counter': {'C|nginx.http.request.count': [[1, 5]]}},
+            'children': [
+                {'object': {'type': 'upstream'}, 'metrics': {'counter': {'C|nginx.http.request.count': [[1, 2]],
+                                                                         'C|plus.upstream.fails.count': [[1, 0]]}}}
+            ]
+        })
+        payload.append('meta', {'object': {'type': 'system'}})
+
+        body = ujson.decode(zlib.decompress(payload.body()))
+        names = body['metric_names']
+        assert_that(names, has_length(2))
+        assert_that(names['0'], equal_to('C|nginx.http.request.count'))
+
+        # names are resolved back to the original entries
+        entry = body['metrics'][0]
+        assert_that(entry['metrics']['counter'], equal_to({'0': [[1, 5]]}))
+        child = entry['children'][0]['metrics']['counter']
+        decoded = dict((names[metric_id], points) for metric_id, points in child.iteritems())
+        assert_that(decoded, equal_to({'C|nginx.http.request.count': [[1, 2]], 'C|plus.upstream.fails.count': [[1, 0]]}))
+        assert_that(body['meta'], equal_to([{'object': {'type': 'system'}}]))
@@ -1,8 +1,10 @@
 # -*- coding: utf-8 -*-
 from amplify.agent.common.util.plus import traverse_plus_api, get_latest_supported_api
+from amplify.agent.common.context import context
 from amplify.agent.common.util import plus
+from amplify.agent.managers.api import ApiManager
 from hamcrest import *
-from test.base import RealNginxTestCase, nginx_plus_test
+from test.base import BaseTestCase, RealNginxTestCase, nginx_plus_test
 import time
 
 __author__ = "Raymond Lau"
@@ -46,7 +48,7 @@ class PlusTestCase(RealNginxTestCase):
     def test_traverse_plus_api(self):
         time.sleep(1)  # Give N+ some time to start
 
-        combined_api_payload = traverse_plus_api("https://127.0.0.1:443/api")
+        combined_api_payload = traverse_plus_api("https://127.0.0.1:443/api", endpoints=None)
 
         assert_that(combined_api_payload, has_key('nginx'))
         assert_that(combined_api_payload, has_key('processes'))
@@ -77,4 +79,78 @@ class PlusTestCase(RealNginxTestCase):
         assert_that(combined_api_payload, has_key('stream'))
 
         assert_that(combined_api_payload['http'], not_(equal_to({})))
-        assert_that(combined_api_payload['stream'], equal_to({}))
\ No newline at end of file
+        assert_that(combined_api_payload['stream'], equal_to({}))
+
+class PlusTraverseTestCase(BaseTestCase):
+    api = {
+        'https://127.0.0.1/api': [2],
+        'https://127.0.0.1/api/2': ['nginx', 'http', 'stream'],
+        'https://127.0.0.1/api/2/nginx': {'version': '1.13.4'},
+        'https://127.0.0.1/api/2/http': ['requests', 'upstreams', 'keyvals'],
+        'https://127.0.0.1/api/2/http/requests': {'total': 10},
+        'https://127.0.0.1/api/2/http/upstreams': {'backend': {}},
+        'https://127.0.0.1/api/2/http/upstreams?fields=peers': {'backend': {'peers': []}},
+        'https://127.0.0.1/api/2/http/keyvals': {'zone': {'key': 'value'}},
+        'https://127.0.0.1/api/2/stream': ['server_zones'],
+        'https://127.0.0.1/api/2/stream/server_zones': {},
+    }
+
+    def setup_method(self, method):
+        super(PlusTraverseTestCase, self).setup_method(method)
+        self.requested = []
+        self.failing = set()
+        self.original_get = context.http_client.get
+
+        def fake_get(url, *args, **kwargs):
+            self.requested.append(url)
+            if url in self.failing:
+                raise IOError('connection refused')
+            return self.api[url] if url in self.api else self.api[url.split('?')[0]]
+
+        context.http_client.get = fake_get
+
+    def teardown_method(self, method):
+        context.http_client.get = self.original_get
+        super(PlusTraverseTestCase, self).teardown_method(method)
+
+    def test_traverse(self):
+        combined_api_payload = traverse_plus_api(
+            'https://127.0.0.1/api', root_endpoints_to_skip=['stream'], endpoints=None
+        )
+        assert_that(combined_api_payload, equal_to({
+            'nginx': {'version': '1.13.4'},
+            'http': {'requests': {'total': 10}, 'upstreams': {'backend': {}}, 'keyvals': {'zone': {'key': 'value'}}},
+            'stream': {}
+        }))
+
+    def test_traverse_selected_endpoints(self):
+        endpoints = {('http', 'requests'): None, ('http', 'upstreams'): 'peers', ('stream', 'upstreams'): None}
+        combined_api_payload = traverse_plus_api('https://127.0.0.1/api', endpoints=endpoints)
+        assert_that(combined_api_payload, equal_to({
+            'http': {'requests': {'total': 10}, 'upstreams': {'backend': {'peers': []}}},
+            'stream': {}
+        }))
+
+        # unknown endpoints aren't even requested
+        assert_that(self.requested, not_(has_item('https://127.0.0.1/api/2/nginx')))
+        assert_that(self.requested, not_(has_item('https://127.0.0.1/api/2/http/keyvals')))
+        assert_that(self.requested, not_(has_item('https://127.0.0.1/api/2/stream/server_zones')))
+
+    def test_api_endpoints_cover_api_objects(self):
+        for path in ApiManager.api_object_map:
+            assert_that(plus.API_ENDPOINTS, has_key(path))
+
+    def test_api_version_cached_until_error(self):
+        traverse_plus_api('https://127.0.0.1/api')
+        traverse_plus_api('https://127.0.0.1/api')
+        assert_that(self.requested.count('https://127.0.0.1/api'), equal_to(1))
+
+        # a failed endpoint makes the next traverse resolve the version again
+        self.failing.add('https://127.0.0.1/api/2/http/requests')
+        combined_api_payload = traverse_plus_api('https://127.0.0.1/api')
+        assert_that(combined_api_payload['http']['requests'], equal_to({}))
+        assert_that(combined_api_payload['http']['upstreams'], equal_to({'backend': {}}))
+
+        self.failing.clear()
+        traverse_plus_api('https://127.0.0.1/api')
+        assert_that(self.requested.count('https://127.0.0.1/api'), equal_to(2))
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import random
+
+from hamcrest import *
+
+from test.base import BaseTestCase
+
+from amplify.agent.common.util.sketch import QuantileSketch
+
+
+__author__ = "Mike Belov"
+__copyright__ = "Copyright (C) Nginx, Inc. All rights reserved."
+__license__ = ""
+__maintainer__ = "Mike Belov"
+__email__ = "dedm@nginx.com"
+
+
+class QuantileSketchTestCase(BaseTestCase):
+    def test_exact_aggregates(self):
+        sketch = QuantileSketch([0.5, 0.0, 2.0, 1.5])
+        assert_that(len(sketch), equal_to(4))
+        assert_that(sketch.sum, equal_to(4.0))
+        assert_that(sketch.value_at(0), equal_to(0.0))
+        assert_that(sketch.value_at(-1), equal_to(2.0))
+        assert_that(sketch.zero_count, equal_to(1))
+
+    def test_relative_accuracy(self):
+        random.seed(42)
+        values = [random.expovariate(10.0) for _ in xrange(10000)]
+        sketch = QuantileSketch(values, accuracy=0.01)
+        values.sort()
+
+        for rank in (1, 100, 5000, 9499, 9900, 9998):
+            assert_that(sketch.value_at(rank), close_to(values[rank], values[rank] * 0.01))
+
+        # memory doesn't depend on number of samples
+        assert_that(len(sketch.buckets), less_than(1000))
+
+    def test_merge(self):
+        first = QuantileSketch([0.1, 0.2, 0.3])
+        second = QuantileSketch([0.4, 0.5])
+        first.merge(second)
+
+        assert_that(len(first), equal_to(5))
+        assert_that(first.sum, close_to(1.5, 0.0001))
+        assert_that(first.value_at(2), close_to(0.3, 0.003))
+        assert_that(first.value_at(-1), equal_to(0.5))
+
+        assert_that(calling(first.merge).with_args(QuantileSketch(accuracy=0.05)), raises(ValueError))
+
+    def test_max_buckets(self):
+        sketch = QuantileSketch([10 ** x for x in xrange(-5, 5)], max_buckets=4)
+        assert_that(len(sketch.buckets), equal_to(4))
+        assert_that(len(sketch), equal_to(10))
+        assert_that(sketch.value_at(-2), close_to(1000, 10))
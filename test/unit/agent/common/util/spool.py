@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+
+from hamcrest import *
+
+from amplify.agent.common.util.spool import Spool
+from test.base import BaseTestCase
+
+__author__ = "Mike Belov"
+__copyright__ = "Copyright (C) Nginx, Inc. All rights reserved."
+__license__ = ""
+__maintainer__ = "Mike Belov"
+__email__ = "dedm@nginx.com"
+
+
+class SpoolTestCase(BaseTestCase):
+    spool_dir = 'log/spool'
+
+    def teardown_method(self, method):
+        shutil.rmtree(self.spool_dir, ignore_errors=True)
+        super(SpoolTestCase, self).teardown_method(method)
+
+    def read_all(self, spool):
+        records = []
+        while spool.peek() is not None:
+            records.append(spool.peek())
+            spool.pop()
+        return records
+
+    def test_order(self):
+        spool = Spool(self.spool_dir, segment_size=100)
+        records = ['record %s' % i * 10 for i in xrange(10)]
+        for record in records:
+            spool.append(record)
+
+        assert_that(len(spool), greater_than(1))
+        assert_that(self.read_all(spool), equal_to(records))
+        assert_that(os.listdir(self.spool_dir), has_length(0))
+
+    def test_reopen(self):
+        spool = Spool(self.spool_dir)
+        spool.append('first')
+        spool.append('second')
+        assert_that(spool.peek(), equal_to('first'))
+        spool.pop()
+
+        # popped records are kept on disk until the segment is read through, but not read again
+        spool = Spool(self.spool_dir)
+        spool.append('third')
+        assert_that(self.read_all(spool), equal_to(['second', 'third']))
+        assert_that(Spool(self.spool_dir).peek(), none())
+
+    def test_eviction(self):
+        spool = Spool(self.spool_dir, max_size=250, segment_size=100)
+        for i in xrange(10):
+            spool.append('%02d' % i * 30)
+
+        assert_that(spool.size(), less_than_or_equal_to(250))
+        records = self.read_all(spool)
+        assert_that(records[-1], equal_to('09' * 30))
+        assert_that(records[0], is_not(equal_to('00' * 30)))
+
+    def test_broken_tail(self):
+        spool = Spool(self.spool_dir)
+        spool.append('first')
+        with open(os.path.join(self.spool_dir, spool.segments[0]), 'ab') as f:
+            f.write('\x00\x00\x01')  # half written header
+
+        spool.append('second')  # goes to the same segment after the broken record
+        assert_that(self.read_all(spool), equal_to(['first']))
@@ -59,3 +59,60 @@ class SSLAnalysisTestCase(BaseTestCase):
         assert_that(results['state'], equal_to('FakeState'))
         assert_that(results['country'], equal_to('RU'))
         assert_that(results['unit'], equal_to('IT'))
+
+    def test_same_as_openssl(self):
+        for filename in (
+            'test/fixtures/nginx/ssl/simple/certs.d/example.com.crt',
+            'test/fixtures/nginx/ssl/idn/idn_cert.pem',
+            'test/fixtures/nginx/ssl/x509/ec.pem'
+        ):
+            results = ssl.certificate_analysis(open(filename).read())
+            expected = ssl.openssl_analysis(filename)
+
+            # openssl output of the issuer doesn't match ssl_regexs any more
+            del results['issuer'], expected['issuer']
+            expected['length'] = int(expected['length'])
+            assert_that(results, equal_to(expected))
+
+    def test_cache(self):
+        filename = 'test/fixtures/nginx/ssl/x509/server.pem'
+        cache = ssl.CertificateCache()
+
+        analyzed = []
+        original_certificate_analysis = ssl.certificate_analysis
+
+        def certificate_analysis(data):
+            analyzed.append(data)
+            return original_certificate_analysis(data)
+
+        ssl.certificate_analysis = certificate_analysis
+        try:
+            results = ssl.ssl_analysis(filename, cache=cache)
+            assert_that(ssl.ssl_analysis(filename, cache=cache), equal_to(results))
+        finally:
+            ssl.certificate_analysis = original_certificate_analysis
+
+        assert_that(analyzed, has_length(1))
+        assert_that(results, has_key('modified'))
+        assert_that(results['names'], equal_to(['a.example.com', '*.example.com', 'host2.example.com']))
+
+        cache.prune()
+        assert_that(cache.entries, has_length(1))
+        cache.prune()
+        assert_that(cache.entries, empty())
+
+    def test_openssl_fallback(self):
+        filename = 'test/fixtures/nginx/ssl/simple/certs.d/example.com.crt'
+        original_load_certificate = ssl.load_certificate
+
+        def load_certificate(data):
+            raise ValueError()
+
+        ssl.load_certificate = load_certificate
+        try:
+            results = ssl.ssl_analysis(filename)
+        finally:
+            ssl.load_certificate = original_load_certificate
+
+        assert_that(results['subject']['common_name'], equal_to('amplify'))
+        assert_that(results['length'], equal_to(4096))
@@ -4,7 +4,7 @@ from hamcrest import *
 from test.base import BaseTestCase
 
 from amplify.agent.common.util.text import (
-    decompose_format, parse_line, parse_line_split
+    decompose_format, parse_line, parse_line_split, split_line_values
 )
 
 
@@ -99,6 +99,23 @@ class UtilTextTestCase(BaseTestCase):
             'python-requests/2.2.1 CPython/2.7.6 Linux/3.13.0-48-generic'
         ))
 
+    def test_split_line_values(self):
+        keys, _, non_key_patterns, first_value_is_key = decompose_format(COMBINED_FORMAT, full=True)
+        line = '127.0.0.1 - - [02/Jul/2015:14:49:48 +0000] "GET /basic_status HTTP/1.1" 200 110 "-" ' + \
+               '"python-requests/2.2.1 CPython/2.7.6 Linux/3.13.0-48-generic"'
+
+        values = split_line_values(
+            line,
+            non_key_patterns=non_key_patterns,
+            first_value_is_key=first_value_is_key,
+            keys_count=len(keys)
+        )
+        assert_that(values, has_length(len(keys)))
+        assert_that(values, contains(
+            '127.0.0.1', '-', '02/Jul/2015:14:49:48 +0000', 'GET /basic_status HTTP/1.1', '200', '110', '-',
+            'python-requests/2.2.1 CPython/2.7.6 Linux/3.13.0-48-generic'
+        ))
+
     def test_parse_line_non_standard_http_method(self):
         keys, trie = decompose_format(COMBINED_FORMAT)
         line = '127.0.0.1 - - [02/Jul/2015:14:49:48 +0000] "PROPFIND /basic_status HTTP/1.1" 200 110 "-" ' + \
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+from hamcrest import *
+
+from amplify.agent.common.errors import AmplifyParseException
+from amplify.agent.common.util.x509 import DER_GENERALIZED_TIME, DER_UTC_TIME, der_time, load_certificate
+from test.base import BaseTestCase
+
+__author__ = "Grant Hulegaard"
+__copyright__ = "Copyright (C) Nginx, Inc. All rights reserved."
+__license__ = ""
+__maintainer__ = "Grant Hulegaard"
+__email__ = "grant.hulegaard@nginx.com"
+
+
+class X509CertificateTestCase(BaseTestCase):
+
+    def test_pem(self):
+        cert = load_certificate(open('test/fixtures/nginx/ssl/x509/server.pem').read())
+
+        assert_that(cert.version, equal_to(3))
+        assert_that(cert.subject, equal_to({
+            'country': 'US',
+            'state': 'CA',
+            'location': 'SF',
+            'organization': 'Org, Inc.',
+            'unit': 'Unit',
+            'common_name': 'host2.example.com'
+        }))
+        assert_that(cert.issuer, equal_to(cert.subject))
+        assert_that(cert.names, equal_to(['a.example.com', '*.example.com']))
+        assert_that(cert.ocsp_uri, equal_to('http://ocsp.example.com'))
+        assert_that(cert.public_key_algorithm, equal_to('rsaEncryption'))
+        assert_that(cert.signature_algorithm, equal_to('sha256WithRSAEncryption'))
+        assert_that(cert.length, equal_to(2048))
+
+        purpose = cert.purpose
+        assert_that(purpose, has_length(18))
+        assert_that(purpose, has_entries({
+            'SSL server': 'Yes',
+            'SSL server CA': 'No',
+            'Any Purpose CA': 'Yes',
+            'Time Stamp signing': 'No'
+        }))
+
+    def test_ec(self):
+        cert = load_certificate(open('test/fixtures/nginx/ssl/x509/ec.pem').read())
+        assert_that(cert.public_key_algorithm, equal_to('id-ecPublicKey'))
+        assert_that(cert.signature_algorithm, equal_to('ecdsa-with-SHA256'))
+        assert_that(cert.length, equal_to(256))
+        assert_that(cert.names, empty())
+        assert_that(cert.ocsp_uri, none())
+
+    def test_der(self):
+        cert = load_certificate(open('test/fixtures/nginx/ssl/x509/ca.der', 'rb').read())
+        assert_that(cert.subject['common_name'], equal_to('host1.example.com'))
+        assert_that(cert.purpose, has_entries({
+            'SSL server': 'No',
+            'SSL server CA': 'Yes',
+            'CRL signing': 'Yes',
+            'CRL signing CA': 'Yes'
+        }))
+
+    def test_v1_root(self):
+        cert = load_certificate(open('test/fixtures/nginx/ssl/simple/certs.d/example.com.crt').read())
+        assert_that(cert.version, equal_to(1))
+        assert_that(cert.purpose, has_entries({
+            'SSL client CA': 'Yes',
+            'CRL signing CA': 'Yes (WARNING code=3)'
+        }))
+
+    def test_broken(self):
+        assert_that(calling(load_certificate).with_args('not a certificate'), raises(AmplifyParseException))
+
+    def test_broken_time(self):
+        utc_time = der_time(DER_UTC_TIME, '170101000000Z')
+        assert_that(utc_time, equal_to(der_time(DER_GENERALIZED_TIME, '20170101000000Z')))
+
+        for tag, value in (
+            (DER_UTC_TIME, '1701\x00\x00000000Z'),
+            (DER_UTC_TIME, '1701'),
+            (DER_GENERALIZED_TIME, '2017-1-01000000Z')
+        ):
+            assert_that(calling(der_time).with_args(tag, value), raises(AmplifyParseException))
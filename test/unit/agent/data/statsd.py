@@ -2,6 +2,8 @@
 from hamcrest import *
 
 from test.base import BaseTestCase
+from amplify.agent.common.context import context
+from amplify.agent.common.util.sketch import QuantileSketch
 from amplify.agent.data.statsd import StatsdClient
 
 __author__ = "Mike Belov"
@@ -21,3 +23,110 @@ class StatsdClientTestCase(BaseTestCase):
 
         client.incr('test_negative', value=-200)
         assert_that(len(client.current['counter']), equal_to(1))  # we did't add negative metric
+
+    def test_timer_exact(self):
+        client = StatsdClient()
+        client.object = type('FakeObject', (object,), {'definition': {}})()
+
+        client.timer_values('test.time', [0.3, 0.1, 0.2, 0.4])
+        client.timer('test.time||1', 0.5)
+
+        timers = client.flush()['metrics']['timer']
+        assert_that(timers['G|test.time'][0][1], close_to(0.25, 0.0001))
+        assert_that(timers['C|test.time.count'][0][1], equal_to(4))
+        assert_that(timers['G|test.time.max'][0][1], equal_to(0.4))
+        assert_that(timers['G|test.time.median'][0][1], close_to(0.25, 0.0001))
+        assert_that(timers['G|test.time.pctl95'][0][1], equal_to(0.1))  # less than 10 samples
+        assert_that(timers['C|test.time.count||1'][0][1], equal_to(1))
+
+    def test_timer_sketch(self):
+        context.app_config['statsd'] = {'timer_backend': 'sketch', 'timer_accuracy': '0.01'}
+        try:
+            client = StatsdClient()
+        finally:
+            context.app_config.config.pop('statsd')
+        client.object = type('FakeObject', (object,), {'definition': {}})()
+
+        values = [x / 1000.0 for x in xrange(1, 1001)]
+        client.timer_values('test.time', values)
+        assert_that(client.current['timer']['test.time'], instance_of(QuantileSketch))
+
+        timers = client.flush()['metrics']['timer']
+        assert_that(timers['G|test.time'][0][1], close_to(0.5005, 0.0001))
+        assert_that(timers['C|test.time.count'][0][1], equal_to(1000))
+        assert_that(timers['G|test.time.max'][0][1], equal_to(1.0))
+        assert_that(timers['G|test.time.median'][0][1], close_to(0.5005, 0.5005 * 0.01))
+        assert_that(timers['G|test.time.pctl95'][0][1], close_to(0.951, 0.951 * 0.01))
+
+    def test_merge(self):
+        worker = StatsdClient()
+        worker.timer_backend = 'sketch'
+        worker.incr('test.counter', value=3)
+        worker.average_values('test.average', [1, 3])
+        worker.timer_values('test.time', [0.1, 0.3])
+
+        client = StatsdClient()
+        client.object = type('FakeObject', (object,), {'definition': {}})()
+        client.incr('test.counter', value=2)
+        client.timer('test.time', 0.2)
+        client.merge(worker.current)
+
+        assert_that(client.current['timer']['test.time'], instance_of(QuantileSketch))
+
+        metrics = client.flush()['metrics']
+        assert_that(metrics['counter']['C|test.counter'][0][1], equal_to(5))
+        assert_that(metrics['average']['G|test.average'][0][1], equal_to(2))
+        assert_that(metrics['timer']['C|test.time.count'][0][1], equal_to(3))
+        assert_that(metrics['timer']['G|test.time.max'][0][1], equal_to(0.3))
+
+    def test_handles(self):
+        client = StatsdClient()
+        client.object = type('FakeObject', (object,), {'definition': {}})()
+        reference = StatsdClient()
+        reference.object = client.object
+
+        counter = client.counter_handle('test.counter')
+        assert_that(client.counter_handle('test.counter'), same_instance(counter))
+        average = client.average_handle('test.average')
+        timer = client.timer_handle('test.time')
+
+        client.incr('test.counter', value=0)
+        reference.incr('test.counter', value=0)
+        for value in (1, 2, -5, 3):
+            counter.incr(value)
+            reference.incr('test.counter', value)
+        average.add_values([1, 2])
+        reference.average_values('test.average', [1, 2])
+        timer.add(0.1)
+        timer.add(0.3)
+        reference.timer_values('test.time', [0.1, 0.3])
+
+        assert_that(client.flush(), equal_to(reference.flush()))
+
+        # handles are reset after flush
+        assert_that(counter.stamp, none())
+        assert_that(client.flush(), equal_to({'object': {}}))
+
+    def test_suppress_zero_counters(self):
+        client = StatsdClient()
+        client.object = type('FakeObject', (object,), {'definition': {}})()
+        client.suppress_zero_counters = True
+        client.keyframe_interval = 3
+
+        def flush(value):
+            client.incr('test.zero', value=0)
+            client.incr('test.value', value=value)
+            counters = client.flush()['metrics'].get('counter', {})
+            return dict((name, points[0][1]) for name, points in counters.iteritems())
+
+        # zero counters are reported once, until they change
+        assert_that(flush(0), has_length(2))
+        assert_that(flush(1), equal_to({'C|test.value': 1}))
+
+        # every keyframe_interval flushes all counters are reported
+        assert_that(flush(1), has_length(2))
+
+        # a counter that dropped to zero is reported once more
+        assert_that(flush(0), equal_to({'C|test.value': 0}))
+        assert_that(flush(0), has_length(0))
+        assert_that(flush(0), has_length(2))
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+import shutil
+import zlib
+
+import ujson
+from hamcrest import *
+
+from amplify.agent.common.context import context
+from amplify.agent.managers.bridge import Bridge
+from test.base import BaseTestCase
+
+__author__ = "Mike Belov"
+__copyright__ = "Copyright (C) Nginx, Inc. All rights reserved."
+__license__ = ""
+__maintainer__ = "Mike Belov"
+__email__ = "dedm@nginx.com"
+
+
+class BridgeSpoolTestCase(BaseTestCase):
+    spool_dir = 'log/bridge-spool'
+
+    def setup_method(self, method):
+        super(BridgeSpoolTestCase, self).setup_method(method)
+        context.app_config['cloud']['spool_dir'] = self.spool_dir
+        context.app_config['cloud']['spool_replay_rate'] = '2'
+
+        self.sent = []
+        self.fail = False
+        self.original_post = context.http_client.post
+
+        def fake_post(url, body=None, **kwargs):
+            if self.fail:
+                raise IOError('backend is down')
+            self.sent.append(ujson.decode(zlib.decompress(body)))
+
+        context.http_client.post = fake_post
+
+    def teardown_method(self, method):
+        context.http_client.post = self.original_post
+        context.app_config['cloud'].pop('spool_dir', None)
+        context.app_config['cloud'].pop('spool_replay_rate', None)
+        context.backpressure_time = 0
+        shutil.rmtree(self.spool_dir, ignore_errors=True)
+        super(BridgeSpoolTestCase, self).teardown_method(method)
+
+    def test_spool_and_replay(self):
+        bridge = Bridge()
+
+        self.fail = True
+        for i in xrange(3):
+            bridge.payload.append('metrics', {'i': i})
+            bridge._send_payload()
+
+        # failed payloads are on disk, not in memory
+        assert_that(bridge.payload['metrics'], has_length(0))
+        assert_that(self.sent, has_length(0))
+
+        self.fail = False
+        bridge.payload.append('metrics', {'i': 3})
+        bridge._send_payload()
+
+        # the current payload goes first, then spooled ones oldest first, two at a time
+        assert_that([payload['metrics'] for payload in self.sent], equal_to([[{'i': 3}], [{'i': 0}], [{'i': 1}]]))
+
+        bridge._send_payload()
+        assert_that(self.sent[-1]['metrics'], equal_to([{'i': 2}]))
+        assert_that(bridge.spool.peek(), none())
+
+    def test_replay_respects_backpressure(self):
+        bridge = Bridge()
+
+        self.fail = True
+        bridge.payload.append('metrics', {'i': 0})
+        bridge._send_payload()
+
+        self.fail = False
+        context.backpressure_time = 2 ** 31
+        bridge._send_payload()
+        assert_that(self.sent, has_length(1))
+        assert_that(bridge.spool.peek(), not_none())
@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
+import hashlib
 import os
+import shutil
+import tempfile
 
 from hamcrest import *
 
@@ -232,6 +235,14 @@ class ConfigTestCase(BaseTestCase):
         # despite there being 8 errors, there are only 5 missing includes
         assert_that(config.parser_errors, has_length(5))
 
+    def test_subtree_is_not_kept(self):
+        config = NginxConfig(simple_config)
+        config.full_parse()
+
+        assert_that(config.__dict__, not_(has_key('subtree')))
+        assert_that(config.subtree, equal_to(config.subtree))
+        assert_that(config.subtree, not_(same_instance(config.subtree)))
+
     def test_proxy_buffers_simple(self):
         config = NginxConfig(proxy_buffers_simple_config)
         config.full_parse()
@@ -615,6 +626,53 @@ class MiscConfigTestCase(BaseTestCase):
         new_checksum = config.checksum()
         assert_that(new_checksum, not_(equal_to(old_checksum)))
 
+    def test_checksum_hashes_changed_files_only(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            main = os.path.join(tmp_dir, 'nginx.conf')
+            vhost = os.path.join(tmp_dir, 'vhost.conf')
+            with open(main, 'w') as f:
+                f.write('events {}\nhttp { include %s; }\n' % vhost)
+            with open(vhost, 'w') as f:
+                f.write('server { listen 8001; }\n')
+
+            config = NginxConfig(main)
+            config.full_parse()
+
+            hashed = []
+            original_sha256 = hashlib.sha256
+
+            def sha256(*args):
+                hashed.append(args)
+                return original_sha256(*args)
+
+            hashlib.sha256 = sha256
+            try:
+                old_checksum = config.checksum()
+                assert_that(config.checksum(), equal_to(old_checksum))
+                # 2 files + total on the first call, just the total on the second one
+                assert_that(hashed, has_length(4))
+
+                with open(vhost, 'w') as f:
+                    f.write('server { listen 80002; }\n')
+                os.utime(vhost, (0, 0))
+                config.full_parse()
+
+                del hashed[:]
+                new_checksum = config.checksum()
+                assert_that(hashed, has_length(2))
+            finally:
+                hashlib.sha256 = original_sha256
+
+            assert_that(new_checksum, not_(equal_to(old_checksum)))
+
+            # the same as without cached digests
+            fresh_config = NginxConfig(main)
+            fresh_config.full_parse()
+            assert_that(fresh_config.checksum(), equal_to(new_checksum))
+        finally:
+            shutil.rmtree(tmp_dir)
+
 
 class ExcludeConfigTestCase(BaseTestCase):
     """
@@ -1,9 +1,16 @@
 # -*- coding: utf-8 -*-
 import os
+import shutil
+import tempfile
+
+import crossplane
 
 from hamcrest import *
 
-from amplify.agent.objects.nginx.config.parser import IGNORED_DIRECTIVES, NginxConfigParser
+from amplify.agent.objects.nginx.config import parser
+from amplify.agent.objects.nginx.config.parser import (
+    IGNORED_DIRECTIVES, NginxConfigParser, ParsedFilesCache, iter_statements
+)
 from test.base import BaseControllerTestCase, BaseTestCase
 
 __author__ = "Mike Belov"
@@ -826,6 +833,111 @@ class ParserTestCase(BaseTestCase):
         assert_that(calling(cfg.parse), not_(raises(TypeError)))
         assert_that(cfg.errors, has_length(0))
 
+    def test_iter_statements(self):
+        cfg = NginxConfigParser(includes_config)
+        cfg.parse()
+
+        def expand(block=None):
+            result = []
+            for stmt in iter_statements(cfg.tree, block):
+                if 'block' in stmt:
+                    result.append((stmt['directive'], stmt['args'], expand(stmt['block'])))
+                else:
+                    result.append((stmt['directive'], stmt['args']))
+            return result
+
+        def expected(block):
+            result = []
+            for stmt in block:
+                if 'block' in stmt:
+                    result.append((stmt['directive'], stmt['args'], expected(stmt['block'])))
+                else:
+                    result.append((stmt['directive'], stmt['args']))
+            return result
+
+        # same statements as in simplify(), but without copying anything
+        assert_that(expand(), equal_to(expected(cfg.simplify())))
+
+        # statements are the ones from the parsed files
+        http = next(stmt for stmt in iter_statements(cfg.tree) if stmt['directive'] == 'http')
+        parsed_http = next(stmt for stmt in cfg.tree['config'][0]['parsed'] if stmt['directive'] == 'http')
+        assert_that(http, same_instance(parsed_http))
+
+    def test_iter_statements_empty_tree(self):
+        assert_that(list(iter_statements({})), empty())
+
+
+class ParsedFilesCacheTestCase(BaseTestCase):
+    def setup_method(self, method):
+        super(ParsedFilesCacheTestCase, self).setup_method(method)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.original_parse_file = parser._parse_file
+        self.parsed = []
+
+        def parse_file(filename, ctx=()):
+            self.parsed.append(filename)
+            return self.original_parse_file(filename, ctx)
+
+        parser._parse_file = parse_file
+
+    def teardown_method(self, method):
+        parser._parse_file = self.original_parse_file
+        shutil.rmtree(self.tmp_dir)
+        super(ParsedFilesCacheTestCase, self).teardown_method(method)
+
+    def write(self, name, content):
+        path = os.path.join(self.tmp_dir, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def test_same_as_crossplane(self):
+        for filename in (simple_config, includes_config, huge_config, ssl_broken_config):
+            expected = crossplane.parse(filename, onerror=lambda e: None, ignore=IGNORED_DIRECTIVES)
+            for error in expected['errors']:
+                del error['callback']
+
+            cfg = NginxConfigParser(filename)
+            for _ in xrange(2):
+                tree = cfg._parse_tree()
+                for error in tree['errors']:
+                    del error['callback']
+                assert_that(tree, equal_to(expected))
+
+    def test_only_changed_files_are_parsed(self):
+        self.write('vhost1.conf', 'server { listen 8001; }\n')
+        vhost2 = self.write('vhost2.conf', 'server { listen 8002; }\n')
+        main = self.write('nginx.conf', 'events {}\nhttp { include %s/vhost*.conf; }\n' % self.tmp_dir)
+
+        cache = ParsedFilesCache()
+        cfg = NginxConfigParser(main, cache=cache)
+        cfg.parse()
+        assert_that(self.parsed, has_length(3))
+
+        # nothing changed
+        del self.parsed[:]
+        cfg = NginxConfigParser(main, cache=cache)
+        cfg.parse()
+        assert_that(self.parsed, has_length(0))
+        assert_that(cfg.files[vhost2]['lines'], equal_to(1))
+
+        # one file changed (size and mtime differ)
+        self.write('vhost2.conf', 'server {\n    listen 8003;\n}\n')
+        os.utime(vhost2, (0, 0))
+        cfg = NginxConfigParser(main, cache=cache)
+        cfg.parse()
+        assert_that(self.parsed, equal_to([vhost2]))
+        assert_that(cfg.files[vhost2]['lines'], equal_to(3))
+
+        listens = [stmt['block'][0]['args'] for stmt in cfg.simplify()[1]['block'] if stmt['directive'] == 'server']
+        assert_that(listens, equal_to([['8001'], ['8003']]))
+
+        # removed files are dropped from the cache
+        os.remove(vhost2)
+        cfg = NginxConfigParser(main, cache=cache)
+        cfg.parse()
+        assert_that(cache.entries, not_(has_key(('parsed', vhost2, ('http',)))))
+
 
 class ControllerParserTestCase(BaseControllerTestCase):
     def test_parse_ssl_not_ignored(self):
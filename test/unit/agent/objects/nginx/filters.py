@@ -3,7 +3,7 @@ import re
 
 from hamcrest import *
 
-from amplify.agent.objects.nginx.filters import Filter
+from amplify.agent.objects.nginx.filters import Filter, FilterEngine
 from test.base import BaseTestCase
 
 __author__ = "Mike Belov"
@@ -92,3 +92,40 @@ class FiltersTestCase(BaseTestCase):
 
         assert_that(filtr.matchfile('foo.txt'), equal_to(True))
         assert_that(filtr.matchfile('foo.log'), equal_to(True))
+
+    def test_engine(self):
+        filters = [
+            Filter(filter_rule_id='1', metric='http.a', data=[['$request_method', '~', 'post']]),
+            Filter(filter_rule_id='2', metric='http.b', data=[
+                ['$request_method', '~', 'post'], ['$status', '!~', '2..']
+            ]),
+            Filter(filter_rule_id='3', metric='http.c', data=[['$status', '~', '2..']]),
+            Filter(filter_rule_id='4', metric='http.d', data=[['$upstream_addr', '~', '10.0.0.1']]),
+        ]
+        engine = FilterEngine(filters)
+
+        # request_method condition is shared by two filters
+        assert_that(engine.conditions, has_length(3))
+        assert_that(engine.keys['status'], has_length(1))
+
+        lines = [
+            {'request_method': 'POST', 'status': '200'},
+            {'request_method': 'POST', 'status': '404'},
+            {'request_method': 'GET', 'status': 200},
+            {'request_method': 'GET'},
+            {'upstream_addr': ['10.0.0.1', '10.0.0.2']},
+        ]
+        for parsed in lines:
+            expected = [f for f in filters if f.match(parsed)]
+            assert_that(engine.match(parsed), equal_to(expected))
+
+        assert_that(engine.match(lines[1]), equal_to([filters[0], filters[1]]))
+        assert_that(engine.cache['request_method'], has_key('POST'))
+
+    def test_engine_cache_size(self):
+        engine = FilterEngine([Filter(filter_rule_id='1', metric='http.a', data=[['$request_uri', '~', '/api']])])
+        engine.cache_size = 10
+
+        for i in xrange(25):
+            assert_that(engine.match({'request_uri': '/api/%s' % i}), has_length(1))
+        assert_that(len(engine.cache['request_uri']), less_than_or_equal_to(10))
@@ -521,3 +521,31 @@ class LogParserTestCase(BaseTestCase):
         assert_that(parsed['body_bytes_sent'], equal_to(97))
         assert_that(parsed['time_iso8601'], equal_to('2018-07-17T18:07:31+00:00'))
         assert_that(parsed['http_user_agent'], equal_to('nginx-amplify-agent/1.5.0-1'))
+
+    def test_compiled_fields(self):
+        log_format = '$remote_addr "$request" $status $body_bytes_sent "$upstream_addr" rt=$request_time'
+        parser = NginxAccessLogParser(log_format)
+
+        assert_that(parser.fields, has_length(6))
+        assert_that(
+            [(key, index) for key, index, _, _ in parser.fields],
+            contains(
+                ('remote_addr', 0), ('request', 1), ('status', 2),
+                ('body_bytes_sent', 3), ('upstream_addr', 4), ('request_time', 5)
+            )
+        )
+
+        line = '10.0.0.1 "GET / HTTP/1.1" 200 512 "10.0.0.2:80, 10.0.0.3:80" rt=0.010, 0.020'
+        parsed = parser.parse(line)
+        assert_that(parsed['body_bytes_sent'], equal_to(512))
+        assert_that(parsed['upstream_addr'], equal_to(['10.0.0.2:80', '10.0.0.3:80']))
+        assert_that(parsed['request_time'], equal_to([0.01, 0.02]))
+
+    def test_duplicate_keys(self):
+        # the last occurrence of a variable wins
+        parser = NginxAccessLogParser('$status "$request" $status')
+        assert_that(parser.fields, has_length(2))
+
+        parsed = parser.parse('200 "GET / HTTP/1.1" 404')
+        assert_that(parsed['status'], equal_to('404'))
+        assert_that(parsed['request_method'], equal_to('GET'))
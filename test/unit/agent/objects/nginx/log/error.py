@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
+import re
+
 from hamcrest import *
 
-from amplify.agent.objects.nginx.log.error import NginxErrorLogParser
+from amplify.agent.objects.nginx.log.error import NginxErrorLogParser, compile_rules, error_re
 from test.base import BaseTestCase
 
 __author__ = "Mike Belov"
@@ -40,3 +42,42 @@ class LogParserTestCase(BaseTestCase):
         parser = NginxErrorLogParser()
         parsed = parser.parse(line)
         assert_that(parsed, equal_to(None))
+
+    def test_compile_rules(self):
+        parser = NginxErrorLogParser()
+        assert_that(parser.prefilter, equal_to(('upstream', 'is buffered')))
+        assert_that(parser.rules, has_length(sum(len(regexps) for regexps in error_re.itervalues())))
+        assert_that(parser.rules, has_item(
+            contains('nginx.upstream.request.failed', 'while connecting to upstream, client', anything())
+        ))
+
+    def test_same_as_regexps(self):
+        lines = [
+            '2015/07/14 08:42:57 [error] 1#1: *1 connect() failed (111: Connection refused) while connecting '
+            'to upstream, client: 127.0.0.1, server: localhost',
+            '2015/07/14 08:42:57 [error] 1#1: *1 no live upstreams while connecting to upstream, client: 127.0.0.1',
+            '2015/07/14 08:42:57 [warn] 1#1: *1 a client request body is buffered to a temporary file',
+            '2015/07/14 08:42:57 [error] 1#1: *1 upstream sent invalid header while reading response header',
+            '2015/07/14 08:42:57 [error] 1#1: *1 upstream sent no valid HTTP/1.0 header while reading response',
+            '2015/07/14 08:42:57 [error] 1#1: *1 recv() failed (104: Connection reset) while reading upstream',
+            '2015/07/14 08:42:57 [info] 1#1: *1 upstream server temporarily disabled',
+            '2015/07/14 08:42:57 [notice] 1#1: signal process started',
+            '',
+        ]
+
+        def parse_with_regexps(line):
+            for error, regexps in error_re.iteritems():
+                for regexp in regexps:
+                    if regexp.match(line):
+                        return error
+
+        parser = NginxErrorLogParser()
+        for line in lines:
+            assert_that(parser.parse(line), equal_to(parse_with_regexps(line)))
+        assert_that(parser.parse(lines[0]), equal_to('nginx.upstream.request.failed'))
+
+    def test_custom_regexp_is_not_skipped(self):
+        rules = {'nginx.custom': [re.compile(r'.*SSL_do_handshake\(\) failed.*')]}
+        prefilter, compiled = compile_rules(rules)
+        assert_that(prefilter, has_item(''))
+        assert_that(compiled, equal_to([('nginx.custom', '', rules['nginx.custom'][0])]))
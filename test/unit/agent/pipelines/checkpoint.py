@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+
+from hamcrest import *
+
+from amplify.agent.common.context import context
+from amplify.agent.pipelines.checkpoint import CHECKPOINTS
+from amplify.agent.pipelines.file import FileTail
+from test.base import BaseTestCase
+
+__author__ = "Mike Belov"
+__copyright__ = "Copyright (C) Nginx, Inc. All rights reserved."
+__license__ = ""
+__maintainer__ = "Mike Belov"
+__email__ = "dedm@nginx.com"
+
+
+class CheckpointTestCase(BaseTestCase):
+    test_log = 'log/checkpoint.log'
+    test_log_rotated = 'log/checkpoint.log.rotated'
+    checkpoint_file = 'log/offsets.json'
+
+    def setup_method(self, method):
+        super(CheckpointTestCase, self).setup_method(method)
+        context.app_config['tail'] = {'checkpoint_file': self.checkpoint_file, 'checkpoint_interval': '0'}
+        self.write_log('start')
+
+    def teardown_method(self, method):
+        context.app_config.config.pop('tail', None)
+        for filename in (self.test_log, self.test_log_rotated, self.checkpoint_file):
+            if os.path.exists(filename):
+                os.remove(filename)
+        super(CheckpointTestCase, self).teardown_method(method)
+
+    def write_log(self, line):
+        with open(self.test_log, 'a') as f:
+            f.write('%s\n' % line)
+
+    def restart(self):
+        """
+        Forget everything that was kept in memory
+        """
+        import amplify.agent.pipelines.file
+        amplify.agent.pipelines.file.OFFSET_CACHE.clear()
+        CHECKPOINTS.__init__()
+
+    def test_flush(self):
+        tail = FileTail(filename=self.test_log)
+        self.write_log('first')
+        assert_that(tail.readlines(), equal_to(['first']))
+
+        with open(self.checkpoint_file) as f:
+            data = json.load(f)
+        checkpoint = data['files'][self.test_log]
+        assert_that(checkpoint['offset'], equal_to(os.path.getsize(self.test_log)))
+        assert_that(checkpoint['ino'], equal_to(os.stat(self.test_log).st_ino))
+        assert_that(os.path.exists(self.checkpoint_file + '.tmp'), equal_to(False))
+
+    def test_flush_interval(self):
+        context.app_config['tail']['checkpoint_interval'] = '3600'
+        tail = FileTail(filename=self.test_log)
+
+        for line in ('first', 'second'):
+            self.write_log(line)
+            tail.readlines()
+
+        # the first update is written right away, the second one waits for the interval
+        with open(self.checkpoint_file) as f:
+            saved = json.load(f)['files'][self.test_log]['offset']
+        assert_that(saved, equal_to(len('start\nfirst\n')))
+
+        CHECKPOINTS.flush(force=True)
+        with open(self.checkpoint_file) as f:
+            saved = json.load(f)['files'][self.test_log]['offset']
+        assert_that(saved, equal_to(os.path.getsize(self.test_log)))
+
+    def test_restart(self):
+        tail = FileTail(filename=self.test_log)
+        self.write_log('before restart')
+        tail.readlines()
+
+        self.restart()
+        self.write_log('during restart')
+
+        tail = FileTail(filename=self.test_log)
+        self.write_log('after restart')
+        assert_that(tail.readlines(), equal_to(['during restart', 'after restart']))
+
+    def test_rotated_during_restart(self):
+        tail = FileTail(filename=self.test_log)
+        self.write_log('before restart')
+        tail.readlines()
+
+        self.restart()
+        os.rename(self.test_log, self.test_log_rotated)
+        self.write_log('new file')
+
+        tail = FileTail(filename=self.test_log)
+        assert_that(tail.readlines(), equal_to(['new file']))
+
+    def test_overwritten_during_restart(self):
+        tail = FileTail(filename=self.test_log)
+        self.write_log('before restart')
+        tail.readlines()
+
+        self.restart()
+
+        # same inode and size, different content
+        with open(self.test_log, 'r+') as f:
+            f.write('x' * os.path.getsize(self.test_log))
+        self.write_log('something')
+
+        # checkpoint doesn't match, so the tail starts from the end as usual
+        tail = FileTail(filename=self.test_log)
+        self.write_log('new line')
+        assert_that(tail.readlines(), equal_to(['new line']))
+
+    def test_disabled(self):
+        context.app_config['tail']['checkpoint_file'] = ''
+        tail = FileTail(filename=self.test_log)
+        self.write_log('first')
+        tail.readlines()
+        assert_that(os.path.exists(self.checkpoint_file), equal_to(False))
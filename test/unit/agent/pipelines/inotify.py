@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import time
+
+from hamcrest import *
+
+from amplify.agent.pipelines.file import FileTail
+from amplify.agent.pipelines.inotify import DirectoryWatcher, InotifyFileTail, create_file_tail
+from test.base import BaseTestCase
+
+__author__ = "Mike Belov"
+__copyright__ = "Copyright (C) Nginx, Inc. All rights reserved."
+__license__ = ""
+__maintainer__ = "Mike Belov"
+__email__ = "dedm@nginx.com"
+
+
+class InotifyTailTestCase(BaseTestCase):
+    test_log = 'log/something.log'
+    test_log_rotated = 'log/something.log.rotated'
+
+    def setup_method(self, method):
+        super(InotifyTailTestCase, self).setup_method(method)
+        self.write_log('start')
+
+    def write_log(self, line):
+        with open(self.test_log, 'a') as f:
+            f.write('%s\n' % line)
+
+    def teardown_method(self, method):
+        for filename in (self.test_log, self.test_log_rotated):
+            if os.path.exists(filename):
+                os.remove(filename)
+
+        super(InotifyTailTestCase, self).teardown_method(method)
+
+    def test_create_file_tail(self):
+        tail = create_file_tail(self.test_log)
+        assert_that(tail, instance_of(InotifyFileTail))
+        assert_that(tail, instance_of(FileTail))
+        tail.stop()
+
+    def test_read_new_lines(self):
+        tail = InotifyFileTail(filename=self.test_log)
+        assert_that(tail.readlines(), has_length(0))
+
+        for i in xrange(3):
+            line = "this is %s line" % i
+            self.write_log(line)
+            assert_that(tail.readlines(), equal_to([line]))
+
+    def test_skip_read_without_events(self):
+        tail = InotifyFileTail(filename=self.test_log)
+        tail.readlines()
+
+        # make sure that file is not even checked for rotation without events
+        tail._file_was_rotated = None
+        assert_that(tail.readlines(), has_length(0))
+
+    def test_rotate(self):
+        tail = InotifyFileTail(filename=self.test_log)
+        tail.readlines()
+
+        os.rename(self.test_log, self.test_log_rotated)
+        self.write_log("from a new file")
+        assert_that(tail.readlines(), equal_to(['from a new file']))
+
+        # the new file is watched
+        self.write_log("again")
+        assert_that(tail.readlines(), equal_to(['again']))
+
+    def test_wait(self):
+        tail = InotifyFileTail(filename=self.test_log)
+        tail.min_wait = 0.01
+        tail.readlines()
+
+        # nothing is written
+        start = time.time()
+        tail.wait(0.2)
+        assert_that(time.time() - start, greater_than_or_equal_to(0.2))
+
+        # wake up as soon as something is written
+        self.write_log('something')
+        start = time.time()
+        tail.wait(5)
+        assert_that(time.time() - start, less_than(1))
+        assert_that(tail.readlines(), equal_to(['something']))
+
+
+    def test_shared_inotify(self):
+        other_log = 'log/something_else.log'
+        with open(other_log, 'w'):
+            pass
+
+        try:
+            tail = InotifyFileTail(filename=self.test_log)
+            other = InotifyFileTail(filename=other_log)
+            tail.readlines()
+            other.readlines()
+
+            # one inotify instance and one watch of the log directory
+            assert_that(other._inotify, same_instance(tail._inotify))
+            assert_that(other._dir_wd, equal_to(tail._dir_wd))
+
+            # events reach the right tail whichever of them reads them
+            self.write_log('something')
+            assert_that(other.readlines(), has_length(0))
+            assert_that(tail.readlines(), equal_to(['something']))
+
+            # the shared directory watch stays while the other tail uses it
+            other.stop()
+            os.rename(self.test_log, self.test_log_rotated)
+            self.write_log('from a new file')
+            assert_that(tail.readlines(), equal_to(['from a new file']))
+        finally:
+            os.remove(other_log)
+
+
+class DirectoryWatcherTestCase(BaseTestCase):
+
+    def setup_method(self, method):
+        super(DirectoryWatcherTestCase, self).setup_method(method)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.conf_d = os.path.join(self.tmp_dir, 'conf.d')
+        os.mkdir(self.conf_d)
+        self.write('nginx.conf')
+
+        self.watcher = DirectoryWatcher()
+        self.watcher.watch(set([self.tmp_dir, self.conf_d]))
+
+        # new watches count as changes
+        assert_that(self.watcher.changed(), equal_to(True))
+        assert_that(self.watcher.changed(), equal_to(False))
+
+    def teardown_method(self, method):
+        self.watcher.stop()
+        shutil.rmtree(self.tmp_dir)
+        super(DirectoryWatcherTestCase, self).teardown_method(method)
+
+    def write(self, name, content='events {}\n'):
+        with open(os.path.join(self.tmp_dir, name), 'w') as f:
+            f.write(content)
+
+    def test_changes(self):
+        self.write('nginx.conf', 'events {}\nhttp {}\n')
+        assert_that(self.watcher.changed(), equal_to(True))
+        assert_that(self.watcher.changed(), equal_to(False))
+
+        os.chmod(os.path.join(self.tmp_dir, 'nginx.conf'), 0600)
+        assert_that(self.watcher.changed(), equal_to(True))
+
+        self.write('conf.d/new.conf')
+        assert_that(self.watcher.changed(), equal_to(True))
+
+        os.rename(os.path.join(self.conf_d, 'new.conf'), os.path.join(self.conf_d, 'renamed.conf'))
+        assert_that(self.watcher.changed(), equal_to(True))
+
+        os.remove(os.path.join(self.conf_d, 'renamed.conf'))
+        assert_that(self.watcher.changed(), equal_to(True))
+        assert_that(self.watcher.changed(), equal_to(False))
+
+    def test_unwatch(self):
+        self.watcher.watch(set([self.tmp_dir]))
+        assert_that(self.watcher.changed(), equal_to(False))
+
+        self.write('conf.d/new.conf')
+        assert_that(self.watcher.changed(), equal_to(False))
+
+    def test_removed_directory(self):
+        shutil.rmtree(self.conf_d)
+        assert_that(self.watcher.changed(), equal_to(True))
+
+        # the directory is watched again when it's back
+        os.mkdir(self.conf_d)
+        self.watcher.watch(set([self.tmp_dir, self.conf_d]))
+        assert_that(self.watcher.changed(), equal_to(True))
+
+        self.write('conf.d/new.conf')
+        assert_that(self.watcher.changed(), equal_to(True))
+
+    def test_symlinked_directory(self):
+        link = os.path.join(self.tmp_dir, 'link')
+        os.symlink(self.conf_d, link)
+
+        # both paths share the watch of the same directory
+        self.watcher.watch(set([self.tmp_dir, self.conf_d, link]))
+        self.watcher.changed()
+
+        # dropping one of them keeps the directory watched
+        self.watcher.watch(set([self.tmp_dir, self.conf_d]))
+        assert_that(self.watcher.changed(), equal_to(False))
+        self.write('conf.d/new.conf')
+        assert_that(self.watcher.changed(), equal_to(True))
+
+        self.watcher.watch(set([self.tmp_dir, link]))
+        self.write('conf.d/another.conf')
+        assert_that(self.watcher.changed(), equal_to(True))
+
+        # dropping the last one removes the watch
+        self.watcher.watch(set([self.tmp_dir]))
+        self.watcher.changed()
+        self.write('conf.d/third.conf')
+        assert_that(self.watcher.changed(), equal_to(False))
+        self.watcher.watch(set())
+
+    def test_removed_symlinked_directory(self):
+        link = os.path.join(self.tmp_dir, 'link')
+        os.symlink(self.conf_d, link)
+        self.watcher.watch(set([self.tmp_dir, self.conf_d, link]))
+        self.watcher.changed()
+
+        shutil.rmtree(self.conf_d)
+        assert_that(self.watcher.changed(), equal_to(True))
+        assert_that(calling(self.watcher.watch).with_args(set()), not_(raises(KeyError)))
+
+    def test_stopped(self):
+        self.watcher.stop()
+        assert_that(self.watcher.changed(), equal_to(True))
@@ -1,11 +1,17 @@
 # -*- coding: utf-8 -*-
+import os
 import time
+import socket
+import asyncore
 import logging
 from logging.handlers import SysLogHandler
 
 from hamcrest import *
 
-from amplify.agent.pipelines.syslog import SyslogTail, SYSLOG_ADDRESSES, AmplifyAddresssAlreadyInUse
+from amplify.agent.pipelines.syslog import (
+    SyslogTail, SyslogServer, SyslogTCPServer, SyslogTCPHandler, SyslogBuffer, SYSLOG_ADDRESSES, SYSLOG_BUFFERS,
+    AmplifyAddresssAlreadyInUse, pop_syslog_stats
+)
 from test.base import BaseTestCase, disabled_test
 
 
@@ -75,3 +81,154 @@ class SyslogTailTestCase(BaseTestCase):
             calling(SyslogTail).with_args(address=('localhost', 514)),
             raises(AmplifyAddresssAlreadyInUse)
         )
+
+
+class SyslogServerTestCase(BaseTestCase):
+    def test_read_batch(self):
+        cache = SyslogBuffer(maxlen=3)
+        server = SyslogServer(cache, ('localhost', 0))
+        client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            for i in xrange(5):
+                client.sendto('<190>Jul 14 08:42:57 host amplify: line %s \n' % i, server.address)
+            client.sendto('no tag here', server.address)
+            time.sleep(0.1)
+
+            # all pending datagrams are read at once, the oldest ones are dropped
+            server.handle_read()
+            assert_that(list(cache), equal_to(['line 2', 'line 3', 'line 4']))
+        finally:
+            client.close()
+            server.close()
+            SYSLOG_ADDRESSES.discard(server.address)
+
+    def test_swap(self):
+        cache = SyslogBuffer(maxlen=10)
+        cache.append('first')
+        cache.append('second')
+
+        records = cache.swap()
+        assert_that(list(records), equal_to(['first', 'second']))
+        assert_that(cache, has_length(0))
+
+        cache.append('third')
+        assert_that(list(records), equal_to(['first', 'second']))
+        assert_that(list(cache), equal_to(['third']))
+
+
+class SyslogBufferTestCase(BaseTestCase):
+    def test_drops(self):
+        cache = SyslogBuffer(maxlen=3)
+        for i in xrange(5):
+            cache.append('line %s' % i)
+
+        assert_that(list(cache.swap()), equal_to(['line 2', 'line 3', 'line 4']))
+        assert_that(cache.pop_stats(), equal_to(dict(received=5, dropped=2, processed=3)))
+        assert_that(cache.pop_stats(), equal_to(dict(received=0, dropped=0, processed=0)))
+
+    def test_grow_and_shrink(self):
+        cache = SyslogBuffer(maxlen=10)
+        for i in xrange(50):
+            cache.append('x' * 10)
+        cache.swap()
+        assert_that(cache.maxlen, equal_to(100))
+
+        # limited by memory budget
+        cache.max_memory = 1000
+        for i in xrange(100):
+            cache.append('x' * 10)
+        cache.swap()
+        assert_that(cache.maxlen, equal_to(100))
+
+        # shrinks by half, but not below the initial size
+        for _ in xrange(5):
+            cache.swap()
+        assert_that(cache.maxlen, equal_to(10))
+
+    def test_pop_syslog_stats(self):
+        assert_that(pop_syslog_stats(), none())
+
+        cache = SyslogBuffer(maxlen=10)
+        SYSLOG_BUFFERS.add(cache)
+        try:
+            cache.append('line')
+            cache.swap()
+            assert_that(pop_syslog_stats(), equal_to(dict(received=1, dropped=0, processed=1)))
+        finally:
+            SYSLOG_BUFFERS.discard(cache)
+
+
+class SyslogSocketsTestCase(BaseTestCase):
+    socket_path = 'log/syslog.sock'
+
+    def test_unix_socket(self):
+        cache = SyslogBuffer(maxlen=10)
+        server = SyslogServer(cache, self.socket_path)
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            client.sendto('<190>Jul 14 08:42:57 host amplify: unix line', self.socket_path)
+            time.sleep(0.1)
+            server.handle_read()
+            assert_that(list(cache), equal_to(['unix line']))
+
+            # not writable by everyone
+            assert_that(os.stat(self.socket_path).st_mode & 0o777, equal_to(0o660))
+        finally:
+            client.close()
+            server.close()
+
+        assert_that(server.address, not_(is_in(SYSLOG_ADDRESSES)))
+        assert_that(os.path.exists(self.socket_path), equal_to(False))
+
+    def test_failed_setup_releases_address(self):
+        # something else holds the tcp port
+        blocker = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        blocker.bind(('127.0.0.1', 0))
+        blocker.listen(1)
+        address = blocker.getsockname()
+
+        try:
+            assert_that(calling(SyslogTail).with_args(address=address, tcp=True), raises(socket.error))
+            assert_that(SYSLOG_ADDRESSES, empty())
+        finally:
+            blocker.close()
+
+        tail = SyslogTail(address=address, tcp=True)
+        try:
+            assert_that(tail.listener, not_none())
+        finally:
+            tail.stop()
+        assert_that(SYSLOG_ADDRESSES, empty())
+
+    def test_tcp_framing(self):
+        cache = SyslogBuffer(maxlen=10)
+        sock, other = socket.socketpair()
+        handler = SyslogTCPHandler(cache, sock)
+        try:
+            message = '<190>Jul 14 08:42:57 host amplify: first line'
+            handler.pending = '%s %s' % (len(message), message)
+            handler.pending += '<190>Jul 14 08:42:57 host amplify: second line\n'
+            handler.pending += '45 <190>Jul 14 08:42:57 host amplify: incomp'
+            handler.handle_messages()
+
+            assert_that(list(cache), equal_to(['first line', 'second line']))
+            assert_that(handler.pending, starts_with('45 '))
+        finally:
+            handler.close()
+            other.close()
+
+    def test_tcp_listener(self):
+        cache = SyslogBuffer(maxlen=10)
+        server = SyslogTCPServer(cache, ('127.0.0.1', 0))
+        client = socket.create_connection(server.address)
+        try:
+            message = '<190>Jul 14 08:42:57 host amplify: tcp line'
+            client.sendall('%s %s' % (len(message), message))
+            for _ in xrange(10):
+                asyncore.loop(timeout=0.05, count=1)
+                if len(cache):
+                    break
+            assert_that(list(cache), equal_to(['tcp line']))
+        finally:
+            client.close()
+            server.close()
@@ -143,3 +143,29 @@ class TailTestCase(BaseTestCase):
         lines = tail.readlines()
         assert_that(lines, has_length(1))
         assert_that(lines[0], ends_with('    '))
+
+    def test_lines_across_blocks(self):
+        tail = FileTail(filename=self.test_log)
+        tail.block_size = 7
+
+        lines = ["line number %d" % i for i in range(20)]
+        for line in lines:
+            self.write_log(line)
+
+        assert_that(tail.readlines(), equal_to(lines))
+        assert_that(tail._offset, equal_to(os.path.getsize(self.test_log)))
+
+    def test_partial_line_is_not_read(self):
+        tail = FileTail(filename=self.test_log)
+        start_offset = tail._offset
+
+        with open(self.test_log, 'a') as f:
+            f.write('complete\r\nincompl')
+
+        assert_that(tail.readlines(), equal_to(['complete']))
+        assert_that(tail._offset, equal_to(start_offset + len('complete\r\n')))
+
+        with open(self.test_log, 'a') as f:
+            f.write('ete\n')
+
+        assert_that(tail.readlines(), equal_to(['incomplete']))
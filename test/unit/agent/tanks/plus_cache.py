@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import copy
 import time
 from collections import deque
 
@@ -71,6 +72,27 @@ class PlusCacheTestCase(BaseTestCase):
         last = self.plus_cache.get_last('new')
         assert_that(last, equal_to('data'))
 
+    def test_put_read_only(self):
+        payload = {'upstreams': {'backend': {'peers': [{'state': 'up'}]}}}
+        self.plus_cache.put('new', (payload, 1))
+
+        cached_payload, stamp = self.plus_cache.get_last('new')
+        assert_that(cached_payload, equal_to(payload))
+        assert_that(stamp, equal_to(1))
+
+        # later changes of the original payload don't affect the cache
+        payload['upstreams']['backend']['peers'][0]['state'] = 'down'
+        assert_that(cached_payload['upstreams']['backend']['peers'][0]['state'], equal_to('up'))
+
+        peers = cached_payload['upstreams']['backend']['peers']
+        assert_that(isinstance(peers, list))
+        assert_that(calling(peers.append).with_args({}), raises(TypeError))
+        assert_that(calling(peers[0].__setitem__).with_args('state', 'down'), raises(TypeError))
+        assert_that(calling(cached_payload.pop).with_args('upstreams'), raises(TypeError))
+
+        # copies of read-only parts are the parts themselves
+        assert_that(copy.deepcopy(peers), same_instance(peers))
+
 
 class PlusCacheCollectTestCase(RealNginxTestCase):
     @nginx_plus_test